@@ -5,9 +5,10 @@ Programmatic API for the full cheque verification pipeline.
 Can be used standalone or imported by other scripts.
 
 Pipeline (mirrors cheque_studio.py SSE events):
-  1. Falcon Perception 0.6B  — signature region detection (segmentation)
-  2. Line Sweep              — tight signature crop
-  3. Signature SVM           — GENUINE / FORGED classification
+  1. Falcon Perception 0.6B  — signature region detection (segmentation),
+                               every signatory on joint-account cheques
+  2. Line Sweep              — tight signature crop(s), multi-band split
+  3. Signature SVM           — GENUINE / FORGED per signatory (one batched call)
   4. Gemma 4 E2B (mlx_vlm)  — structured cheque field extraction (11 fields)
 
 Example:
@@ -26,6 +27,124 @@ BASE_DIR = Path(__file__).resolve().parent
 sys.path.insert(0, str(BASE_DIR))
 
 
+# ── Multi-signature helpers ───────────────────────────────────────────────────
+
+MAX_SIGNATORIES = 3       # joint accounts rarely carry more than three
+_DUP_IOU        = 0.5     # Falcon boxes overlapping more than this are one signature
+_MIN_SIG_HEIGHT = 30      # same guard as the single Line Sweep crop
+_SPLIT_MIN_GAP  = 0.25    # blank columns between signatories, × the narrower one's width
+_SPLIT_MIN_WIDE = 0.4     # every signatory at least this fraction of the widest
+
+
+def _area(b):
+    return max(0, b[2] - b[0]) * max(0, b[3] - b[1])
+
+
+def _iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = _area(a) + _area(b) - inter
+    return inter / union if union else 0.0
+
+
+def signature_detections(dets: list) -> list:
+    """Distinct signature detections, largest first, overlaps suppressed."""
+    kept = []
+    for d in sorted((d for d in dets if "bbox" in d), key=lambda d: _area(d["bbox"]), reverse=True):
+        if all(_iou(d["bbox"], k["bbox"]) <= _DUP_IOU for k in kept):
+            kept.append(d)
+        if len(kept) == MAX_SIGNATORIES:
+            break
+    return kept
+
+
+def _side_by_side(bands: list) -> bool:
+    """
+    True when the ink bands are separate signatures: clusters of comparable
+    width laid out left to right with a real blank column gap between them.
+    Stacked bands (a flourish under the name, a caption) and small pieces
+    (an initial, a dot, a trailing stroke) belong to one signature.
+    """
+    bands = sorted(bands, key=lambda b: b["bounds"]["x1"])
+    widths = [b["bounds"]["x2"] - b["bounds"]["x1"] + 1 for b in bands]
+    if min(widths) < _SPLIT_MIN_WIDE * max(widths):
+        return False
+    for (a, wa), (b, wb) in zip(zip(bands, widths), zip(bands[1:], widths[1:])):
+        gap = b["bounds"]["x1"] - a["bounds"]["x2"] - 1
+        if gap < _SPLIT_MIN_GAP * min(wa, wb):
+            return False
+    return True
+
+
+def signature_crops(img: Image.Image, bboxes: list, split_bands: bool = True, pad: int = 20) -> list:
+    """
+    One tight crop per signatory.
+
+    Each box is padded and Line-Swept. When there is a single box and
+    `split_bands` is set, the multi-band sweep is tried first so two or three
+    signatures inside one detected area are separated — only when the bands
+    sit side by side with a clear gap; otherwise the box stays one crop.
+
+    Returns [{"bbox": [x1,y1,x2,y2], "image": PIL, "sweep": bool}, ...]
+    """
+    from detection.Line_Sweep.lineSweepDetect import line_sweep_bands, line_sweep_with_bounds
+
+    w, h = img.size
+    crops = []
+    for bbox in bboxes:
+        x1, y1, x2, y2 = bbox
+        ox, oy = max(0, x1 - pad), max(0, y1 - pad)
+        region = img.crop((ox, oy, min(w, x2 + pad), min(h, y2 + pad)))
+
+        if split_bands and len(bboxes) == 1:
+            bands = [b for b in line_sweep_bands(region) if b["image"].height >= _MIN_SIG_HEIGHT]
+            if bands:
+                tallest = max(b["image"].height for b in bands)
+                # printed captions / box rules are much thinner than signatures
+                bands = [b for b in bands if b["image"].height >= 0.5 * tallest]
+            if len(bands) > 1 and _side_by_side(bands):
+                for b in bands[:MAX_SIGNATORIES]:
+                    bb = b["bounds"]
+                    crops.append({
+                        "bbox":  [ox + bb["x1"], oy + bb["y1"], ox + bb["x2"] + 1, oy + bb["y2"] + 1],
+                        "image": b["image"],
+                        "sweep": True,
+                    })
+                continue
+
+        ls = line_sweep_with_bounds(region)
+        if ls["success"] and ls["image"].height >= _MIN_SIG_HEIGHT:
+            crops.append({"bbox": list(bbox), "image": ls["image"], "sweep": True})
+        else:
+            crops.append({"bbox": list(bbox), "image": region, "sweep": False})
+    return crops
+
+
+def svm_verdict(label: str) -> str:
+    return "GENUINE" if label == "REAL" else "FORGED" if label == "FORGED" else "INCONCLUSIVE"
+
+
+def aggregate_verdict(signatories: list) -> tuple[str, float]:
+    """
+    Cheque-level verdict from per-signatory verdicts: FORGED if any signature
+    is forged, GENUINE only when all are genuine, otherwise INCONCLUSIVE.
+    Confidence is the weakest confidence among the signatories that decide it.
+    """
+    if not signatories:
+        return "INCONCLUSIVE", 0.0
+    verdicts = [s["verdict"] for s in signatories]
+    if "FORGED" in verdicts:
+        verdict = "FORGED"
+    elif all(v == "GENUINE" for v in verdicts):
+        verdict = "GENUINE"
+    else:
+        verdict = "INCONCLUSIVE"
+    deciding = [s["confidence"] for s in signatories if s["verdict"] == verdict] or \
+               [s["confidence"] for s in signatories]
+    return verdict, min(deciding)
+
+
 class ChequeVerificationAgent:
     """Full cheque verification pipeline agent."""
 
@@ -51,46 +170,56 @@ class ChequeVerificationAgent:
 
     # ── Phase 1: Detection ────────────────────────────────────────────────────
 
-    def detect_signature(self, img: Image.Image) -> dict:
+    def detect_signatures(self, img: Image.Image) -> dict:
         """
-        Locate the signature region using Falcon Perception.
-        Falls back to heuristic bottom-right crop if Falcon finds nothing.
-        Returns: {"bbox": [x1,y1,x2,y2], "method": str, "duration_s": float}
+        Locate every signature region using Falcon Perception (joint-account
+        cheques carry up to MAX_SIGNATORIES), inside the learned signature
+        area when the bank has a layout template. Falls back to the heuristic
+        bottom-right crop if Falcon finds nothing.
+        Returns: {"bboxes": [[x1,y1,x2,y2], ...], "method": str, "duration_s": float}
         """
-        from agent_studio import _detect, _render_detections
+        from agent_studio import SIGNATURE_ROI, _detect_signature, _render_detections
+        from detection.layout_templates import record_signature, signature_roi
 
         t0 = time.time()
-        bbox = None
+        bboxes = []
         method = "heuristic"
         annotated = img.copy()
 
         try:
             self._ensure_falcon()
-            dets = _detect(img, "signature", task="segmentation")
+            roi, layout = signature_roi(img, SIGNATURE_ROI)
+            dets = signature_detections(_detect_signature(img, task="segmentation", roi=roi))
+            record_signature(layout, img.size, dets)
             if dets:
-                det = max(dets, key=lambda d: (
-                    (d["bbox"][2] - d["bbox"][0]) * (d["bbox"][3] - d["bbox"][1])
-                    if "bbox" in d else 0
-                ))
-                if "bbox" in det:
-                    bbox = det["bbox"]
-                    method = "falcon-perception"
-                    annotated = _render_detections(img, [det], "signature")
+                bboxes = [d["bbox"] for d in dets]
+                method = "falcon-perception"
+                annotated = _render_detections(img, dets, "signature")
         except Exception as e:
             print(f"[Agent] Falcon detection failed ({e}), using heuristic.")
 
-        if bbox is None:
+        if not bboxes:
             w, h = img.size
-            bbox = [int(w * 0.50), int(h * 0.58), w, h]
+            bboxes = [[int(w * 0.50), int(h * 0.58), w, h]]
             method = "heuristic"
 
         return {
-            "bbox":       bbox,
+            "bboxes":     bboxes,
             "method":     method,
             "annotated":  annotated,
             "duration_s": round(time.time() - t0, 2),
         }
 
+    def detect_signature(self, img: Image.Image) -> dict:
+        """
+        Locate the (largest) signature region using Falcon Perception.
+        Falls back to heuristic bottom-right crop if Falcon finds nothing.
+        Returns: {"bbox": [x1,y1,x2,y2], "bboxes": [...], "method": str, "duration_s": float}
+        """
+        det = self.detect_signatures(img)
+        det["bbox"] = det["bboxes"][0]
+        return det
+
     # ── Phase 1b: Line Sweep ──────────────────────────────────────────────────
 
     def line_sweep_crop(self, img: Image.Image, bbox: list) -> dict:
@@ -146,6 +275,43 @@ class ChequeVerificationAgent:
             "duration_s": round(time.time() - t0, 2),
         }
 
+    def verify_signatures(self, crops: list) -> dict:
+        """
+        Classify every signatory crop (from signature_crops) with a single
+        batched Signature SVM call.
+        Returns: {"verdict": str, "confidence": float, "signatories": [...],
+                  "model": str, "duration_s": float}
+        """
+        t0 = time.time()
+
+        from signature_svm.verifier import verify_signatures_pil, is_trained
+
+        if not is_trained():
+            return {
+                "verdict":     "UNKNOWN",
+                "confidence":  0.0,
+                "signatories": [],
+                "model":       "none",
+                "error":       "signature_svm/model.pkl not found",
+                "duration_s":  round(time.time() - t0, 2),
+            }
+
+        results = verify_signatures_pil([c["image"] for c in crops])
+        signatories = [
+            {"index": i + 1, "bbox": c["bbox"], "verdict": svm_verdict(label), "confidence": conf}
+            for i, (c, (label, conf)) in enumerate(zip(crops, results))
+        ]
+        verdict, conf = aggregate_verdict(signatories)
+
+        return {
+            "verdict":     verdict,
+            "confidence":  conf,
+            "signatories": signatories,
+            "model":       "Signature SVM",
+            "note":        "Low SVM margin; enrolment/reference signatures are needed for a reliable identity decision." if verdict == "INCONCLUSIVE" else "",
+            "duration_s":  round(time.time() - t0, 2),
+        }
+
     # ── Phase 3: Field Extraction ─────────────────────────────────────────────
 
     def extract_fields(self, img: Image.Image) -> dict:
@@ -169,6 +335,7 @@ class ChequeVerificationAgent:
 
         result = {
             "image_path": image_path,
+            "gate":       {},
             "detection":  {},
             "line_sweep": {},
             "verification": {},
@@ -176,22 +343,36 @@ class ChequeVerificationAgent:
             "total_duration_s": 0.0,
         }
 
-        # Phase 1 — Detection
-        det = self.detect_signature(img)
-        result["detection"] = {
-            "bbox":       det["bbox"],
-            "method":     det["method"],
-            "duration_s": det["duration_s"],
-        }
+        # Phase 0 — Quality gate: rejects skip the signature stages; only
+        # NOT_A_CHEQUE / UNREADABLE skip field extraction as well
+        from detection.quality_gate import assess_cheque, blocks_extraction
+        gate = assess_cheque(img)
+        result["gate"] = gate
+        if gate["verdict"]:
+            result["verification"] = {"verdict": gate["verdict"], "confidence": 0.0,
+                                      "model": "Quality gate", "error": gate["reason"]}
+            if blocks_extraction(gate):
+                result["total_duration_s"] = round(time.time() - t_total, 2)
+                return result
+        else:
+            # Phase 1 — Detection (every signatory)
+            det = self.detect_signatures(img)
+            result["detection"] = {
+                "bbox":       det["bboxes"][0],
+                "bboxes":     det["bboxes"],
+                "method":     det["method"],
+                "duration_s": det["duration_s"],
+            }
 
-        # Phase 1b — Line Sweep
-        ls = self.line_sweep_crop(img, det["bbox"])
-        result["line_sweep"] = {"success": ls.get("success", False)}
-        sig_img = ls.get("image") or img.crop(det["bbox"])
+            # Phase 1b — Line Sweep (one crop per signatory)
+            crops = signature_crops(img, det["bboxes"],
+                                    split_bands=det["method"] == "falcon-perception")
+            result["line_sweep"] = {"success": any(c["sweep"] for c in crops),
+                                    "signatures": len(crops)}
 
-        # Phase 2 — Verification
-        ver = self.verify_signature(sig_img)
-        result["verification"] = ver
+            # Phase 2 — Verification (single batched SVM call)
+            ver = self.verify_signatures(crops)
+            result["verification"] = ver
 
         # Phase 3 — Field Extraction
         try:
@@ -15,10 +15,20 @@ import gradio as gr
 # ── Models ────────────────────────────────────────────────────────────
 
 falcon_model = falcon_tokenizer = falcon_args = None
-gemma_model = gemma_processor = None
 FALCON_ID = "tiiuae/Falcon-Perception"
 GEMMA_ID = "mlx-community/gemma-4-e2b-it-8bit"
 
+# Signature ROI prior — fractional (x1, y1, x2, y2) box of the cheque where
+# the signatory area sits on Indian CTS layouts. Set to None to always scan
+# the full cheque.
+SIGNATURE_ROI = (0.40, 0.45, 1.0, 1.0)
+SIGNATURE_MAX_DIMENSION = 768
+SIGNATURE_MAX_NEW_TOKENS = 40
+
+# None = not probed yet; True/False once we know whether falcon_perception
+# accepts decoded PIL images or only file paths.
+_falcon_takes_pil = None
+
 PALETTE = [
     (99, 102, 241), (16, 185, 129), (245, 158, 11), (239, 68, 68),
     (139, 92, 246), (6, 182, 212), (236, 72, 153), (34, 197, 94),
@@ -37,6 +47,11 @@ def _font(size=14):
 
 
 def _load_falcon():
+    # Detection model of the active backend (Falcon on MLX, see vlm/backends.py)
+    from vlm.backends import get_backend
+    get_backend().load_detector()
+
+def _load_falcon_mlx():
     global falcon_model, falcon_tokenizer, falcon_args
     if falcon_model is not None: return
 
@@ -61,10 +76,8 @@ def _load_falcon():
         hf_model_id=FALCON_ID, dtype="float16")
 
 def _load_gemma():
-    global gemma_model, gemma_processor
-    if gemma_model is not None: return
-    from mlx_vlm import load
-    gemma_model, gemma_processor = load(GEMMA_ID)
+    from vlm.backends import get_backend
+    get_backend().load_generator(GEMMA_ID)   # loads once per process
 
 def _ensure():
     _load_falcon(); _load_gemma()
@@ -72,19 +85,39 @@ def _ensure():
 
 # ── Core tools ────────────────────────────────────────────────────────
 
-def _detect(img, query, task="segmentation"):
+def _run_falcon(img, query, task, max_dimension=1024, max_new_tokens=100):
+    from vlm.backends import get_backend
+    return get_backend().detect(img, query, task, max_dimension=max_dimension,
+                                max_new_tokens=max_new_tokens)
+
+
+def _run_falcon_mlx(img, query, task, max_dimension=1024, max_new_tokens=100):
     from falcon_perception import build_prompt_for_task
     from falcon_perception.mlx.batch_inference import BatchInferenceEngine, process_batch_and_generate
+    global _falcon_takes_pil
     prompt = build_prompt_for_task(query, task)
-    tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False); img.save(tmp.name)
-    batch = process_batch_and_generate(falcon_tokenizer, [(tmp.name, prompt)],
-        max_length=falcon_args.max_seq_len, min_dimension=256, max_dimension=1024,
-        patch_size=falcon_args.spatial_patch_size)
+    kw = dict(max_length=falcon_args.max_seq_len, min_dimension=256, max_dimension=max_dimension,
+              patch_size=falcon_args.spatial_patch_size)
+    batch = None
+    if _falcon_takes_pil is not False:
+        # Hand the decoded image straight to the batch builder (no PNG round trip)
+        try:
+            batch = process_batch_and_generate(falcon_tokenizer, [(img.convert("RGB"), prompt)], **kw)
+            _falcon_takes_pil = True
+        except (TypeError, AttributeError, ValueError, OSError):
+            if _falcon_takes_pil: raise
+            _falcon_takes_pil = False
+    if batch is None:
+        # This falcon_perception build only reads paths — fall back to a temp file
+        tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False); img.save(tmp.name)
+        try:
+            batch = process_batch_and_generate(falcon_tokenizer, [(tmp.name, prompt)], **kw)
+        finally:
+            os.unlink(tmp.name)
     engine = BatchInferenceEngine(falcon_model, falcon_tokenizer)
     _, aux = engine.generate(tokens=batch["tokens"], pos_t=batch["pos_t"], pos_hw=batch["pos_hw"],
         pixel_values=batch["pixel_values"], pixel_mask=batch["pixel_mask"],
-        max_new_tokens=100, temperature=0.0, task=task)
-    os.unlink(tmp.name)
+        max_new_tokens=max_new_tokens, temperature=0.0, task=task)
     w, h = img.size; bboxes = aux[0].bboxes_raw; masks_rle = aux[0].masks_rle
     dets, i, mi = [], 0, 0
     while i < len(bboxes):
@@ -106,16 +139,80 @@ def _detect(img, query, task="segmentation"):
     return dets
 
 
-def _vlm(img, prompt):
-    from mlx_vlm import generate
-    from mlx_vlm.prompt_utils import apply_chat_template
-    from mlx_vlm.utils import load_config
-    config = load_config(GEMMA_ID)
-    tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False); img.save(tmp.name)
-    fmt = apply_chat_template(gemma_processor, config, prompt, num_images=1)
-    res = generate(gemma_model, gemma_processor, fmt, [tmp.name], verbose=False, max_tokens=512, temperature=0.1)
-    os.unlink(tmp.name)
-    return res.text if hasattr(res, "text") else str(res)
+def _roi_box(img, roi):
+    """Fractional (x1, y1, x2, y2) ROI → clamped pixel box."""
+    w, h = img.size
+    x1, y1, x2, y2 = roi
+    return [max(0, int(w*x1)), max(0, int(h*y1)), min(w, int(w*x2)), min(h, int(h*y2))]
+
+
+def _detect(img, query, task="segmentation", roi=None, max_dimension=1024, max_new_tokens=100):
+    """Falcon detection, optionally restricted to a fractional ROI of `img`.
+
+    With `roi`, only that region is encoded; bboxes and masks are mapped back
+    to full-image coordinates so callers never see the crop.
+    """
+    if roi is None:
+        return _run_falcon(img, query, task, max_dimension, max_new_tokens)
+    ox1, oy1, ox2, oy2 = _roi_box(img, roi)
+    if ox2 - ox1 < 16 or oy2 - oy1 < 16:
+        return _run_falcon(img, query, task, max_dimension, max_new_tokens)
+    dets = _run_falcon(img.crop((ox1, oy1, ox2, oy2)), query, task, max_dimension, max_new_tokens)
+    w, h = img.size
+    for d in dets:
+        if "bbox" in d:
+            bx1, by1, bx2, by2 = d["bbox"]
+            d["bbox"] = [bx1 + ox1, by1 + oy1, bx2 + ox1, by2 + oy1]
+        if "mask" in d:
+            full = np.zeros((h, w), dtype=bool)
+            full[oy1:oy2, ox1:ox2] = d["mask"]
+            d["mask"] = full
+        d["roi"] = [ox1, oy1, ox2, oy2]
+    return dets
+
+
+def _detect_signature(img, task="segmentation", roi=SIGNATURE_ROI):
+    """Signature detection using the lower-right ROI prior.
+
+    Runs Falcon on the ROI at SIGNATURE_MAX_DIMENSION with a reduced token
+    budget; falls back to the full cheque at the default resolution when the
+    ROI pass finds nothing.
+    """
+    if roi is not None:
+        dets = _detect(img, "signature", task, roi=roi,
+                       max_dimension=SIGNATURE_MAX_DIMENSION,
+                       max_new_tokens=SIGNATURE_MAX_NEW_TOKENS)
+        if dets:
+            return dets
+    return _detect(img, "signature", task)
+
+
+def _vlm(img, prompt, max_tokens=512, stop=None, criteria=None):
+    # Active backend: mlx (in-memory mlx_vlm), cpu (transformers) or stub.
+    # Runaway repetition is cut off unless other criteria are given.
+    from vlm.backends import get_backend
+    from vlm.stopping import text_criteria
+    return get_backend().generate(img, prompt, max_tokens=max_tokens, stop=stop, model=GEMMA_ID,
+                                  criteria=text_criteria() if criteria is None else criteria)
+
+
+def _vlm_batch(requests):
+    """Several small image + prompt requests as one batched generation."""
+    from vlm.backends import get_backend
+    return get_backend().batch(requests, model=GEMMA_ID)
+
+
+def _vlm_stream(img, prompt, max_tokens=512, stop=None, prefix=None, usage=None, criteria=None):
+    """`_vlm` as a stream of text deltas; `usage` is filled when it ends."""
+    from vlm.backends import get_backend
+    return get_backend().stream(img, prompt, max_tokens=max_tokens, stop=stop,
+                                model=GEMMA_ID, prefix=prefix, usage=usage, criteria=criteria)
+
+
+def _vlm_conversation(img):
+    """Multi-turn Gemma chat about `img`; the image is encoded once where supported."""
+    from vlm.backends import get_backend
+    return get_backend().conversation(img, model=GEMMA_ID)
 
 
 # ── Rendering ─────────────────────────────────────────────────────────
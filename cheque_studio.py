@@ -45,9 +45,11 @@ import uvicorn
 BASE_DIR = Path(__file__).resolve().parent
 sys.path.insert(0, str(BASE_DIR))
 
-from detection.ocr_extractor    import extract_cheque_fields
-from detection.Line_Sweep.lineSweepDetect import line_sweep_with_bounds
-from signature_svm.verifier import is_trained, verify_signature_pil
+from detection.ocr_extractor    import extract_cheque_field_events
+from signature_svm.verifier import is_trained, verify_signature_pil, verify_signatures_pil
+from agent import aggregate_verdict, signature_crops, signature_detections, svm_verdict
+from detection.quality_gate import assess_cheque, blocks_extraction
+from detection.presentment_index import duplicate_flag
 
 # Lazy Gemma 4 import — only loaded when reasoning tab is used
 _gemma_load_fn = None
@@ -97,6 +99,18 @@ _SSE_HEADERS = {
 }
 
 
+def _gate_event(gate: dict) -> dict:
+    """SSE event for an upload rejected by the quality gate."""
+    return {
+        "type":        "gate_reject",
+        "verdict":     gate["verdict"],
+        "message":     gate["reason"],
+        "scores":      gate["scores"],
+        "duration_ms": gate["duration_ms"],
+        "color":       "#f59e0b",
+    }
+
+
 # ── Tab 1: Signature Verification — SSE event generator ──────────────────────
 
 def execute_signature_events(img: Image.Image):
@@ -104,8 +118,11 @@ def execute_signature_events(img: Image.Image):
     Yields SSE event dicts for the Signature Verification pipeline:
       Phase 1: Falcon Perception → detect signature region (instance segmentation)
                Fallback: heuristic bottom-right crop if Falcon not installed
-      Phase 1: Line Sweep → tight crop
-      Phase 2: Signature SVM -> classify GENUINE / FORGED
+      Phase 1: Line Sweep → tight crop per signatory (joint accounts: up to 3)
+      Phase 2: Signature SVM -> GENUINE / FORGED per signatory, one batched call
+
+    A millisecond quality gate runs first; blank signature areas, unreadable
+    photos and non-cheques end with a gate_reject event and no model calls.
 
     Each run saves intermediate outputs to step_outputs/<timestamp>/.
     """
@@ -113,6 +130,13 @@ def execute_signature_events(img: Image.Image):
     step_dir = STEP_OUTPUTS_DIR / str(run_id)
     step_dir.mkdir(parents=True, exist_ok=True)
 
+    # ── Phase 0: quality gate — skip the model stages for rejects ─────────
+    gate = assess_cheque(img)
+    if gate["verdict"]:
+        yield _gate_event(gate)
+        yield {"type": "done", "json_output": {"gate": gate}}
+        return
+
     # ── Phase 1a: Falcon Perception — signature detection ─────────────────
     yield {
         "type":       "detect_start",
@@ -125,28 +149,26 @@ def execute_signature_events(img: Image.Image):
     }
 
     t0             = time.time()
-    bbox           = None
+    bboxes         = []
     method         = "heuristic"
     annotated      = img.copy()
     falcon_used    = False
-    falcon_ran     = False   # True = _detect() completed without exception
+    falcon_ran     = False   # True = _detect_signature() completed without exception
 
     try:
-        from agent_studio import _load_falcon, _detect, _render_detections
+        from agent_studio import SIGNATURE_ROI, _load_falcon, _detect_signature, _render_detections
+        from detection.layout_templates import record_signature, signature_roi
         _load_falcon()
-        dets = _detect(img, "signature", task="segmentation")
+        roi, layout = signature_roi(img, SIGNATURE_ROI)
+        dets = signature_detections(_detect_signature(img, task="segmentation", roi=roi))
+        record_signature(layout, img.size, dets)
         falcon_ran = True
 
         if dets:
-            det = max(dets, key=lambda d: (
-                (d["bbox"][2] - d["bbox"][0]) * (d["bbox"][3] - d["bbox"][1])
-                if "bbox" in d else 0
-            ))
-            if "bbox" in det:
-                bbox        = det["bbox"]
-                method      = "falcon-perception"
-                falcon_used = True
-                annotated   = _render_detections(img, [det], "signature")
+            bboxes      = [d["bbox"] for d in dets]
+            method      = "falcon-perception"
+            falcon_used = True
+            annotated   = _render_detections(img, dets, "signature")
 
     except Exception as e:
         print(f"[Detection] Falcon error ({e}), using heuristic.")
@@ -156,9 +178,10 @@ def execute_signature_events(img: Image.Image):
     # ── Heuristic fallback when Falcon produced no usable bbox ────────────
     # This handles: short signatures, disconnected strokes, Falcon misses.
     # Never return UNSIGNED here — always run SVM on the best available crop.
-    if bbox is None:
+    if not bboxes:
         w, h  = img.size
         bbox  = [int(w * 0.50), int(h * 0.58), w, h]
+        bboxes = [bbox]
         method = "heuristic"
         from PIL import ImageDraw, ImageFont
         draw = ImageDraw.Draw(annotated)
@@ -187,58 +210,52 @@ def execute_signature_events(img: Image.Image):
     except Exception:
         pass
 
-    x1, y1, x2, y2 = bbox
+    x1, y1, x2, y2 = bboxes[0]
     yield {
         "type":       "detect_complete",
-        "count":      1,
+        "count":      len(bboxes),
         "image_b64":  img_to_b64(annotated),
         "duration_s": dt_detect,
-        "bboxes":     [{"x1": x1, "y1": y1, "x2": x2, "y2": y2,
-                        "w": x2 - x1, "h": y2 - y1}],
+        "bboxes":     [{"x1": b[0], "y1": b[1], "x2": b[2], "y2": b[3],
+                        "w": b[2] - b[0], "h": b[3] - b[1]} for b in bboxes],
         "method":     method,
         "model":      "Falcon Perception 0.6B" if falcon_used else "Heuristic",
         "color":      "#6366f1",
     }
 
-    # ── Phase 1b: Crop + Line Sweep refinement ────────────────────────────
+    # ── Phase 1b: Crop + Line Sweep refinement (one crop per signatory) ───
     yield {"type": "crop_start", "label": "Line Sweep — tight crop",
            "phase": "Phase 1 — Detection", "color": "#f59e0b"}
 
-    w_img, h_img = img.size
-    pad    = 20
-    region = img.crop((max(0, x1 - pad), max(0, y1 - pad),
-                       min(w_img, x2 + pad), min(h_img, y2 + pad)))
-
-    sweep_result = line_sweep_with_bounds(region)
-
-    # Guard: if Line Sweep returns a degenerate crop (< 30 px tall) use the
-    # padded Falcon region directly — avoids the 10-px strip issue.
-    if sweep_result["success"] and sweep_result["image"].size[1] >= 30:
-        cropped  = sweep_result["image"]
-        sweep_ok = True
-    else:
-        cropped  = region
-        sweep_ok = False
+    # Guard inside signature_crops: a degenerate Line Sweep crop (< 30 px
+    # tall) falls back to the padded region — avoids the 10-px strip issue.
+    crops    = signature_crops(img, bboxes, split_bands=falcon_used)
+    cropped  = crops[0]["image"]
+    sweep_ok = crops[0]["sweep"]
 
     dt_sweep = round(time.time() - t0 - dt_detect, 4)
 
-    try:
-        cropped.save(step_dir / "2_cropped_signature.jpg", quality=90)
-    except Exception:
-        pass
+    for i, c in enumerate(crops, start=1):
+        try:
+            c["image"].save(step_dir / f"2_cropped_signature_{i}.jpg", quality=90)
+        except Exception:
+            pass
 
-    crop_info = {"w": cropped.width, "h": cropped.height, "sweep_success": sweep_ok}
+    crop_info = {"w": cropped.width, "h": cropped.height, "sweep_success": sweep_ok,
+                 "signatures": len(crops)}
 
     yield {
         "type":       "crop_complete",
         "image_b64":  img_to_b64(cropped),
+        "crops_b64":  [img_to_b64(c["image"]) for c in crops],
         "duration_s": dt_sweep,
         "bbox":       {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
         "crop_size":  crop_info,
         "color":      "#f59e0b",
     }
 
-    # ── Phase 2: Signature SVM Verification ───────────────────────────────
+    # ── Phase 2: Signature SVM Verification (one batched call) ────────────
+    signatories = []
     if not is_trained():
         yield {
             "type":    "verify_stub",
@@ -257,23 +274,31 @@ def execute_signature_events(img: Image.Image):
         }
 
         try:
-            svm_label, conf = verify_signature_pil(cropped)
-            verdict = "GENUINE" if svm_label == "REAL" else "FORGED" if svm_label == "FORGED" else "INCONCLUSIVE"
+            results = verify_signatures_pil([c["image"] for c in crops])
+            signatories = [
+                {"index": i + 1, "bbox": c["bbox"],
+                 "verdict": svm_verdict(label), "confidence": conf}
+                for i, (c, (label, conf)) in enumerate(zip(crops, results))
+            ]
+            verdict, conf = aggregate_verdict(signatories)
             dt_svm  = round(time.time() - t0 - dt_detect - dt_sweep, 4)
 
             yield {
-                "type":       "verify_complete",
-                "verdict":    verdict,
-                "confidence": conf,
-                "duration_s": dt_svm,
-                "model":      "Signature SVM",
-                "color":      "#10b981" if verdict == "GENUINE" else "#f43f5e" if verdict == "FORGED" else "#f59e0b",
+                "type":        "verify_complete",
+                "verdict":     verdict,
+                "confidence":  conf,
+                "signatories": signatories,
+                "duration_s":  dt_svm,
+                "model":       "Signature SVM",
+                "color":       "#10b981" if verdict == "GENUINE" else "#f43f5e" if verdict == "FORGED" else "#f59e0b",
             }
             try:
                 (step_dir / "3_verdict.txt").write_text(
                     f"verdict={verdict}\n"
                     f"confidence={conf}\n"
                     f"detection_method={method}\n"
+                    + "".join(f"signatory_{s['index']}={s['verdict']} ({s['confidence']:.3f})\n"
+                              for s in signatories)
                 )
             except Exception:
                 pass
@@ -298,9 +323,11 @@ def execute_signature_events(img: Image.Image):
         "json_output": {
             "image_size":        {"width": img.width, "height": img.height},
             "detected_bbox":     {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
+            "detected_bboxes":   bboxes,
             "crop_size":         crop_info,
             "detection_method":  method,
             "detection_time_s":  dt_detect,
+            "signatories":       signatories,
         },
     }
 
@@ -308,7 +335,17 @@ def execute_signature_events(img: Image.Image):
 # ── Tab 2: Data Extraction — SSE event generator ──────────────────────────────
 
 def execute_extraction_events(img: Image.Image):
-    """Yields SSE dicts for the Data Extraction tab (Gemma 4 E2B via mlx_vlm)."""
+    """
+    Yields SSE dicts for the Data Extraction tab (Gemma 4 E2B via mlx_vlm).
+    Only NOT_A_CHEQUE / UNREADABLE gate verdicts stop it; an unsigned cheque
+    still has fields to read.
+    """
+
+    gate = assess_cheque(img)
+    if blocks_extraction(gate):
+        yield _gate_event(gate)
+        yield {"type": "done", "json_output": {}}
+        return
 
     yield {"type": "loading_models"}
     yield {"type": "models_ready"}
@@ -322,8 +359,22 @@ def execute_extraction_events(img: Image.Image):
 
     t0 = time.time()
     try:
-        fields = extract_cheque_fields(img)
+        # Fields are streamed as soon as each value is complete; later passes
+        # (regex, repair, normalisation) send field_updated for changes.
+        fields = {}
+        for ev in extract_cheque_field_events(img):
+            if ev["type"] == "result":
+                fields = ev["fields"]
+                continue
+            yield {
+                "type":   "field_updated" if ev["update"] else "extract_field",
+                "key":    ev["key"],
+                "value":  ev["value"],
+                "source": ev["source"],
+                "t_s":    round(time.time() - t0, 2),
+            }
         dt     = fields.pop("_duration_s", round(time.time() - t0, 2))
+        timings = fields.pop("_timings", {})
 
         if "error" in fields:
             yield {
@@ -337,6 +388,8 @@ def execute_extraction_events(img: Image.Image):
             "type":       "extract_complete",
             "fields":     fields,
             "duration_s": dt,
+            "timings":    timings,
+            "time_to_first_field_s": timings.get("time_to_first_field_s"),
             "model":      "Gemma 4 E2B",
             "color":      "#8b5cf6",
         }
@@ -592,33 +645,65 @@ async def signature_verify_crop(request: Request):
     })
 
 
+def _gate_verification(gate: dict) -> dict:
+    """Verification block for an upload rejected by the quality gate."""
+    return {
+        "verdict":    gate["verdict"],
+        "confidence": 0.0,
+        "model":      "Quality gate",
+        "error":      gate["reason"],
+        "duration_s": round(gate["duration_ms"] / 1000, 3),
+    }
+
+
+def _signatories_payload(crops: list, ver: dict) -> list:
+    """Per-signatory verdicts + crops for the REST responses."""
+    by_index = {sgn["index"]: sgn for sgn in ver.get("signatories", [])}
+    return [
+        {**by_index.get(i, {"index": i, "bbox": c["bbox"]}),
+         "crop_b64": _b64_png(c["image"])}
+        for i, c in enumerate(crops, start=1)
+    ]
+
+
 @app.post("/api/cheque/verify")
 async def cheque_verify(request: Request):
     """
-    Detect + crop the signature, then classify with the Signature SVM.
-    Returns crop images + verdict in the format expected by the JS frontend.
+    Detect + crop every signature, then classify them with one batched
+    Signature SVM call. Returns crop images + verdict in the format expected
+    by the JS frontend, plus per-signatory verdicts.
     """
     img = await _read_upload(request)
     if img is None:
         return JSONResponse({"error": "no file uploaded"}, status_code=400)
 
+    gate = assess_cheque(img)
+    duplicate = duplicate_flag(img)
+    if gate["verdict"]:
+        ver = _gate_verification(gate)
+        return JSONResponse({"gate": gate, "verification": ver, "verdict": _verdict_payload(ver),
+                             "duplicate": duplicate})
+
     from agent import ChequeVerificationAgent
     agent = ChequeVerificationAgent()
 
-    det = agent.detect_signature(img)
-    ls  = agent.line_sweep_crop(img, det["bbox"])
-    sig_img = ls.get("image") or img.crop(det["bbox"])
+    det   = agent.detect_signatures(img)
+    crops = signature_crops(img, det["bboxes"], split_bands=det["method"] == "falcon-perception")
+    sig_img = crops[0]["image"]
 
-    ver = agent.verify_signature(sig_img)
+    ver = agent.verify_signatures(crops)
 
     return JSONResponse({
-        "detection":          {"bbox": det["bbox"], "method": det["method"],
-                               "duration_s": det["duration_s"]},
-        "line_sweep":         {"success": ls.get("success", False)},
+        "detection":          {"bbox": det["bboxes"][0], "bboxes": det["bboxes"],
+                               "method": det["method"], "duration_s": det["duration_s"]},
+        "line_sweep":         {"success": crops[0]["sweep"], "signatures": len(crops)},
         "verification":       ver,
         "verdict":            _verdict_payload(ver),
+        "signatories":        _signatories_payload(crops, ver),
         "annotated_b64":      _b64_png(det.get("annotated", img)),
         "signature_crop_b64": _b64_png(sig_img),
+        "gate":               gate,
+        "duplicate":          duplicate,
     })
 
 
@@ -626,28 +711,38 @@ async def cheque_verify(request: Request):
 async def cheque_crop(request: Request):
     """
     Step 1 — detect + line-sweep only. Returns annotated cheque and cropped
-    signature as base64. Does not run signature verification.
+    signature(s) as base64. Does not run signature verification.
     """
     img = await _read_upload(request)
     if img is None:
         return JSONResponse({"error": "no file uploaded"}, status_code=400)
 
+    gate = assess_cheque(img)
+    duplicate = duplicate_flag(img)
+    if gate["verdict"]:
+        return JSONResponse({"error": f"{gate['verdict']}: {gate['reason']}", "gate": gate,
+                             "duplicate": duplicate})
+
     from agent import ChequeVerificationAgent
     agent = ChequeVerificationAgent()
 
-    det = agent.detect_signature(img)
-    ls  = agent.line_sweep_crop(img, det["bbox"])
-    sig_img = ls.get("image") or img.crop(det["bbox"])
+    det   = agent.detect_signatures(img)
+    crops = signature_crops(img, det["bboxes"], split_bands=det["method"] == "falcon-perception")
+    sig_img = crops[0]["image"]
 
     return JSONResponse({
         "detection": {
-            "bbox":       det["bbox"],
+            "bbox":       det["bboxes"][0],
+            "bboxes":     det["bboxes"],
             "method":     det["method"],
             "duration_s": det["duration_s"],
         },
-        "line_sweep":        {"success": ls.get("success", False)},
-        "annotated_b64":     _b64_png(det.get("annotated", img)),
+        "line_sweep":         {"success": crops[0]["sweep"], "signatures": len(crops)},
+        "annotated_b64":      _b64_png(det.get("annotated", img)),
         "signature_crop_b64": _b64_png(sig_img),
+        "signature_crops_b64": [_b64_png(c["image"]) for c in crops],
+        "gate":               gate,
+        "duplicate":          duplicate,
     })
 
 
@@ -662,6 +757,14 @@ async def cheque_extract(request: Request):
     if img is None:
         return JSONResponse({"error": "no file uploaded"}, status_code=400)
 
+    gate = assess_cheque(img)
+    if blocks_extraction(gate):
+        return JSONResponse({
+            "extraction": {"error": f"{gate['verdict']}: {gate['reason']}"},
+            "gate":       gate,
+            "duplicate":  duplicate_flag(img),
+        })
+
     from agent import ChequeVerificationAgent
     agent = ChequeVerificationAgent()
 
@@ -671,27 +774,36 @@ async def cheque_extract(request: Request):
     except Exception as e:
         fields = {"error": str(e)}
 
-    return JSONResponse({"extraction": fields})
+    # Only completed extractions are recorded: the key needs the fields.
+    duplicate = duplicate_flag(img, fields, record="error" not in fields)
+    return JSONResponse({"extraction": fields, "gate": gate, "duplicate": duplicate})
 
 
 @app.post("/api/cheque/forgery")
 async def cheque_forgery(request: Request):
     """
-    Compatibility endpoint: detection + Line Sweep + Signature SVM forgery check.
+    Compatibility endpoint: detection + Line Sweep + Signature SVM forgery check
+    (every signatory, one batched SVM call).
     """
     img = await _read_upload(request)
     if img is None:
         return JSONResponse({"error": "no file uploaded"}, status_code=400)
 
+    gate = assess_cheque(img)
+    duplicate = duplicate_flag(img)
+    if gate["verdict"]:
+        return JSONResponse({"gate": gate, "verification": _gate_verification(gate),
+                             "duplicate": duplicate})
+
     from agent import ChequeVerificationAgent
     agent = ChequeVerificationAgent()
 
-    det = agent.detect_signature(img)
-    ls  = agent.line_sweep_crop(img, det["bbox"])
-    sig_img = ls.get("image") or img.crop(det["bbox"])
+    det   = agent.detect_signatures(img)
+    crops = signature_crops(img, det["bboxes"], split_bands=det["method"] == "falcon-perception")
+    sig_img = crops[0]["image"]
 
     try:
-        ver = agent.verify_signature(sig_img)
+        ver = agent.verify_signatures(crops)
     except Exception as e:
         ver = {
             "verdict": "ERROR",
@@ -702,14 +814,18 @@ async def cheque_forgery(request: Request):
 
     return JSONResponse({
         "detection": {
-            "bbox":   det["bbox"],
+            "bbox":   det["bboxes"][0],
+            "bboxes": det["bboxes"],
             "method": det["method"],
             "duration_s": det["duration_s"],
         },
-        "line_sweep": {"success": ls.get("success", False)},
+        "line_sweep": {"success": crops[0]["sweep"], "signatures": len(crops)},
         "verification": ver,
+        "signatories": _signatories_payload(crops, ver),
         "signature_crop_b64": _b64_png(sig_img),
         "annotated_b64":      _b64_png(det.get("annotated", img)),
+        "gate":               gate,
+        "duplicate":          duplicate,
     })
 
 
@@ -1565,7 +1681,24 @@ let currentFields = null;
 
 function hasValue(v) { return v !== null && v !== undefined && v !== ''; }
 
-function renderFields(fields, durationS) {
+function timingText(t) {
+  const a = t && t.amounts;
+  const warn = a && a.status === 'mismatch'
+    ? ` &nbsp;&middot;&nbsp; <span style="color:var(--rose)">amount figures ${a.numeric_value} &ne; words ${a.words_value}</span>` : '';
+  return baseTimingText(t) + warn;
+}
+
+function baseTimingText(t) {
+  const c = t && t.cascade;
+  if (c) return ` &nbsp;&middot;&nbsp; ${c.accepted.length} fields by OCR, ${c.vlm_calls} VLM calls (${c.vlm_calls_avoided} avoided)`;
+  const j = t && t.json;
+  if (!j || j.prefill_s === null || j.prefill_s === undefined) return '';
+  const h = t.hint;
+  const hint = h && h.mode === 'compact' ? ` &nbsp;&middot;&nbsp; OCR hint ${h.tokens_in}&rarr;${h.tokens_out} tok` : '';
+  return ` &nbsp;&middot;&nbsp; prefill ${j.prefill_s}s / decode ${j.decode_s}s` + hint;
+}
+
+function renderFields(fields, durationS, timings) {
   currentFields = fields;
   if (fields.raw_response) {
     return `<div class="section-lbl">Raw Response (JSON parse failed)</div>
@@ -1576,7 +1709,7 @@ function renderFields(fields, durationS) {
   const pct      = Math.round(detected / total * 100);
   const pillCls  = pct >= 75 ? 'ok' : 'partial';
   const summary  = `<div class="extract-summary">
-    <span>Extracted in ${durationS}s &nbsp;&middot;&nbsp; Gemma 4 E2B</span>
+    <span>Extracted in ${durationS}s &nbsp;&middot;&nbsp; Gemma 4 E2B${timingText(timings)}</span>
     <span class="pill ${pillCls}">${detected}/${total} fields &nbsp;(${pct}%)</span>
   </div>`;
   const rows = FIELD_META.map(m => {
@@ -1648,6 +1781,7 @@ async function runExtract() {
   document.getElementById('extract-panel').innerHTML =
     `<div class="loading-row"><span class="spinner violet"></span>Preparing OCR and reading cheque fields...</div>`;
 
+  const liveFields = {};
   let res;
   try {
     res = await fetch('/api/extract/stream', {
@@ -1664,12 +1798,19 @@ async function runExtract() {
           document.getElementById('extract-panel').innerHTML =
             `<div class="loading-row"><span class="spinner violet"></span>Qwen OCR and Gemma are analysing cheque fields...</div>`;
           break;
+        case 'extract_field':
+        case 'field_updated':
+          liveFields[ev.key] = ev.value;
+          document.getElementById('extract-time').textContent = ev.t_s + 's';
+          document.getElementById('extract-panel').innerHTML = renderFields(liveFields, ev.t_s + '…');
+          break;
         case 'extract_complete':
           document.getElementById('extract-time').textContent = ev.duration_s + 's';
-          document.getElementById('extract-panel').innerHTML = renderFields(ev.fields, ev.duration_s);
+          document.getElementById('extract-panel').innerHTML = renderFields(ev.fields, ev.duration_s, ev.timings);
           document.getElementById('export-bar').style.display = 'flex';
           ['exp-csv','exp-json','exp-copy'].forEach(id => { document.getElementById(id).disabled = false; });
           break;
+        case 'gate_reject':
         case 'extract_unavailable':
           document.getElementById('extract-panel').innerHTML =
             `<div class="empty" style="color:var(--amber)"><span class="empty-icon">⚠️</span>
@@ -74,10 +74,10 @@ def run_demo(image_path: str, extract_only: bool = False):
         bbox = None
         detect_method = "heuristic"
         try:
-            from agent_studio import _load_falcon, _detect
+            from agent_studio import _load_falcon, _detect_signature
             _info("Loading Falcon Perception 0.6B …")
             _load_falcon()
-            dets = _detect(img, "signature", task="segmentation")
+            dets = _detect_signature(img, task="segmentation")
             if dets:
                 det = max(dets, key=lambda d: (
                     (d["bbox"][2] - d["bbox"][0]) * (d["bbox"][3] - d["bbox"][1])
@@ -13,13 +13,14 @@ Changes from original:
     Exposed here as callable functions so other modules can import and reuse.
   - `connected_component_crop(img)`        → PIL Image → PIL Image
   - `connected_component_with_bounds(img)` → PIL Image → dict with bounds + image
-  - `main(input_dir, output_dir)`          → original batch-processing behaviour
+  - `main(input_dir, output_dir)`          → batch processing via detection.batch_runner
   - Logic (pixel scanning, union-find calls) is identical to the original.
 """
 
 import operator
 import os
 import random
+import sys
 import numpy as np
 import cv2
 from itertools import product
@@ -180,11 +181,31 @@ def connected_component_crop(img: Image.Image) -> Image.Image:
 
 # ── Batch script mode ───────────────────────────
 
-def main(input_dir: str = None, output_dir: str = None):
+def _batch_process(img: Image.Image):
+    """Batch-runner stage: largest-component crop, or None on failure."""
+    result = connected_component_with_bounds(img)
+    return result["image"] if result["success"] else None
+
+
+def _batch_runner():
+    try:
+        from detection import batch_runner
+    except ImportError:
+        sys.path.insert(0, os.path.abspath(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")))
+        from detection import batch_runner
+    return batch_runner
+
+
+def main(input_dir: str = None, output_dir: str = None, workers: int = None,
+         max_in_flight: int = None, resume: bool = True, dry_run: bool = False):
     """
     Process every image in `input_dir` with Connected Components and write
     the cropped results to `output_dir`.
 
+    Runs on a process pool via detection.batch_runner — resumable through the
+    output folder's manifest, with an optional timing-only dry run.
+
     Default paths:
       input_dir  → ../OCR/OCR_Results
       output_dir → ./ConnectedComponents_Results
@@ -200,32 +221,22 @@ def main(input_dir: str = None, output_dir: str = None):
             "ConnectedComponents_Results",
         )
 
-    os.makedirs(output_dir, exist_ok=True)
-    total = processed = 0
-
-    for filename in os.listdir(input_dir):
-        file_path = os.path.join(input_dir, filename)
-        total += 1
-
-        if os.stat(file_path).st_size == 0:
-            continue
-
-        print(f"Processing {filename}")
-        img    = Image.open(file_path)
-        result = connected_component_with_bounds(img)
-
-        if result["success"]:
-            out_name = f"CC_Result_{filename}"
-            cv2.imwrite(
-                os.path.join(output_dir, out_name),
-                cv2.cvtColor(np.array(result["image"]), cv2.COLOR_RGB2BGR),
-            )
-            processed += 1
+    stats = _batch_runner().run_batch(
+        input_dir, output_dir, _batch_process, "CC_Result_",
+        workers=workers, max_in_flight=max_in_flight,
+        executor="process", resume=resume, dry_run=dry_run,
+    )
 
-    print(f"{processed}/{total} files processed successfully")
+    print(f"{stats['processed']}/{stats['total']} files processed successfully")
     print("Processing Complete.")
     print("You may check the Result folder in the same directory to see the cropped images.")
+    return stats
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    _args = _batch_runner().add_batch_args(
+        argparse.ArgumentParser(description="Connected Components batch crop")).parse_args()
+    main(_args.input_dir, _args.output_dir, workers=_args.workers,
+         max_in_flight=_args.max_in_flight, resume=not _args.no_resume,
+         dry_run=_args.dry_run)
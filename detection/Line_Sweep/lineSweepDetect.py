@@ -14,11 +14,13 @@ Changes from original:
     other modules (cheque_studio, glm_ocr_detect) can import and reuse it.
   - `line_sweep_crop(img)`          → PIL Image → PIL Image
   - `line_sweep_with_bounds(img)`   → PIL Image → dict with bounds + image
-  - `main(input_dir, output_dir)`   → original batch-processing behaviour
+  - `line_sweep_bands(img)`         → PIL Image → every ink band (multi-signature)
+  - `main(input_dir, output_dir)`   → batch processing via detection.batch_runner
   - Logic (threshold values, sweep conditions) is identical to the original.
 """
 
 import os
+import sys
 import numpy as np
 import cv2
 from PIL import Image
@@ -120,13 +122,85 @@ def line_sweep_with_bounds(img: Image.Image) -> dict:
     }
 
 
+def _runs(mask: np.ndarray, max_gap: int, min_len: int) -> list:
+    """[start, end] index runs of True in a 1-D mask, bridging gaps ≤ max_gap."""
+    idx = np.flatnonzero(mask)
+    if idx.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > max_gap + 1)
+    starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    ends   = np.concatenate((idx[breaks], [idx[-1]]))
+    return [(int(a), int(b)) for a, b in zip(starts, ends) if b - a + 1 >= min_len]
+
+
+def line_sweep_bands(img: Image.Image, min_rows: int = 5, min_cols: int = 20,
+                     row_gap: int = None, col_gap: int = None) -> list:
+    """
+    Multi-band Line Sweep for regions holding several signatures
+    (joint-account cheques).
+
+    Where line_sweep_with_bounds stops at the first ink band, this sweeps the
+    whole region with row/column projections:
+      1. Same grayscale + inverse threshold at 128.
+      2. Row projection → every horizontal ink band taller than `min_rows`
+         (gaps up to `row_gap` rows are bridged so one signature stays whole).
+      3. Column projection inside each band → every ink block wider than
+         `min_cols`, split where the blank gap exceeds `col_gap`.
+
+    Returns a list of {"image": PIL crop, "bounds": {"x1","y1","x2","y2"}}
+    ordered top-to-bottom, left-to-right. Empty when no band is found.
+    """
+    original_np = np.array(img.convert("RGB"))
+    _, thresh = cv2.threshold(
+        np.array(img.convert("L")), 128, 255, cv2.THRESH_BINARY_INV
+    )
+    ink = thresh == 255
+    rows, cols = ink.shape
+    if row_gap is None:
+        row_gap = max(3, rows // 25)
+    if col_gap is None:
+        col_gap = max(20, cols // 12)
+
+    bands = []
+    for y1, y2 in _runs(ink.any(axis=1), row_gap, min_rows):
+        for x1, x2 in _runs(ink[y1:y2 + 1].any(axis=0), col_gap, min_cols):
+            crop = original_np[y1:y2 + 1, x1:x2 + 1]
+            if crop.shape[0] < 5 or crop.shape[1] < 5:
+                continue
+            bands.append({
+                "image":  Image.fromarray(crop),
+                "bounds": {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
+            })
+    return bands
+
+
 # ── Batch script mode ───────────────────────────
 
-def main(input_dir: str = None, output_dir: str = None):
+def _batch_process(img: Image.Image):
+    """Batch-runner stage: Line Sweep crop, or None when the sweep fails."""
+    result = line_sweep_with_bounds(img)
+    return result["image"] if result["success"] else None
+
+
+def _batch_runner():
+    try:
+        from detection import batch_runner
+    except ImportError:
+        sys.path.insert(0, os.path.abspath(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")))
+        from detection import batch_runner
+    return batch_runner
+
+
+def main(input_dir: str = None, output_dir: str = None, workers: int = None,
+         max_in_flight: int = None, resume: bool = True, dry_run: bool = False):
     """
     Process every image in `input_dir` with the Line Sweep algorithm and
     write the cropped results to `output_dir`.
 
+    Runs on a process pool via detection.batch_runner — resumable through the
+    output folder's manifest, with an optional timing-only dry run.
+
     Default paths:
       input_dir  → ../OCR/OCR_Results
       output_dir → ./LineSweep_Results
@@ -142,33 +216,22 @@ def main(input_dir: str = None, output_dir: str = None):
             "LineSweep_Results",
         )
 
-    os.makedirs(output_dir, exist_ok=True)
-    total = processed = 0
-
-    for filename in os.listdir(input_dir):
-        file_path = os.path.join(input_dir, filename)
-        total += 1
-
-        if os.stat(file_path).st_size == 0:
-            continue
-
-        print(f"Processing {filename}")
-        img    = Image.open(file_path)
-        result = line_sweep_with_bounds(img)
-
-        if result["success"]:
-            out_name = f"LineSweep_Result_{filename}"
-            # Save as BGR (cv2)
-            cv2.imwrite(
-                os.path.join(output_dir, out_name),
-                cv2.cvtColor(np.array(result["image"]), cv2.COLOR_RGB2BGR),
-            )
-            processed += 1
+    stats = _batch_runner().run_batch(
+        input_dir, output_dir, _batch_process, "LineSweep_Result_",
+        workers=workers, max_in_flight=max_in_flight,
+        executor="process", resume=resume, dry_run=dry_run,
+    )
 
-    print(f"{processed}/{total} files processed successfully")
+    print(f"{stats['processed']}/{stats['total']} files processed successfully")
     print("Processing Complete.")
     print("You may check the Result folder in the same directory to see the cropped images.")
+    return stats
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    _args = _batch_runner().add_batch_args(
+        argparse.ArgumentParser(description="Line Sweep batch crop")).parse_args()
+    main(_args.input_dir, _args.output_dir, workers=_args.workers,
+         max_in_flight=_args.max_in_flight, resume=not _args.no_resume,
+         dry_run=_args.dry_run)
@@ -0,0 +1,298 @@
+"""
+Amount in Words — Indian numbering, both directions
+===================================================
+Deterministic parser and formatter for the courtesy (figures) and legal
+(words) amounts on Indian cheques, used to cross-check `amount_numeric`
+against `amount_words` without a VLM call:
+
+  parse_amount_words("Rupees Twelve Lakh Fifty Thousand Only")  → Decimal("1250000")
+  parse_amount_numeric("₹ 12,50,000/-")                          → Decimal("1250000")
+  amount_to_words(Decimal("1250000.50"))
+      → "Rupees Twelve Lakh Fifty Thousand and Fifty Paise Only"
+  cross_check(numeric, words)   → {"status", "amount_numeric", "amount_words", ...}
+
+Words handled: units / teens / tens, hundred, thousand, lakh, crore (and
+million / billion), "Rupees … Only", "and … Paise", hyphenated and run-together
+words ("TwentyFive", "fivethousand"), plural / variant spellings (lakhs, lac,
+crores) and common OCR / handwriting misspellings — known ones from
+MISSPELLINGS, the rest by closest vocabulary match (FUZZY_CUTOFF).
+
+The parser is strict: any token it cannot place makes the result None, so
+an unusable words field is never silently read as a smaller number.
+"""
+
+import difflib
+import re
+from decimal import Decimal, InvalidOperation
+
+FUZZY_CUTOFF = 0.8
+
+_UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+_TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+_SCALES = {
+    "thousand": 10 ** 3, "lakh": 10 ** 5, "million": 10 ** 6,
+    "crore": 10 ** 7, "billion": 10 ** 9,
+}
+_FILLER = {"rupees", "only", "and", "paise"}
+_VOCAB = sorted(set(_UNITS) | set(_TENS) | set(_SCALES) | {"hundred"} | _FILLER,
+                key=len, reverse=True)
+
+# Variant spellings and frequent misreads → canonical token
+MISSPELLINGS = {
+    "rupee": "rupees", "rupes": "rupees", "ruppees": "rupees", "rupies": "rupees",
+    "rs": "rupees", "inr": "rupees", "re": "rupees",
+    "lakhs": "lakh", "lac": "lakh", "lacs": "lakh", "lacks": "lakh", "laks": "lakh",
+    "lack": "lakh", "lakth": "lakh", "crores": "crore", "cr": "crore", "karod": "crore",
+    "thousands": "thousand", "thousend": "thousand", "thousnd": "thousand",
+    "hundreds": "hundred", "hundered": "hundred", "hundrad": "hundred",
+    "fourty": "forty", "ninty": "ninety", "nineti": "ninety", "twenti": "twenty",
+    "fivty": "fifty", "eightty": "eighty", "threee": "three",
+    "paisa": "paise", "paises": "paise", "ps": "paise",
+    "onli": "only", "onlly": "only", "olny": "only", "&": "and",
+    "millions": "million", "billions": "billion",
+}
+
+_ONES_WORDS = ["", "One", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine",
+               "Ten", "Eleven", "Twelve", "Thirteen", "Fourteen", "Fifteen", "Sixteen",
+               "Seventeen", "Eighteen", "Nineteen"]
+_TENS_WORDS = ["", "", "Twenty", "Thirty", "Forty", "Fifty", "Sixty", "Seventy", "Eighty",
+               "Ninety"]
+
+
+# ── Tokens ────────────────────────────────────────────────────────────────────
+
+def _split_run(word: str):
+    """Split run-together words ("twentyfivethousand") into vocabulary tokens, or None."""
+    best = {0: []}
+    for i in range(len(word)):
+        if i not in best:
+            continue
+        for v in _VOCAB:
+            if word.startswith(v, i) and i + len(v) not in best:
+                best[i + len(v)] = best[i] + [v]
+    return best.get(len(word))
+
+
+def _canonical(word: str):
+    """Canonical tokens for one word, or None when it is not part of an amount."""
+    if word in _UNITS or word in _TENS or word in _SCALES or word in _FILLER \
+            or word == "hundred":
+        return [word]
+    if word in MISSPELLINGS:
+        return [MISSPELLINGS[word]]
+    parts = _split_run(word)
+    if parts:
+        return parts
+    close = difflib.get_close_matches(word, _VOCAB, n=1, cutoff=FUZZY_CUTOFF)
+    return close or None
+
+
+def _tokens(text: str):
+    """Canonical token list of `text`, or None if any word is not amount vocabulary."""
+    text = text.lower().replace("₹", " rupees ").replace("/-", " ")
+    out = []
+    for word in re.findall(r"[a-z]+|\d+(?:\.\d+)?|&", text):
+        if word[0].isdigit():
+            out.append(word)
+            continue
+        canon = _canonical(word)
+        if canon is None:
+            return None
+        out.extend(canon)
+    return out
+
+
+def _value(tokens: list):
+    """Integer value of number-word tokens (filler already removed), or None."""
+    if not tokens:
+        return None
+    total, current, seen = 0, 0, False
+    for tok in tokens:
+        if tok in _UNITS:
+            current += _UNITS[tok]
+        elif tok in _TENS:
+            current += _TENS[tok]
+        elif tok == "hundred":
+            current = (current or 1) * 100
+        elif tok in _SCALES:
+            scale = _SCALES[tok]
+            if scale == 10 ** 7 or scale == 10 ** 9:
+                # crore / billion scale everything before it ("one crore" after lakhs is rare)
+                total = (total + (current or 1)) * scale
+            else:
+                total += (current or 1) * scale
+            current = 0
+        elif re.fullmatch(r"\d+", tok):
+            current += int(tok)
+        else:
+            return None
+        seen = True
+    return total + current if seen else None
+
+
+# ── Parsing ───────────────────────────────────────────────────────────────────
+
+def parse_amount_words(text) -> Decimal:
+    """Rupee value of an amount written in words, or None if it cannot be read."""
+    if not text or not isinstance(text, str):
+        return None
+    tokens = _tokens(text)
+    if not tokens:
+        return None
+
+    paise = 0
+    if "paise" in tokens:
+        end = tokens.index("paise")
+        start = max((i for i, t in enumerate(tokens[:end]) if t in ("and", "rupees")),
+                    default=-1)
+        paise = _value([t for t in tokens[start + 1:end] if t not in _FILLER])
+        if paise is None or paise >= 100:
+            return None
+        tokens = tokens[:max(start, 0)] + tokens[end + 1:]
+
+    numbers = [t for t in tokens if t not in _FILLER]
+    digits = [t for t in numbers if t[0].isdigit()]
+    if digits and len(digits) == len(numbers) == 1:
+        # "Rupees 12500 Only" — figures written on the words line
+        try:
+            return Decimal(digits[0]) + Decimal(paise) / 100
+        except InvalidOperation:
+            return None
+    rupees = _value(numbers)
+    if rupees is None:
+        return Decimal(paise) / 100 if paise else None
+    return Decimal(rupees) + Decimal(paise) / 100
+
+
+def parse_amount_numeric(text) -> Decimal:
+    """Rupee value of a figures amount ("₹ 12,50,000/-", "1250000.00"), or None."""
+    if text is None:
+        return None
+    s = re.sub(r"(?i)rs\.?|inr|₹|/-|[\s,]", "", str(text)).rstrip(".")
+    if not re.fullmatch(r"\d+(?:\.\d{1,2})?", s):
+        return None
+    value = Decimal(s)
+    return value if value > 0 else None
+
+
+# ── Formatting ────────────────────────────────────────────────────────────────
+
+def _below_hundred(n: int) -> str:
+    if n < 20:
+        return _ONES_WORDS[n]
+    return (_TENS_WORDS[n // 10] + (" " + _ONES_WORDS[n % 10] if n % 10 else ""))
+
+
+def _below_thousand(n: int) -> str:
+    words = []
+    if n >= 100:
+        words.append(_ONES_WORDS[n // 100] + " Hundred")
+    if n % 100:
+        words.append(_below_hundred(n % 100))
+    return " ".join(words)
+
+
+def _indian_words(n: int) -> str:
+    if n == 0:
+        return "Zero"
+    words = []
+    crore, n = divmod(n, 10 ** 7)
+    if crore:
+        words.append(_indian_words(crore) + " Crore")
+    for scale, name in ((10 ** 5, "Lakh"), (10 ** 3, "Thousand")):
+        count, n = divmod(n, scale)
+        if count:
+            words.append(_below_hundred(count) + " " + name)
+    if n:
+        words.append(_below_thousand(n))
+    return " ".join(words)
+
+
+def amount_to_words(value) -> str:
+    """Indian cheque style: "Rupees Twelve Lakh Fifty Thousand and Fifty Paise Only"."""
+    value = Decimal(str(value)).quantize(Decimal("0.01"))
+    rupees, paise = int(value), int((value - int(value)) * 100)
+    text = "Rupees " + _indian_words(rupees)
+    if paise:
+        text += " and " + _below_hundred(paise) + " Paise"
+    return text + " Only"
+
+
+def format_numeric(value) -> str:
+    """Plain figures as the extractor stores amount_numeric ("1250000", "1250.50")."""
+    value = Decimal(str(value)).quantize(Decimal("0.01"))
+    return str(int(value)) if value == int(value) else str(value)
+
+
+# ── Cross-check ───────────────────────────────────────────────────────────────
+
+def cross_check(amount_numeric, amount_words) -> dict:
+    """
+    Validate the two amount fields against each other.
+
+    Returns {"status", "amount_numeric", "amount_words", "numeric_value",
+             "words_value"} where status is
+      "match"          both readable and equal
+      "mismatch"       both readable, different values (both kept, flagged)
+      "filled_numeric" figures unusable, derived from the words
+      "filled_words"   words unusable, derived from the figures
+      "unusable"       neither can be read
+    """
+    num = parse_amount_numeric(amount_numeric)
+    words = parse_amount_words(amount_words)
+    out = {"amount_numeric": amount_numeric, "amount_words": amount_words,
+           "numeric_value": str(num) if num is not None else None,
+           "words_value": str(words) if words is not None else None}
+    if num is not None and words is not None:
+        out["status"] = "match" if num == words else "mismatch"
+    elif words is not None:
+        out["status"] = "filled_numeric"
+        out["amount_numeric"] = format_numeric(words)
+    elif num is not None:
+        out["status"] = "filled_words"
+        out["amount_words"] = amount_to_words(num)
+    else:
+        out["status"] = "unusable"
+    return out
+
+
+if __name__ == "__main__":
+    # Self-check against hand-written cases (the repo keeps no test suite)
+    cases = [
+        ("Rupees Twelve Lakh Fifty Thousand Only", "1250000"),
+        ("Rs. One Crore Twenty Five Lakh Only", "12500000"),
+        ("Rupees Five Thousand Three Hundred and Forty Two Only", "5342"),
+        ("Twenty-Five Thousand Rupees Only", "25000"),
+        ("Rupees TwentyFive thousend only", "25000"),
+        ("Rupees Ten Lacs Only", "1000000"),
+        ("Rupees One Hundred and Fifty and Fifty Paise Only", "150.50"),
+        ("Rupees Fourty Five Thousnd Only", "45000"),
+        ("Rupees 12500 Only", "12500"),
+        ("Pay to the order of Ravi", None),
+        ("", None),
+    ]
+    failed = 0
+    for text, want in cases:
+        got = parse_amount_words(text)
+        ok = (got is None and want is None) or (got is not None and want is not None
+                                                 and got == Decimal(want))
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {text!r} → {got}")
+    for value in ("1250000", "12500000", "5342", "150.50", "101", "99999999"):
+        words = amount_to_words(Decimal(value))
+        ok = parse_amount_words(words) == Decimal(value)
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {value} → {words}")
+    print(cross_check("12,50,000/-", "Rupees Twelve Lakh Fifty Thousand Only")["status"],
+          cross_check(None, "Rupees Ten Lacs Only")["amount_numeric"],
+          cross_check("5342", None)["amount_words"],
+          cross_check("5000", "Rupees Six Thousand Only")["status"])
+    raise SystemExit(1 if failed else 0)
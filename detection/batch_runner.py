@@ -0,0 +1,241 @@
+"""
+Batch Runner — parallel, resumable directory processing
+========================================================
+Shared batch mode for the detection scripts (OCR, Line Sweep, Connected
+Components).  Each stage supplies a `process(img) -> PIL Image | None`
+callable; the runner does the rest:
+
+  worker pool : decode → process → encode   (one file per task)
+  main thread : write → manifest append     (while workers keep going)
+
+At most `max_in_flight` files are queued or being worked on at any time, so
+memory stays bounded regardless of archive size.
+
+Manifest
+--------
+`<output_dir>/.batch_manifest.jsonl` gets one JSON line per finished file:
+
+    {"file": "Cheque 083654.jpg", "status": "ok", "out": "...", "ms": {...}}
+
+Status is "ok", "skip" (stage returned nothing / empty file) or "error".
+On restart files whose latest row is "ok" or "skip" are skipped, so an
+interrupted run resumes where it stopped; "error" rows (I/O, out of memory,
+an interrupted decode) are retried and get a new row.  `resume=False`
+discards the manifest and starts over.
+
+Dry run
+-------
+`dry_run=True` decodes, processes and encodes every file but writes nothing
+(no outputs, no manifest) and prints a per-stage timing summary.
+
+Usage:
+    from detection.batch_runner import run_batch
+    run_batch(input_dir, output_dir, process=my_stage, out_prefix="LS_Result_")
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
+
+import cv2
+import numpy as np
+from PIL import Image
+
+MANIFEST_NAME = ".batch_manifest.jsonl"
+_STAGES = ("decode", "process", "encode", "write")
+
+
+# ── Worker side ───────────────────────────────────────────────────────────────
+
+def _work(path: str, process, dry_run: bool) -> dict:
+    """Decode → process → encode one file. Runs inside a pool worker."""
+    ms = {}
+    name = os.path.basename(path)
+    try:
+        if os.stat(path).st_size == 0:
+            return {"file": name, "status": "skip", "reason": "empty file", "ms": ms}
+
+        t = time.perf_counter()
+        with Image.open(path) as im:
+            im.load()
+            img = im.copy()
+        ms["decode"] = (time.perf_counter() - t) * 1000
+
+        t = time.perf_counter()
+        out = process(img)
+        ms["process"] = (time.perf_counter() - t) * 1000
+        if out is None:
+            return {"file": name, "status": "skip", "reason": "no result", "ms": ms}
+
+        t = time.perf_counter()
+        ext = os.path.splitext(name)[1].lower() or ".png"
+        ok, buf = cv2.imencode(ext, cv2.cvtColor(np.array(out.convert("RGB")),
+                                                 cv2.COLOR_RGB2BGR))
+        ms["encode"] = (time.perf_counter() - t) * 1000
+        if not ok:
+            return {"file": name, "status": "error", "reason": "encode failed", "ms": ms}
+
+        return {"file": name, "status": "ok", "ms": ms,
+                "data": None if dry_run else buf.tobytes()}
+    except Exception as e:
+        return {"file": name, "status": "error", "reason": str(e), "ms": ms}
+
+
+# ── Manifest ──────────────────────────────────────────────────────────────────
+
+def _load_manifest(path: str) -> set:
+    """Files whose latest manifest row is finished ("ok" / "skip"); errors are retried."""
+    latest = {}
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                latest[row["file"]] = row.get("status")
+            except (ValueError, KeyError):
+                continue   # torn last line from an interrupted run
+    return {name for name, status in latest.items() if status in ("ok", "skip")}
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def run_batch(
+    input_dir: str,
+    output_dir: str,
+    process,
+    out_prefix: str,
+    exts: tuple = None,
+    workers: int = None,
+    max_in_flight: int = None,
+    executor: str = "process",
+    resume: bool = True,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Run `process` over every file in `input_dir` and write results to
+    `output_dir` as `<out_prefix><filename>`.
+
+    Args:
+        process:       picklable callable PIL Image → PIL Image or None.
+        exts:          lower-case extensions to include (None = every file).
+        workers:       pool size (default: CPU count).
+        max_in_flight: bound on queued + running files (default: 4 × workers).
+        executor:      "process" for CPU-bound stages, "thread" for stages
+                       that release the GIL or share a global model.
+        resume:        skip files the manifest records as "ok" / "skip"
+                       (files that failed are retried).
+        dry_run:       time everything, write nothing.
+
+    Returns:
+        {"processed", "total", "skipped", "failed", "resumed",
+         "elapsed_s", "images_per_s", "stage_ms": {stage: mean ms}}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+    names = sorted(
+        f for f in os.listdir(input_dir)
+        if os.path.isfile(os.path.join(input_dir, f))
+        and not f.startswith(".")
+        and (exts is None or os.path.splitext(f)[1].lower() in exts)
+    )
+    total = len(names)
+
+    if not dry_run and not resume and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    done = _load_manifest(manifest_path) if (resume and not dry_run) else set()
+    todo = [n for n in names if n not in done]
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    max_in_flight = max(1, max_in_flight or 4 * workers)
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+
+    counts = {"ok": 0, "skip": 0, "error": 0}
+    stage_sum = dict.fromkeys(_STAGES, 0.0)
+    stage_n   = dict.fromkeys(_STAGES, 0)
+
+    t0 = time.perf_counter()
+    manifest = None if dry_run else open(manifest_path, "a", encoding="utf-8")
+    try:
+        with pool_cls(max_workers=workers) as pool:
+            pending = set()
+            queue   = iter(todo)
+            while True:
+                while len(pending) < max_in_flight:
+                    name = next(queue, None)
+                    if name is None:
+                        break
+                    pending.add(pool.submit(
+                        _work, os.path.join(input_dir, name), process, dry_run))
+                if not pending:
+                    break
+
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    res  = fut.result()
+                    data = res.pop("data", None)
+                    if res["status"] == "ok" and data is not None:
+                        t = time.perf_counter()
+                        out_name = f"{out_prefix}{res['file']}"
+                        with open(os.path.join(output_dir, out_name), "wb") as f:
+                            f.write(data)
+                        res["ms"]["write"] = (time.perf_counter() - t) * 1000
+                        res["out"] = out_name
+
+                    counts[res["status"]] += 1
+                    for stage, v in res["ms"].items():
+                        stage_sum[stage] += v
+                        stage_n[stage]   += 1
+
+                    tag = {"ok": "OK  ", "skip": "SKIP", "error": "FAIL"}[res["status"]]
+                    reason = f": {res['reason']}" if res.get("reason") else ""
+                    print(f"  {tag} {res['file']}{reason}")
+
+                    if manifest is not None:
+                        res["ms"] = {k: round(v, 2) for k, v in res["ms"].items()}
+                        manifest.write(json.dumps(res) + "\n")
+                        manifest.flush()
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    elapsed = time.perf_counter() - t0
+    ran = sum(counts.values())
+    stage_ms = {s: round(stage_sum[s] / stage_n[s], 2) for s in _STAGES if stage_n[s]}
+
+    if dry_run:
+        print(f"[dry-run] {ran} files in {elapsed:.2f}s "
+              f"({ran / elapsed if elapsed else 0:.1f} img/s, {workers} workers)")
+        for stage, v in stage_ms.items():
+            print(f"[dry-run]   {stage:<8} {v:8.2f} ms/img")
+
+    return {
+        "processed":    counts["ok"],
+        "total":        total,
+        "skipped":      counts["skip"],
+        "failed":       counts["error"],
+        "resumed":      len(done & set(names)),
+        "elapsed_s":    round(elapsed, 2),
+        "images_per_s": round(ran / elapsed, 2) if elapsed else 0.0,
+        "stage_ms":     stage_ms,
+    }
+
+
+def add_batch_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Add the shared batch-mode flags to a script's argument parser."""
+    parser.add_argument("input_dir",  nargs="?", default=None, help="Input folder")
+    parser.add_argument("output_dir", nargs="?", default=None, help="Output folder")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker pool size (default: CPU count)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Max queued + running images (default: 4 x workers)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Ignore the manifest and reprocess every file")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Time decode/process/encode without writing anything")
+    return parser
@@ -0,0 +1,338 @@
+"""
+Field Grammar Benchmark — equivalence and speed vs. the old regex parser
+========================================================================
+Runs the previous per-call regex implementations (kept below verbatim as the
+reference) and detection/field_grammar.py side by side over a behaviour
+corpus, and fails on the first output that differs.
+
+Corpus: a seeded generator of cheque OCR outputs — clean, OCR-noisy
+(O/0, l/1, S/5 swaps, stray punctuation, tabs, CRLF, Unicode look-alikes and
+non-ASCII digits), model repetition loops up to ~100 KB, empty and truncated
+texts — plus fenced / broken JSON replies for `_parse_json`, and any saved
+OCR texts passed with --texts (one file per text, e.g. `_ocr_text` dumps).
+
+    python -m detection.bench_field_grammar                 # 3000 generated texts
+    python -m detection.bench_field_grammar --n 500 --texts ocr_dumps/
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import time
+
+from detection.field_grammar import parse_fields
+from detection.ocr_extractor import _parse_json, _parse_raw_to_fields, _repair_numerics
+
+
+# ── Reference: regex code this grammar replaced ──────────────────────────────
+
+def legacy_parse_json(text: str) -> dict:
+    text = (text or "").strip()
+    text = re.sub(r"^```(?:json)?", "", text, flags=re.IGNORECASE).strip()
+    text = re.sub(r"```$", "", text).strip()
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            pass
+    return {"raw_response": text}
+
+
+def legacy_repair_numerics(fields: dict, ocr_text: str) -> dict:
+    """Clean up numeric fields without blindly overwriting correct VLM output.
+
+    Rules:
+    - Strip internal whitespace/commas from amount_numeric (but keep the digits).
+    - Only replace a field from OCR when the field is genuinely missing/empty —
+      never replace a plausible VLM value with an OCR heuristic guess.
+    """
+
+    def strip_separators(val: str) -> str:
+        """Remove spaces, commas, and other non-digit/non-letter chars from a numeric string."""
+        return re.sub(r"[\s,_\-]", "", val)
+
+    out = dict(fields)
+
+    # amount_numeric: strip formatting separators; fallback to regex only if blank
+    amt = out.get("amount_numeric")
+    if isinstance(amt, str) and amt not in ("", "null"):
+        out["amount_numeric"] = strip_separators(amt)
+        digits = re.sub(r"\D", "", out["amount_numeric"])
+        if len(digits) < 2:
+            # Clearly bad — try regex from OCR text
+            m = re.search(r'(?:₹|Rs\.?|INR)\s*([\d,]+(?:\.\d{1,2})?)', ocr_text or "", re.IGNORECASE)
+            if not m:
+                m = re.search(r'\b(\d{3,12}(?:\.\d{1,2})?)\b', ocr_text or "")
+            if m:
+                out["amount_numeric"] = strip_separators(m.group(1))
+    elif not amt:
+        m = re.search(r'(?:₹|Rs\.?|INR)\s*([\d,]+(?:\.\d{1,2})?)', ocr_text or "", re.IGNORECASE)
+        if m:
+            out["amount_numeric"] = strip_separators(m.group(1))
+
+    # account_number: only fill if missing
+    if not out.get("account_number") and ocr_text:
+        m = re.search(r'(?:A/?c|Account)\s*(?:No\.?|Number)\s*[:\-]?\s*(\d{9,18})', ocr_text, re.IGNORECASE)
+        if m:
+            out["account_number"] = m.group(1)
+
+    # cheque_number: only fill if missing
+    if not out.get("cheque_number") and ocr_text:
+        m = re.search(r'(?:Cheque|Ch\.?)?\s*(?:No\.?|Number)\s*[:\-]?\s*(\d{6,10})\b', ocr_text, re.IGNORECASE)
+        if m:
+            out["cheque_number"] = m.group(1)
+        else:
+            runs = re.findall(r"\b\d{6}\b", ocr_text)
+            if runs:
+                out["cheque_number"] = runs[0]
+
+    # ifsc_code: strip internal spaces
+    if isinstance(out.get("ifsc_code"), str):
+        out["ifsc_code"] = re.sub(r"\s+", "", out["ifsc_code"]).upper()
+
+    return out
+
+
+def legacy_parse_raw_to_fields(text: str) -> dict:
+    """Regex fallback parser for Indian bank cheque layouts."""
+    t = re.sub(r"[ \t]+", " ", text.strip())
+    lines = [ln.strip(" :-|\t") for ln in t.splitlines() if ln.strip(" :-|\t")]
+
+    def find(pattern, flags=re.IGNORECASE):
+        m = re.search(pattern, t, flags)
+        return m.group(1).strip() if m else None
+
+    # Date — DD/MM/YYYY, DD-MM-YYYY, D/M/YY, or "15 Apr 2024"
+    date = (
+        find(r'\b(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})\b')
+        or find(r'\b(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\w*\s+\d{2,4})\b')
+    )
+
+    # Amount numeric — prefer currency-prefixed; strip commas afterwards
+    _amt_raw = (
+        find(r'(?:₹|Rs\.?|INR)\s*([\d,]+(?:\.\d{1,2})?)')
+        or find(r'(?:Amount|Amt)[\s:]*(?:₹|Rs\.?)?\s*([\d,]+(?:\.\d{1,2})?)')
+        or find(r'\b(?:Rupees?|Rs\.?)\s*(\d{2,12}(?:\.\d{1,2})?)\b')
+    )
+    amount_num = re.sub(r",", "", _amt_raw) if _amt_raw else None
+
+    # Amount in words — "Rupees ... Only" or "... Rupees Only"
+    amount_words = (
+        find(r'((?:Rupees?|Rs\.?)\s+[^\n\r]{2,120}?\s+[Oo]nly)')
+        or find(r'(?:in\s+words?|amount\s+in\s+words?)[\s:]+([^\n\r]{2,120}(?:[Oo]nly)?)')
+        or find(r'([A-Z][a-z]+(?:\s+[A-Za-z]+){1,10})\s+[Oo]nly')
+    )
+
+    # IFSC — 4 letters + 0 + 6 alphanumeric
+    ifsc = find(r'\b([A-Z]{4}0[A-Z0-9]{6})\b')
+
+    digit_runs = re.findall(r"\b\d{6,18}\b", t)
+
+    # Cheque number — 6-digit run labelled or at MICR start
+    cheque_no = (
+        find(r'(?:Cheque|Ch\.?)\s*(?:No\.?|Number)?\s*[:\-]?\s*(\d{6,10})\b')
+        or next((run for run in digit_runs if len(run) == 6), None)
+    )
+
+    # Account number — labelled or MICR middle segment
+    acct_no = (
+        find(r'(?:A/?c\.?|Account)\s*(?:No\.?|Number)?\s*[:\-]?\s*(\d{9,18})\b')
+        or next((run for run in digit_runs if 9 <= len(run) <= 18 and run != cheque_no), None)
+    )
+
+    # Payee — text after "Pay" up to end-of-line or "or bearer"
+    payee = find(
+        r'\bPay(?:\s+to)?(?:\s+the\s+order\s+of)?\s+([^\n\r]+?)(?:\s+or\s+bearer|\s+rupees?|\s*$)',
+        re.IGNORECASE | re.MULTILINE,
+    )
+    if payee:
+        payee = re.sub(r"\bA/c\s+Payee\b|\bAccount\s+Payee\b", "", payee, flags=re.IGNORECASE).strip(" -")
+
+    # Branch — line after "Branch:" label
+    branch = (
+        find(r'Branch\s*[:\-]\s*([^\n]+)')
+        or find(r'\b([A-Za-z ]+)\s+Branch\b')
+    )
+
+    # Account holder — labelled
+    account_holder = (
+        find(r'(?:A/?c\.?\s*(?:Holder|Name)|Account\s+Holder|Name)\s*[:\-]?\s*([^\n]+)')
+        or find(r'For\s+([A-Z][A-Za-z .&]{3,60})')
+    )
+
+    # Bank name — first clean line that contains "Bank" or common bank abbreviations
+    bank_name = None
+    bank_patterns = r'\b(bank|sbi|hdfc|icici|axis|kotak|canara|pnb|union bank|bank of baroda)\b'
+    for line in lines[:12]:
+        if re.search(bank_patterns, line, re.IGNORECASE) and len(line) > 3:
+            bank_name = line
+            break
+
+    # Signature present — label found in OCR
+    sig_present = None
+    if re.search(r'\b(signature|signatory|signed|please sign above)\b', t, re.IGNORECASE):
+        sig_present = "yes"
+
+    return {
+        "account_holder":    account_holder,
+        "bank_name":         bank_name,
+        "branch_name":       branch,
+        "cheque_number":     cheque_no,
+        "date":              date,
+        "payee_name":        payee,
+        "amount_numeric":    amount_num,
+        "amount_words":      amount_words,
+        "signature_present": sig_present,
+        "ifsc_code":         ifsc,
+        "account_number":    acct_no,
+    }
+
+
+# ── Behaviour corpus ──────────────────────────────────────────────────────────
+
+_BANKS = ["STATE BANK OF INDIA", "HDFC Bank Ltd", "ICICI BANK", "Axis Bank", "Kotak Mahindra Bank",
+          "Canara Bank", "PNB", "Union Bank of India", "Bank of Baroda", "Federal Bank"]
+_NAMES = ["Ravi Kumar", "ACME TRADERS PVT LTD", "S. Lakshmi", "Mohd. Irfan", "Priya & Sons"]
+_WORDS = ["Rupees Twelve Thousand Five Hundred Only", "Rs. Five Lakh only", "Fifty Thousand Only",
+          "Rupees One Crore Twenty Lakh Only", "rupees ten thousand"]
+_NOISE = {"0": "O", "O": "0", "1": "l", "l": "1", "I": "1", "5": "S", "S": "5", "B": "8", " ": "  "}
+_LOOKALIKE = {"s": "ſ", "K": "K", "i": "ı", "I": "İ", "1": "१", "5": "٥", "0": "０"}
+
+
+def _digits(rng, n):
+    return "".join(rng.choice("0123456789") for _ in range(n))
+
+
+def _cheque_text(rng) -> str:
+    lines = [rng.choice(_BANKS), rng.choice(["Branch: ", "", "MG Road Branch", "Br: "]) + rng.choice(
+        ["Andheri East", "Connaught Place", "", "Koramangala"])]
+    if rng.random() < 0.7:
+        lines.append(rng.choice(["IFSC: ", "IFSC Code ", "", "RTGS/NEFT IFSC "])
+                     + rng.choice(["SBIN", "HDFC", "ICIC", "UTIB"]) + "0" + _digits(rng, 6))
+    d, m, y = rng.randint(1, 31), rng.randint(1, 12), rng.choice(["2024", "24", "2023"])
+    lines.append(rng.choice(["Date ", "", "D D M M Y Y "]) + rng.choice(
+        [f"{d:02d}/{m:02d}/{y}", f"{d}-{m}-{y}", f"{d} Apr {y}", f"{d} September {y}", f"{d}{m:02d}{y}"]))
+    lines.append(rng.choice(["Pay ", "PAY to ", "Pay to the order of ", ""]) + rng.choice(_NAMES)
+                 + rng.choice([" or Bearer", " OR BEARER", "", " Rupees"]))
+    lines.append(rng.choice(_WORDS))
+    lines.append(rng.choice(["₹ ", "Rs.", "INR ", "Amount: ", "Amt ", ""]) + rng.choice(
+        ["12,500.00", "500000/-", "1,20,00,000", "75", "12500.5", "5,00,000.00"]))
+    lines.append(rng.choice(["A/c No. ", "Account Number: ", "A/C ", "Ac. No ", ""]) + _digits(rng, rng.choice([9, 11, 12, 14, 16])))
+    lines.append(rng.choice(["Cheque No. ", "Ch.No ", "CHQ ", "No: ", ""]) + _digits(rng, 6))
+    lines.append(rng.choice(["For ", "A/c Holder: ", "Name - ", ""]) + rng.choice(_NAMES))
+    lines.append(rng.choice(["Please sign above", "Authorised Signatory", "Signature", "", "signed"]))
+    lines.append(f"⑈{_digits(rng, 6)}⑈ {_digits(rng, 9)}⑆ {_digits(rng, 6)}⑈ {_digits(rng, 2)}")
+    rng.shuffle(lines[2:])
+    return rng.choice(["\n", "\r\n", " \n\t", "\n\n"]).join(lines)
+
+
+def _noisy(rng, text: str, rate: float) -> str:
+    out = []
+    for ch in text:
+        r = rng.random()
+        if r < rate and ch in _NOISE:
+            ch = _NOISE[ch]
+        elif r < rate * 1.3 and ch in _LOOKALIKE:
+            ch = _LOOKALIKE[ch]
+        elif r < rate * 1.5:
+            ch += rng.choice("|:;-_.,'\t ~")
+        out.append(ch)
+    return "".join(out)
+
+
+def corpus(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    texts = ["", " ", "\n\n", "Rupees Only", "Pay", "12/12", "IFSC0"]
+    for i in range(n):
+        text = _cheque_text(rng)
+        kind = i % 6
+        if kind in (1, 2):
+            text = _noisy(rng, text, 0.03 * kind)
+        elif kind == 3:
+            # Repetition loop, as small VLMs emit when they fail to stop
+            loop = rng.choice(text.splitlines() or [text])
+            text += "\n" + "\n".join([loop] * rng.randint(50, 1500))
+        elif kind == 4:
+            text = text[:rng.randint(0, len(text))]
+        elif kind == 5:
+            filler = " ".join(rng.choice(["lorem", "ipsum", "|", "--", "ll", "0O", "xx"])
+                              for _ in range(rng.randint(200, 15000)))
+            text = filler[:len(filler) // 2] + "\n" + text + "\n" + filler[len(filler) // 2:]
+        texts.append(text)
+    return texts
+
+
+def json_corpus(texts: list, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    out = ["", "```", "````", "```json```", "{}", "}{", "null"]
+    for t in texts[:500]:
+        body = json.dumps(_parse_raw_to_fields(t), ensure_ascii=rng.random() < 0.5)
+        out.append(rng.choice(["```json\n{}\n```", "```JSON {}```", "{}", "Here you go: {} thanks",
+                               "```\n{}\n```\n", "```json\n{}", "{}```"]).replace("{}", body, 1))
+        out.append(body[:rng.randint(0, len(body))])
+    return out
+
+
+def _repair_inputs(rng) -> dict:
+    return {"amount_numeric": rng.choice([None, "", "null", "1", "12 500", "1,00,000", "x", "7"]),
+            "account_number": rng.choice([None, "", "123456789012"]),
+            "cheque_number":  rng.choice([None, "", "083654"]),
+            "ifsc_code":      rng.choice([None, "sbin 0001234", "HDFC0000240"])}
+
+
+# ── Run ───────────────────────────────────────────────────────────────────────
+
+def _time(fn, items) -> float:
+    t = time.perf_counter()
+    for x in items:
+        fn(x)
+    return time.perf_counter() - t
+
+
+def run(n: int, text_dir: str = None) -> bool:
+    texts = corpus(n)
+    if text_dir:
+        for name in sorted(os.listdir(text_dir)):
+            with open(os.path.join(text_dir, name), encoding="utf-8", errors="replace") as f:
+                texts.append(f.read())
+    rng = random.Random(11)
+    repairs = [(_repair_inputs(rng), t) for t in texts]
+    replies = json_corpus(texts)
+
+    checks = [("parse_raw_to_fields", legacy_parse_raw_to_fields, _parse_raw_to_fields, texts),
+              ("repair_numerics", lambda a: legacy_repair_numerics(*a),
+               lambda a: _repair_numerics(*a), repairs),
+              ("parse_json", legacy_parse_json, _parse_json, replies)]
+    ok = True
+    for name, old, new, items in checks:
+        for x in items:
+            a, b = old(x), new(x)
+            if json.dumps(a, sort_keys=True) != json.dumps(b, sort_keys=True):
+                print(f"[Grammar-Bench] {name}: MISMATCH on {str(x)[:200]!r}\n  old {a}\n  new {b}")
+                ok = False
+                break
+        else:
+            print(f"[Grammar-Bench] {name}: {len(items)} inputs, identical")
+
+    long_texts = [t for t in texts if len(t) > 10000]
+    print(f"\n{'function':<22}{'corpus':>8}{'old ms':>10}{'new ms':>10}{'speedup':>9}")
+    for name, old, new, items in checks + [
+            ("parse (long >10KB)", legacy_parse_raw_to_fields, parse_fields, long_texts)]:
+        if not items:
+            continue
+        t_old, t_new = _time(old, items), _time(new, items)
+        print(f"{name:<22}{len(items):>8}{t_old * 1000:>10.1f}{t_new * 1000:>10.1f}"
+              f"{t_old / t_new if t_new else 0:>8.1f}x")
+    return ok
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Field grammar: equivalence and speed vs. the old regex parser")
+    p.add_argument("--n", type=int, default=3000, help="Generated texts")
+    p.add_argument("--texts", help="Directory of saved OCR texts to add to the corpus")
+    args = p.parse_args()
+    raise SystemExit(0 if run(args.n, args.texts) else 1)
@@ -0,0 +1,165 @@
+"""
+Cheque Layout — field ROIs for small-image extraction
+=====================================================
+Layout priors for Indian CTS-2010 cheques (202 × 92 mm), as fractional
+(x1, y1, x2, y2) boxes measured on Our_Dataset/cheque_images. Each ROI maps
+to the fields it carries and a short, field-specific prompt.
+
+Instead of one 1600 px cheque image with an 11-field prompt, the ROI mode of
+ocr_extractor sends eight small crops (long side ROI_MAX_SIDE) with one-line
+prompts as a single batched generation, and a repair pass re-asks only the
+ROIs whose fields are still missing (larger pad, higher resolution).
+
+    from detection.cheque_layout import FIELD_ROIS, crop_rois
+    crops = crop_rois(img)                    # every ROI
+    crops = crop_rois(img, ["date"], pad=0.08, max_side=768)
+
+`signature_present` is not a text ROI — it comes from the quality gate's ink
+check on the signature area.
+"""
+
+from PIL import Image
+
+ROI_MAX_SIDE        = 512
+ROI_PAD             = 0.02      # fraction of cheque width/height
+REPAIR_ROI_MAX_SIDE = 768
+REPAIR_ROI_PAD      = 0.06
+
+# ── ROI priors ────────────────────────────────────────────────────────────────
+# "answer": "text" → single field, plain reply; "json" → short JSON object.
+
+FIELD_ROIS = {
+    "header": {
+        "box":    (0.00, 0.00, 0.72, 0.19),
+        "fields": ["bank_name", "branch_name", "ifsc_code"],
+        "answer": "json",
+        "max_tokens": 80,
+        "prompt": (
+            "This is the printed header of an Indian bank cheque. Return ONLY JSON "
+            '{"bank_name":..., "branch_name":..., "ifsc_code":...}; branch_name is the '
+            "branch/city/address; ifsc_code is 4 letters, 0, then 6 characters. "
+            "Use null when not visible."
+        ),
+    },
+    "date": {
+        "box":    (0.73, 0.05, 0.99, 0.19),
+        "fields": ["date"],
+        "answer": "text",
+        "max_tokens": 16,
+        "prompt": ("This is the date box of an Indian bank cheque. Reply with ONLY "
+                   "the date as DD/MM/YYYY, or null if it is empty."),
+    },
+    "payee": {
+        "box":    (0.03, 0.17, 0.82, 0.30),
+        "fields": ["payee_name"],
+        "answer": "text",
+        "max_tokens": 24,
+        "prompt": ("This is the 'Pay' line of an Indian bank cheque. Reply with ONLY "
+                   "the handwritten payee name after 'Pay', or null."),
+    },
+    "amount_words": {
+        "box":    (0.03, 0.28, 0.74, 0.45),
+        "fields": ["amount_words"],
+        "answer": "text",
+        "max_tokens": 40,
+        "prompt": ("This is the amount-in-words line of an Indian bank cheque. Reply "
+                   "with ONLY the amount in words exactly as written, or null."),
+    },
+    "amount_numeric": {
+        "box":    (0.69, 0.34, 0.98, 0.47),
+        "fields": ["amount_numeric"],
+        "answer": "text",
+        "max_tokens": 16,
+        "prompt": ("This is the amount box of an Indian bank cheque. Reply with ONLY "
+                   "the amount in digits, without commas or symbols, or null."),
+    },
+    "account": {
+        "box":    (0.03, 0.45, 0.58, 0.59),
+        "fields": ["account_number"],
+        "answer": "text",
+        "max_tokens": 24,
+        "prompt": ("This is the account-number box of an Indian bank cheque. Reply "
+                   "with ONLY the account number digits, or null."),
+    },
+    "holder": {
+        "box":    (0.55, 0.56, 0.99, 0.86),
+        "fields": ["account_holder"],
+        "answer": "text",
+        "max_tokens": 24,
+        "prompt": ("This is the signature area of an Indian bank cheque. Reply with "
+                   "ONLY the printed account holder name (often after 'For'), or null. "
+                   "Do not read the signature itself."),
+    },
+    "micr": {
+        "box":    (0.18, 0.88, 0.82, 1.00),
+        "fields": ["cheque_number"],
+        "answer": "text",
+        "max_tokens": 12,
+        "prompt": ("This is the MICR line of an Indian bank cheque. Reply with ONLY "
+                   "the first 6-digit block (the cheque number), or null."),
+    },
+}
+
+# Header variant used when bank / branch come from the IFSC directory
+# (detection/ifsc_index.py, CHEQUE_BANK_FROM_IFSC=1): one short answer.
+HEADER_IFSC_ONLY = dict(
+    FIELD_ROIS["header"],
+    fields=["ifsc_code"],
+    answer="text",
+    max_tokens=16,
+    prompt=("This is the printed header of an Indian bank cheque. Reply with ONLY the "
+            "IFSC code (4 letters, 0, then 6 characters), or null."),
+)
+
+
+def rois_for_fields(fields) -> list:
+    """Names of the ROIs that carry any of `fields`, in FIELD_ROIS order."""
+    wanted = set(fields)
+    return [name for name, roi in FIELD_ROIS.items() if wanted & set(roi["fields"])]
+
+
+def roi_box(img: Image.Image, box, pad: float = 0.0) -> list:
+    """Fractional box (+ pad) → clamped pixel box."""
+    w, h = img.size
+    x1, y1, x2, y2 = box
+    return [max(0, int(w * (x1 - pad))), max(0, int(h * (y1 - pad))),
+            min(w, int(w * (x2 + pad))), min(h, int(h * (y2 + pad)))]
+
+
+def crop_rois(img: Image.Image, names=None, pad: float = ROI_PAD,
+              max_side: int = ROI_MAX_SIDE, rois: dict = None) -> list:
+    """
+    Crop the named ROIs (default: all) and shrink each so its long side is at
+    most `max_side`. `rois` overrides the built-in priors (e.g. a learned
+    template with the same structure). With CHEQUE_INK_CROPS=1 the
+    handwritten ROIs keep pen ink only (detection/ink_isolation.py).
+
+    Returns [{"name", "bbox", "image", "fields", "prompt", "answer", "max_tokens"}].
+    """
+    from detection.ink_isolation import HANDWRITTEN_CROPS, crops_enabled, handwriting_only
+
+    rois = rois or FIELD_ROIS
+    ink_only = crops_enabled()
+    out = []
+    for name in (names or list(rois)):
+        roi = rois[name]
+        x1, y1, x2, y2 = roi_box(img, roi["box"], pad)
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            continue
+        crop = img.crop((x1, y1, x2, y2))
+        if ink_only and name in HANDWRITTEN_CROPS:
+            crop = handwriting_only(crop)
+        scale = max_side / max(crop.size)
+        if scale < 1:
+            crop = crop.resize((max(1, round(crop.width * scale)),
+                                max(1, round(crop.height * scale))), Image.BOX)
+        out.append({
+            "name":       name,
+            "bbox":       [x1, y1, x2, y2],
+            "image":      crop,
+            "fields":     roi["fields"],
+            "prompt":     roi["prompt"],
+            "answer":     roi["answer"],
+            "max_tokens": roi["max_tokens"],
+        })
+    return out
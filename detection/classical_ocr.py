@@ -0,0 +1,177 @@
+"""
+Classical OCR — cheap first stage of the extraction cascade
+===========================================================
+Reads the PRINTED cheque fields (bank, branch, IFSC, account number, cheque
+number, account holder) with a CPU OCR engine on the layout ROIs of
+detection/cheque_layout.py, parses them with the regex grammar of
+ocr_extractor, and gives every field a confidence:
+
+    confidence = OCR word confidence of the value's tokens   (0–1)
+                 × 1 if the value matches the field's strict pattern, else 0
+
+Fields at or above CASCADE_MIN_CONF are accepted as-is; the rest, and every
+HANDWRITTEN field (payee, amounts, date), go to the VLM.
+
+Engines (optional, first one importable wins; CHEQUE_CLASSICAL_OCR forces one):
+    tesseract — pytesseract + the tesseract binary
+    easyocr   — EasyOCR, CPU
+
+With neither installed, `read_printed_fields` returns no confident fields and
+the cascade sends everything to the VLM.
+
+    from detection.classical_ocr import read_printed_fields
+    res = read_printed_fields(img)   # {"engine", "fields", "confidence", "text", "ocr_s"}
+"""
+
+import os
+import re
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+ENGINE_ENV       = "CHEQUE_CLASSICAL_OCR"     # "tesseract" | "easyocr" | "none"
+CASCADE_MIN_CONF = 0.80
+OCR_MAX_SIDE     = 1600                       # printed text needs full resolution
+
+PRINTED_ROIS = ("header", "account", "holder", "micr")
+HANDWRITTEN_FIELDS = ("payee_name", "amount_words", "amount_numeric", "date")
+
+# Strict per-field patterns — a value that fails its pattern gets confidence 0
+FIELD_PATTERNS = {
+    "ifsc_code":      re.compile(r"^[A-Z]{4}0[A-Z0-9]{6}$"),
+    "account_number": re.compile(r"^\d{9,18}$"),
+    "cheque_number":  re.compile(r"^\d{6}$"),
+    "bank_name":      re.compile(r"\b(bank|sbi|hdfc|icici|axis|kotak|canara|pnb)\b", re.IGNORECASE),
+    "branch_name":    re.compile(r"^[A-Za-z][A-Za-z0-9 ,.&()\-]{2,80}$"),
+    "account_holder": re.compile(r"^[A-Za-z][A-Za-z .&]{2,60}$"),
+}
+
+_easyocr_reader = None
+_engine_lock = threading.Lock()
+
+
+# ── Engines ───────────────────────────────────────────────────────────────────
+
+def available_engine() -> str:
+    """Name of the classical OCR engine to use, or None."""
+    forced = os.environ.get(ENGINE_ENV)
+    if forced:
+        return None if forced == "none" else forced
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return "tesseract"
+    except Exception:
+        pass
+    try:
+        import easyocr  # noqa: F401
+        return "easyocr"
+    except ImportError:
+        return None
+
+
+def _read_words(img: Image.Image, engine: str) -> list:
+    """[(word, confidence 0–1), ...] in reading order."""
+    global _easyocr_reader
+    if engine == "tesseract":
+        import pytesseract
+        data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+        words = []
+        for i, text in enumerate(data["text"]):
+            text = (text or "").strip()
+            conf = float(data["conf"][i])
+            if text and conf >= 0:
+                if data["word_num"][i] == 1 and words:
+                    words.append(("\n", 1.0))
+                words.append((text, conf / 100.0))
+        return words
+    if engine == "easyocr":
+        with _engine_lock:
+            if _easyocr_reader is None:
+                import easyocr
+                print("[Classical-OCR] Loading EasyOCR (CPU)...")
+                _easyocr_reader = easyocr.Reader(["en"], gpu=False, verbose=False)
+        words = []
+        for _box, text, conf in _easyocr_reader.readtext(np.array(img.convert("RGB"))):
+            words.extend((w, float(conf)) for w in text.split())
+            words.append(("\n", 1.0))
+        return words
+    raise ValueError(f"unknown classical OCR engine {engine!r}")
+
+
+# ── Confidence ────────────────────────────────────────────────────────────────
+
+def _norm(token: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", token.lower())
+
+
+def field_confidence(field: str, value, words: list) -> float:
+    """OCR confidence of the words that make up `value`, gated by the field pattern."""
+    if value in (None, ""):
+        return 0.0
+    value = str(value).strip()
+    pattern = FIELD_PATTERNS.get(field)
+    if pattern and not pattern.search(value):
+        return 0.0
+    confs = {}
+    for w, c in words:
+        k = _norm(w)
+        if k:
+            confs[k] = max(c, confs.get(k, 0.0))
+    tokens = [_norm(t) for t in value.split() if _norm(t)]
+    if not tokens:
+        return 0.0
+    matched = [confs[t] for t in tokens if t in confs]
+    if not matched:
+        # Value assembled from split words (e.g. a digit run read in pieces)
+        joined = "".join(_norm(w) for w, _ in words)
+        return 0.5 * min(confs.values()) if _norm(value) in joined and confs else 0.0
+    score = min(matched)
+    return score if len(matched) == len(tokens) else score * 0.5
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def read_printed_fields(img: Image.Image, rois: dict = None) -> dict:
+    """
+    Classical OCR of the printed ROIs.
+
+    Returns {"engine", "fields": {field: value}, "confidence": {field: 0–1},
+             "text": OCR text of all ROIs, "ocr_s"}.
+    """
+    from detection.cheque_layout import FIELD_ROIS, crop_rois
+    from detection.ocr_extractor import _parse_raw_to_fields
+
+    rois = rois or FIELD_ROIS
+    engine = available_engine()
+    result = {"engine": engine, "fields": {}, "confidence": {}, "text": "", "ocr_s": 0.0}
+    if engine is None:
+        return result
+
+    t = time.time()
+    texts = []
+    try:
+        names = [n for n in PRINTED_ROIS if n in rois]
+        for crop in crop_rois(img, names, max_side=OCR_MAX_SIDE, rois=rois):
+            words = _read_words(crop["image"].convert("L"), engine)
+            text = " ".join(w for w, _ in words).replace(" \n ", "\n").strip()
+            texts.append(text)
+            parsed = _parse_raw_to_fields(text)
+            if crop["name"] == "micr":
+                m = re.search(r"\b(\d{6})\b", text)
+                parsed["cheque_number"] = m.group(1) if m else None
+            for field in crop["fields"]:
+                if field in HANDWRITTEN_FIELDS:
+                    continue
+                value = parsed.get(field)
+                conf = field_confidence(field, value, words)
+                if conf > result["confidence"].get(field, -1.0):
+                    result["fields"][field] = value
+                    result["confidence"][field] = round(conf, 3)
+    except Exception as e:
+        print(f"[Classical-OCR] {engine} failed: {e}")
+    result["text"] = "\n".join(texts)
+    result["ocr_s"] = round(time.time() - t, 2)
+    return result
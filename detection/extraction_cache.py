@@ -0,0 +1,359 @@
+"""
+Extraction Cache — per-stage results keyed by image content
+===========================================================
+Resubmitting a cheque (rescan, retry after timeout, UI extract then batch job)
+used to pay for Qwen OCR, Gemma JSON and the repair pass every time. This cache
+stores each stage's output per image:
+
+  ocr     — Qwen OCR hint text
+  json    — raw Gemma JSON fields (before regex / repair / normalisation)
+  fields  — final normalised result of extract_cheque_fields
+
+Lookup, per image:
+  1. exact     — sha256 of the decoded pixels (mode + size + bytes)
+  2. near-dup  — rescans (slightly rotated, shifted or exposed differently).
+                 Each image is reduced to ink darkness (divided by the blurred
+                 paper, so exposure and tint cancel), deskewed on its printed
+                 lines and kept as a THUMB_SIZE thumbnail. A candidate must
+                 pass a coarse 32 × 15 grid comparison (NEAR_DUP_COARSE_MAX,
+                 rejects other layouts), then the two thumbnails are
+                 registered by phase correlation and compared ink for ink:
+                 ink with nothing as dark within one pixel in the other image
+                 must stay under NEAR_DUP_MAX_RESIDUAL. Different cheques from
+                 one book share the print, so only their handwriting is left
+                 over — on Our_Dataset every same-book pair scores ≥ 11, a
+                 0.5–1° rotation, 1 % crop shift or ×1.08 brightness of the
+                 same cheque ≤ 0.2. A 2 % crop also rescales the cheque by
+                 2 % and is not matched. Building the thumbnail costs about
+                 0.1 s per image, each verified candidate about 1 ms
+
+Each stage is stored with a version string (model ids + prompt text hash +
+mode / resolution policy, built by the caller); a different version is a
+miss, so changing a model or prompt invalidates old entries.
+
+Storage: in-memory index and hot entries (MEMORY_ENTRIES) in front of one
+JSON file (plus its thumbnail PNG) per image under CHEQUE_EXTRACT_CACHE_DIR
+(default cache/extraction), least-recently-used files evicted once the
+directory exceeds CHEQUE_EXTRACT_CACHE_MB (default 64). CHEQUE_EXTRACT_CACHE=0
+disables the cache.
+
+    from detection.extraction_cache import get_cache
+    cache = get_cache()
+    ref = cache.ref(img)                      # keys + thumbnail, once per image
+    hit = cache.get(ref, "fields", version)   # {"value", "match", "key"} or None
+    cache.put(ref, "fields", version, fields)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+CACHE_ENV      = "CHEQUE_EXTRACT_CACHE"
+CACHE_DIR_ENV  = "CHEQUE_EXTRACT_CACHE_DIR"
+CACHE_MB_ENV   = "CHEQUE_EXTRACT_CACHE_MB"
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "cache", "extraction")
+DEFAULT_MB  = 64
+MEMORY_ENTRIES = 128              # decoded entries kept in memory in front of disk
+INDEX_NAME  = "index.json"
+
+THUMB_SIZE   = (256, 117)         # registered comparison, darkness 0..255
+COARSE_SIZE  = (32, 15)           # prefilter grid kept in the index
+NEAR_DUP_COARSE_MAX   = 0.10      # mean |Δ| of the coarse grids, best of ±1 cell
+NEAR_DUP_MAX_RESIDUAL = 4.0       # unmatched ink after registration (thumbnail px)
+_WORK_WIDTH  = 1000               # deskew resolution
+_INK_FLOOR   = 0.2                # darkness differences below this are scan noise
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# ── Keys ──────────────────────────────────────────────────────────────────────
+
+def content_key(img: Image.Image) -> str:
+    """sha256 of the decoded pixels — identical for identical images, any file format."""
+    h = hashlib.sha256()
+    h.update(f"{img.mode}:{img.width}x{img.height}:".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def dhash(img: Image.Image, width: int = 16, height: int = 16) -> int:
+    """Difference hash: width × height bits of left/right brightness gradients."""
+    g = np.asarray(img.convert("L").resize((width + 1, height), Image.BOX), dtype=np.int16)
+    bits = 0
+    for bit in (g[:, :-1] > g[:, 1:]).flat:
+        bits = (bits << 1) | int(bit)
+    return bits
+
+
+def _skew_angle(ink: np.ndarray) -> float:
+    """Rotation (degrees) that makes the printed lines horizontal: sharpest row profile."""
+    def score(mask, a):
+        h, w = mask.shape
+        r = cv2.warpAffine(mask, cv2.getRotationMatrix2D((w / 2, h / 2), a, 1.0), (w, h))
+        p = r.sum(1, dtype=np.float64)
+        return (p * p).sum()
+
+    half = cv2.resize(ink, (ink.shape[1] // 2, ink.shape[0] // 2), interpolation=cv2.INTER_AREA)
+    a0 = max(np.arange(-3, 3.001, 0.25), key=lambda a: score(half, a))
+    return max(np.arange(a0 - 0.25, a0 + 0.2501, 0.05), key=lambda a: score(ink, a))
+
+
+def thumbnail(img: Image.Image) -> np.ndarray:
+    """Deskewed ink darkness (paper 0, ink up to 255) at THUMB_SIZE, uint8."""
+    g = np.asarray(img.convert("L"), dtype=np.float32)
+    h = max(1, round(g.shape[0] * _WORK_WIDTH / g.shape[1]))
+    g = cv2.resize(g, (_WORK_WIDTH, h), interpolation=cv2.INTER_AREA)
+    paper = cv2.GaussianBlur(g, (0, 0), 15)
+    dark = 1.0 - np.clip(g / np.maximum(paper, 1.0), 0, 1)
+    angle = _skew_angle((dark > 0.2).astype(np.uint8) * 255)
+    dark = cv2.warpAffine(dark, cv2.getRotationMatrix2D((_WORK_WIDTH / 2, h / 2), angle, 1.0),
+                          (_WORK_WIDTH, h), borderValue=0.0)
+    thumb = cv2.resize(dark, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    return np.round(thumb * 255).astype(np.uint8)
+
+
+def _normalised(thumb: np.ndarray, pct: float) -> np.ndarray:
+    d = thumb.astype(np.float32)
+    return np.clip(d / max(float(np.percentile(d, pct)), 1.0), 0, 1)
+
+
+def coarse_grid(thumb: np.ndarray) -> np.ndarray:
+    """COARSE_SIZE darkness grid of a thumbnail, uint8."""
+    g = _normalised(cv2.resize(thumb, COARSE_SIZE, interpolation=cv2.INTER_AREA), 98)
+    return np.round(g * 255).astype(np.uint8)
+
+
+def _coarse_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean |Δ| (0..1) of two coarse grids, best of the ±1 cell shifts."""
+    a, b = a.astype(np.float32) / 255, b.astype(np.float32) / 255
+    h, w = a.shape
+    inner = b[1:h - 1, 1:w - 1]
+    return min(float(np.abs(a[1 + dy:h - 1 + dy, 1 + dx:w - 1 + dx] - inner).mean())
+               for dy in (-1, 0, 1) for dx in (-1, 0, 1))
+
+
+def _reach(d: np.ndarray) -> np.ndarray:
+    """Darkest ink within one pixel, counting a stroke split across two pixels as whole."""
+    down, right = np.zeros_like(d), np.zeros_like(d)
+    down[:-1], right[:, :-1] = d[1:], d[:, 1:]
+    pairs = np.clip(np.maximum(d + down, d + right), 0, 1)
+    return cv2.dilate(pairs, np.ones((3, 3), np.uint8))
+
+
+def residual(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Ink left unexplained between two thumbnails once `b` is registered onto
+    `a`: darkness beyond _INK_FLOOR with nothing as dark within one pixel in
+    the other image, summed, worse direction of the two.
+    """
+    a, b = _normalised(a, 99.5), _normalised(b, 99.5)
+    (dx, dy), _ = cv2.phaseCorrelate(a, b)
+    b = cv2.warpAffine(b, np.float32([[1, 0, -dx], [0, 1, -dy]]), THUMB_SIZE)
+    m = int(0.03 * THUMB_SIZE[0])
+    inner = (slice(m, -m), slice(m, -m))
+    only_a = np.maximum(a - _reach(b) - _INK_FLOOR, 0)[inner].sum()
+    only_b = np.maximum(b - _reach(a) - _INK_FLOOR, 0)[inner].sum()
+    return float(max(only_a, only_b))
+
+
+def version_key(*parts) -> str:
+    """Short stable hash of model ids / prompt texts / options for a stage version."""
+    return hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:12]
+
+
+# ── Cache ─────────────────────────────────────────────────────────────────────
+
+class ExtractionCache:
+    """Disk-backed, size-bounded LRU of per-stage extraction results."""
+
+    def __init__(self, path: str = None, max_mb: float = None):
+        self.path = path or os.environ.get(CACHE_DIR_ENV, DEFAULT_DIR)
+        self.max_bytes = int((max_mb or float(os.environ.get(CACHE_MB_ENV, DEFAULT_MB)))
+                             * 1024 * 1024)
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "near_hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+        os.makedirs(self.path, exist_ok=True)
+        self.index = {}         # key → {"coarse", "thumb_bytes", "bytes", "used"}
+        self._mem = OrderedDict()
+        self._thumbs = OrderedDict()
+        self._grids = {}        # key → decoded coarse grid
+        index_file = os.path.join(self.path, INDEX_NAME)
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, encoding="utf-8") as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                self.index = {}
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + ".json")
+
+    def _thumb_file(self, key: str) -> str:
+        return os.path.join(self.path, key + ".png")
+
+    def _save_index(self):
+        tmp = os.path.join(self.path, INDEX_NAME + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, os.path.join(self.path, INDEX_NAME))
+
+    def _remember(self, key: str, entry: dict):
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        if len(self._mem) > MEMORY_ENTRIES:
+            self._mem.popitem(last=False)
+
+    def _read(self, key: str) -> dict:
+        entry = self._mem.get(key)
+        if entry is not None:
+            self._mem.move_to_end(key)
+            return entry
+        try:
+            with open(self._file(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.index.pop(key, None)
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _thumb(self, key: str):
+        thumb = self._thumbs.get(key)
+        if thumb is None:
+            try:
+                with Image.open(self._thumb_file(key)) as im:
+                    thumb = np.asarray(im.convert("L"))
+            except OSError:
+                return None
+            self._thumbs[key] = thumb
+            if len(self._thumbs) > MEMORY_ENTRIES:
+                self._thumbs.popitem(last=False)
+        self._thumbs.move_to_end(key)
+        return thumb
+
+    def _grid(self, key: str, meta: dict) -> np.ndarray:
+        grid = self._grids.get(key)
+        if grid is None:
+            grid = np.frombuffer(bytes.fromhex(meta["coarse"]), np.uint8).reshape(
+                COARSE_SIZE[1], COARSE_SIZE[0])
+            self._grids[key] = grid
+        return grid
+
+    @staticmethod
+    def ref(img: Image.Image) -> dict:
+        """Content key and thumbnail of `img` (computed once); pass to get / put."""
+        thumb = thumbnail(img)
+        return {"key": content_key(img), "thumb": thumb, "coarse": coarse_grid(thumb)}
+
+    def _matches(self, ref: dict) -> list:
+        """(key, "exact" | "near") of cached images matching `ref`, closest first."""
+        key = ref["key"]
+        near = []
+        for k, meta in self.index.items():
+            if k == key or "coarse" not in meta:     # entries from the old dHash format
+                continue
+            if _coarse_distance(ref["coarse"], self._grid(k, meta)) > NEAR_DUP_COARSE_MAX:
+                continue
+            thumb = self._thumb(k)
+            if thumb is None:
+                continue
+            d = residual(ref["thumb"], thumb)
+            if d <= NEAR_DUP_MAX_RESIDUAL:
+                near.append((d, k))
+        exact = [(key, "exact")] if key in self.index else []
+        return exact + [(k, "near") for _, k in sorted(near)]
+
+    def get(self, ref: dict, stage: str, version: str):
+        """
+        Cached value of `stage` at `version`: {"value", "match", "key"} or None.
+        Matching images are tried closest first until one holds the stage at
+        `version`, so a nearer rescan cached by an older model does not hide
+        a usable one.
+        """
+        with self._lock:
+            for key, match in self._matches(ref):
+                entry = self._read(key)
+                stored = (entry or {}).get("stages", {}).get(stage)
+                if not stored or stored.get("version") != version:
+                    continue
+                self.index[key]["used"] = time.time()
+                self.stats["exact_hits" if match == "exact" else "near_hits"] += 1
+                return {"value": stored["value"], "match": match, "key": key}
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, ref: dict, stage: str, version: str, value):
+        """Store `value` as `stage` under the exact key, then evict beyond the size cap."""
+        with self._lock:
+            key = ref["key"]
+            entry = (self._read(key) if key in self.index else None) or {"stages": {}}
+            entry["stages"][stage] = {"version": version, "value": value, "t": time.time()}
+            data = json.dumps(entry, ensure_ascii=False, default=str)
+            with open(self._file(key), "w", encoding="utf-8") as f:
+                f.write(data)
+            self._remember(key, entry)
+            meta = self.index.get(key)
+            if meta is None:
+                Image.fromarray(ref["thumb"]).save(self._thumb_file(key))
+                meta = {"coarse": ref["coarse"].tobytes().hex(),
+                        "thumb_bytes": os.path.getsize(self._thumb_file(key))}
+                self.index[key] = meta
+            meta["bytes"] = len(data.encode("utf-8")) + meta.get("thumb_bytes", 0)
+            meta["used"] = time.time()
+            self.stats["puts"] += 1
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        total = sum(m.get("bytes", 0) for m in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k].get("used", 0)):
+            if total <= self.max_bytes:
+                break
+            total -= self.index[key].get("bytes", 0)
+            del self.index[key]
+            self._forget(key)
+            self.stats["evictions"] += 1
+
+    def _forget(self, key: str):
+        self._mem.pop(key, None)
+        self._thumbs.pop(key, None)
+        self._grids.pop(key, None)
+        for path in (self._file(key), self._thumb_file(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self.index):
+                self._forget(key)
+            self.index = {}
+            self._save_index()
+
+
+def get_cache():
+    """The process-wide cache, or None when CHEQUE_EXTRACT_CACHE=0."""
+    global _cache
+    if os.environ.get(CACHE_ENV, "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ExtractionCache()
+                except OSError as e:
+                    print(f"[Extract-Cache] Disabled: {e}")
+                    os.environ[CACHE_ENV] = "0"
+                    return None
+    return _cache
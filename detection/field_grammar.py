@@ -0,0 +1,307 @@
+"""
+Field Grammar — precompiled cheque field rules over OCR text
+============================================================
+The regex fallback of ocr_extractor (`_parse_raw_to_fields`,
+`_repair_numerics`) used to run 20+ `re.search` calls over the full OCR text
+for every cheque, most of them scanning all of it just to find nothing.
+Here the same rules are compiled once and run as one grammar:
+
+  1. gate    — one lower-cased copy of the text; each rule lists the literal
+               words a match must contain ("branch", "only", "/" …) and is
+               skipped outright when none is present
+  2. rules   — per field, in priority order, stopping at the first rule that
+               yields a value (the old `find(a) or find(b)` chains)
+  3. digits  — a single scan collects the standalone digit runs that the
+               cheque-number / account-number fallbacks and the repair pass
+               all used to re-find
+  4. spans   — every hit is a candidate span {field, value, start, end, rule,
+               confidence}; `parse_fields` picks the winners
+
+Rules that begin with `\\b` + digit or letter are written with the boundary as
+a lookbehind after the first character, so the regex engine can skip ahead on
+the leading character class; a combined alternation of all rules was measured
+and is slower than separate anchored rules in CPython's `re`.
+
+Results are byte-identical to the previous regex code — check with
+`python -m detection.bench_field_grammar` (generated corpus of clean, noisy
+and very long OCR outputs, plus any saved OCR texts).
+
+    from detection.field_grammar import parse_fields, scan
+    parse_fields(ocr_text)          # same dict as the old _parse_raw_to_fields
+    scan(ocr_text)                  # [{"field", "value", "start", "end", "rule", "confidence"}]
+"""
+
+import re
+
+_I = re.IGNORECASE
+
+# Characters IGNORECASE matches to an ASCII letter that str.lower() does not map
+_CASE_FOLD = {0x130: "i", 0x131: "i", 0x17F: "s", 0x212A: "k"}
+
+_MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+
+
+def _rule(name, field, pattern, gate, confidence, flags=_I, tail=None):
+    """
+    gate: tuple of literals (lower case) of which a match contains at least one.
+    tail: (literal every match ends with, class every other matched character
+    is in) — the search then starts after the last character outside the
+    class before the literal's first occurrence, where any match must start.
+    """
+    rule = {"name": name, "field": field, "re": re.compile(pattern, flags),
+            "gate": gate, "confidence": confidence, "tail": None}
+    if tail:
+        literal, chars = tail
+        rule["tail"] = (re.compile(literal, _I),
+                        re.compile(rf"[^{chars}](?=[{chars}]*\Z)", _I))
+    return rule
+
+
+# ── Rules (priority order per field) ──────────────────────────────────────────
+# Patterns and fallback order are those of the original regex parser.
+
+RULES = [
+    # Date — DD/MM/YYYY, DD-MM-YYYY, D/M/YY, or "15 Apr 2024"
+    _rule("date_numeric", "date", r"(\d(?<!\w\d)\d?[\/\-]\d{1,2}[\/\-]\d{2,4})\b",
+          ("/", "-"), 0.9),
+    _rule("date_month", "date",
+          r"(\d(?<!\w\d)\d?\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\w*\s+\d{2,4})\b",
+          _MONTHS, 0.8),
+
+    # Amount numeric — prefer currency-prefixed; commas stripped afterwards
+    _rule("amount_currency", "amount_numeric", r"(?:₹|Rs\.?|INR)\s*([\d,]+(?:\.\d{1,2})?)",
+          ("₹", "rs", "inr"), 0.9),
+    _rule("amount_label", "amount_numeric",
+          r"(?:Amount|Amt)[\s:]*(?:₹|Rs\.?)?\s*([\d,]+(?:\.\d{1,2})?)", ("amount", "amt"), 0.8),
+    _rule("amount_rupees", "amount_numeric", r"\b(?:Rupees?|Rs\.?)\s*(\d{2,12}(?:\.\d{1,2})?)\b",
+          ("rupee", "rs"), 0.6),
+
+    # Amount in words — "Rupees ... Only" or "... Rupees Only"
+    _rule("words_rupees_only", "amount_words",
+          r"((?:Rupees?|Rs\.?)\s+[^\n\r]{2,120}?\s+[Oo]nly)", ("only",), 0.9),
+    _rule("words_label", "amount_words",
+          r"(?:in\s+words?|amount\s+in\s+words?)[\s:]+([^\n\r]{2,120}(?:[Oo]nly)?)", ("word",), 0.7),
+    _rule("words_only", "amount_words", r"([A-Z][a-z]+(?:\s+[A-Za-z]+){1,10})\s+[Oo]nly",
+          ("only",), 0.5, tail=("only", r"A-Za-z\s")),
+
+    # IFSC — 4 letters + 0 + 6 alphanumeric
+    _rule("ifsc", "ifsc_code", r"([A-Z](?<!\w[A-Z])[A-Z]{3}0[A-Z0-9]{6})\b", ("0",), 0.9),
+
+    # Cheque / account numbers — labelled; digit-run fallbacks in parse_fields
+    _rule("cheque_label", "cheque_number",
+          r"(?:Cheque|Ch\.?)\s*(?:No\.?|Number)?\s*[:\-]?\s*(\d{6,10})\b", ("ch",), 0.9),
+    _rule("account_label", "account_number",
+          r"(?:A/?c\.?|Account)\s*(?:No\.?|Number)?\s*[:\-]?\s*(\d{9,18})\b", ("ac", "a/c"), 0.9),
+
+    # Payee — text after "Pay" up to end-of-line or "or bearer"
+    _rule("payee", "payee_name",
+          r"\bPay(?:\s+to)?(?:\s+the\s+order\s+of)?\s+([^\n\r]+?)(?:\s+or\s+bearer|\s+rupees?|\s*$)",
+          ("pay",), 0.8, _I | re.MULTILINE),
+
+    # Branch — line after "Branch:" label, or "<name> Branch"
+    _rule("branch_label", "branch_name", r"Branch\s*[:\-]\s*([^\n]+)", ("branch",), 0.8),
+    _rule("branch_suffix", "branch_name", r"\b([A-Za-z ]+)\s+Branch\b", ("branch",), 0.6,
+          tail=("branch", r"A-Za-z\s")),
+
+    # Account holder — labelled, or "For <NAME>" above the signature
+    _rule("holder_label", "account_holder",
+          r"(?:A/?c\.?\s*(?:Holder|Name)|Account\s+Holder|Name)\s*[:\-]?\s*([^\n]+)",
+          ("holder", "name"), 0.8),
+    _rule("holder_for", "account_holder", r"For\s+([A-Z][A-Za-z .&]{3,60})", ("for",), 0.6),
+]
+
+_SIGNATURE = _rule("signature", "signature_present",
+                   r"\b(signature|signatory|signed|please sign above)\b", ("sign",), 0.6)
+_BANK_LINE = re.compile(r"\b(bank|sbi|hdfc|icici|axis|kotak|canara|pnb|union bank|bank of baroda)\b", _I)
+_PAYEE_LABEL = re.compile(r"\bA/c\s+Payee\b|\bAccount\s+Payee\b", _I)
+_SPACES = re.compile(r"[ \t]+")
+_DIGITS = re.compile(r"\d{6,}")
+
+_BY_FIELD = {}
+for _r in RULES:
+    _BY_FIELD.setdefault(_r["field"], []).append(_r)
+
+# Repair pass rules — run over the raw (not whitespace-collapsed) OCR text
+REPAIR_RULES = {
+    "amount_currency": _rule("amount_currency", "amount_numeric",
+                             r"(?:₹|Rs\.?|INR)\s*([\d,]+(?:\.\d{1,2})?)", None, 0.9),
+    "amount_any":      _rule("amount_any", "amount_numeric",
+                             r"(\d(?<!\w\d)\d{2,11}(?:\.\d{1,2})?)\b", None, 0.3),
+    "account_label":   _rule("account_label", "account_number",
+                             r"(?:A/?c|Account)\s*(?:No\.?|Number)\s*[:\-]?\s*(\d{9,18})",
+                             None, 0.9),
+    "cheque_label":    _rule("cheque_label", "cheque_number",
+                             r"(?:Cheque|Ch\.?)?\s*(?:No\.?|Number)\s*[:\-]?\s*(\d{6,10})\b",
+                             None, 0.8),
+}
+_SIX_DIGITS = re.compile(r"\d(?<!\w\d)\d{5}(?!\w)")    # \b\d{6}\b
+
+
+# ── Scanning ──────────────────────────────────────────────────────────────────
+
+def _is_word(ch: str) -> bool:
+    """Same test as the regex `\\w` class."""
+    return ch.isalnum() or ch == "_"
+
+
+class _Text:
+    """One OCR text plus its lazily built gate copy and digit runs."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self._low = None
+        self._runs = None
+
+    def gate_open(self, rule: dict) -> bool:
+        if rule["gate"] is None:
+            return True
+        if self._low is None:
+            t = self.text if self.text.isascii() else self.text.translate(_CASE_FOLD)
+            self._low = t.lower()
+        return any(g in self._low for g in rule["gate"])
+
+    def search(self, rule: dict):
+        if not self.gate_open(rule):
+            return None
+        pos = 0
+        if rule["tail"]:
+            literal, outside = rule["tail"]
+            first = literal.search(self.text)
+            if first is None:
+                return None
+            last = outside.search(self.text, 0, first.start())
+            pos = last.end() if last else 0
+        return rule["re"].search(self.text, pos)
+
+    def digit_runs(self) -> list:
+        """(start, run) of every standalone run of 6–18 digits, i.e. `\\b\\d{6,18}\\b`."""
+        if self._runs is None:
+            t, runs = self.text, []
+            for m in _DIGITS.finditer(t):
+                s, e = m.span()
+                if e - s <= 18 and not (s and _is_word(t[s - 1])) \
+                        and not (e < len(t) and _is_word(t[e])):
+                    runs.append((s, m.group()))
+            self._runs = runs
+        return self._runs
+
+
+def _first_lines(t: str, n: int) -> list:
+    """First `n` non-empty stripped lines of t.splitlines(), without splitting all of t."""
+    chunk = 4096
+    while True:
+        lines = t[:chunk].splitlines()
+        if chunk < len(t):
+            lines = lines[:-1]          # may be cut mid-line
+        kept = [s for s in (ln.strip(" :-|\t") for ln in lines) if s]
+        if len(kept) >= n or chunk >= len(t):
+            return kept[:n]
+        chunk *= 4
+
+
+def _span(rule: dict, m, value: str) -> dict:
+    return {"field": rule["field"], "value": value, "start": m.start(1), "end": m.end(1),
+            "rule": rule["name"], "confidence": rule["confidence"]}
+
+
+def _normalise(text: str) -> str:
+    return _SPACES.sub(" ", text.strip())
+
+
+def scan(text: str, exhaustive: bool = False) -> list:
+    """
+    Candidate spans over the whitespace-normalised OCR text. By default each
+    field stops at its first rule with a value (what parse_fields needs);
+    exhaustive=True evaluates every rule.
+    """
+    src = _Text(_normalise(text or ""))
+    spans = []
+    for field, rules in _BY_FIELD.items():
+        for rule in rules:
+            m = src.search(rule)
+            value = m.group(1).strip() if m else None
+            if value:
+                spans.append(_span(rule, m, value))
+                if not exhaustive:
+                    break
+    for start, run in src.digit_runs():
+        spans.append({"field": "digit_run", "value": run, "start": start,
+                      "end": start + len(run), "rule": "digit_run", "confidence": 0.4})
+    m = src.search(_SIGNATURE)
+    if m:
+        spans.append(_span(_SIGNATURE, m, "yes"))
+    return spans
+
+
+def parse_fields(text: str) -> dict:
+    """Regex fallback parser for Indian bank cheque layouts (one grammar pass)."""
+    t = _normalise(text)
+    src = _Text(t)
+
+    def find(field):
+        for rule in _BY_FIELD[field]:
+            m = src.search(rule)
+            if m:
+                value = m.group(1).strip()
+                if value:
+                    return value
+        return None
+
+    date = find("date")
+    amount_raw = find("amount_numeric")
+    amount_num = amount_raw.replace(",", "") if amount_raw else None
+    amount_words = find("amount_words")
+    ifsc = find("ifsc_code")
+
+    cheque_no = find("cheque_number")
+    acct_no = find("account_number")
+    if cheque_no is None:
+        cheque_no = next((run for _, run in src.digit_runs() if len(run) == 6), None)
+    if acct_no is None:
+        acct_no = next((run for _, run in src.digit_runs()
+                        if 9 <= len(run) <= 18 and run != cheque_no), None)
+
+    payee = find("payee_name")
+    if payee:
+        payee = _PAYEE_LABEL.sub("", payee).strip(" -")
+    branch = find("branch_name")
+    account_holder = find("account_holder")
+
+    # Bank name — first clean line (of the first 12) naming a bank
+    bank_name = None
+    for line in _first_lines(t, 12):
+        if _BANK_LINE.search(line) and len(line) > 3:
+            bank_name = line
+            break
+
+    sig_present = "yes" if src.search(_SIGNATURE) else None
+
+    return {
+        "account_holder":    account_holder,
+        "bank_name":         bank_name,
+        "branch_name":       branch,
+        "cheque_number":     cheque_no,
+        "date":              date,
+        "payee_name":        payee,
+        "amount_numeric":    amount_num,
+        "amount_words":      amount_words,
+        "signature_present": sig_present,
+        "ifsc_code":         ifsc,
+        "account_number":    acct_no,
+    }
+
+
+def repair_source(ocr_text: str) -> _Text:
+    """Raw OCR text wrapped for `repair_search` / `repair_six_digit_run`."""
+    return _Text(ocr_text or "")
+
+
+def repair_search(src: _Text, name: str):
+    """First match of REPAIR_RULES[name] in the raw OCR text, or None."""
+    return src.search(REPAIR_RULES[name])
+
+
+def repair_six_digit_run(src: _Text):
+    """First standalone 6-digit run (`\\b\\d{6}\\b`) in the raw OCR text."""
+    m = _SIX_DIGITS.search(src.text)
+    return m.group() if m else None
@@ -0,0 +1,305 @@
+"""
+IFSC Index — offline bank / branch directory, memory-mapped
+===========================================================
+Validates and corrects `ifsc_code` against the RBI IFSC directory and derives
+the canonical bank and branch from it, so the VLM's bank / branch reading is
+only a fallback.
+
+Build once from a local directory export (RBI's IFSC list or the Razorpay
+IFSC.csv — columns BANK, IFSC, BRANCH, CENTRE/CITY, MICR, matched by name):
+
+    python -m detection.ifsc_index --build IFSC.csv        # → detection/ifsc_index.bin
+    python -m detection.ifsc_index SBIN0OO1234 HDFC0000240  # look up / correct
+    python -m detection.ifsc_index --bench                 # µs per lookup
+
+File layout (little-endian, read through mmap — nothing is parsed at load):
+
+    header   magic, n, records / keys / strings offsets
+    records  n × (ifsc[11], bank, branch, centre, micr string offsets), sorted by IFSC
+    keys     n × (confusion key[11], record index), sorted by key
+    strings  deduplicated (u16 length, utf-8 bytes); offset 0 is the empty string
+
+Lookup is a binary search over the records (exact), then over the keys:
+the confusion key maps each character to its OCR confusion class
+(O/0/D/Q, I/1/L, S/5, B/8, Z/2, G/6), so every valid code a misread could
+stand for is one contiguous key range. Codes outside it are searched by
+one-substitution distance within the bank's prefix range. A correction is
+only returned when exactly one candidate is closest.
+
+    from detection.ifsc_index import get_index
+    idx = get_index()                  # None when no index file is built
+    idx.correct("SBIN0OO1234")         # {"ifsc", "bank", "branch", "centre", "micr", "match"}
+"""
+
+import csv
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+INDEX_ENV     = "CHEQUE_IFSC_INDEX"
+BANK_FROM_ENV = "CHEQUE_BANK_FROM_IFSC"   # "1": ROI prompts ask for the IFSC only
+DEFAULT_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ifsc_index.bin")
+
+MAGIC   = b"IFSCIDX1"
+_HEADER = struct.Struct("<8sIIII")        # magic, n, records_off, keys_off, strings_off
+_RECORD = struct.Struct("<11sxIIII")      # ifsc, bank, branch, centre, micr
+_KEY    = struct.Struct("<11sxI")         # confusion key, record index
+_LEN    = struct.Struct("<H")
+
+PREFIX_SCAN_MAX = 40000                   # records scanned for a one-substitution match
+
+_CONFUSION = {}
+for _cls in ("O0DQ", "I1L", "S5", "B8", "Z2", "G6"):
+    for _c in _cls:
+        _CONFUSION[_c] = _cls[0]
+_TO_LETTER = {"0": "O", "1": "I", "5": "S", "8": "B", "2": "Z", "6": "G", "4": "A"}
+_TO_ZERO   = {"O": "0", "D": "0", "Q": "0"}
+
+_COLUMNS = {
+    "ifsc":   ("IFSC", "IFSC CODE", "IFSC_CODE"),
+    "bank":   ("BANK", "BANK NAME", "BANK_NAME"),
+    "branch": ("BRANCH", "BRANCH NAME", "BRANCH_NAME"),
+    "centre": ("CENTRE", "CITY", "CITY1", "DISTRICT"),
+    "micr":   ("MICR", "MICR CODE", "MICR_CODE"),
+}
+
+_index = None
+_index_lock = threading.Lock()
+
+
+# ── Codes ─────────────────────────────────────────────────────────────────────
+
+def clean_code(text) -> str:
+    """Upper-case alphanumerics of `text` ("sbin 0001 234" → "SBIN0001234")."""
+    return re.sub(r"[^A-Z0-9]", "", str(text or "").upper())
+
+
+def positional_fix(code: str) -> str:
+    """Apply the IFSC shape: 4 letters, then '0', then 6 alphanumerics."""
+    if len(code) != 11:
+        return code
+    head = "".join(_TO_LETTER.get(c, c) for c in code[:4])
+    zero = _TO_ZERO.get(code[4], code[4])
+    return head + zero + code[5:]
+
+
+def confusion_key(code: str) -> str:
+    return "".join(_CONFUSION.get(c, c) for c in code)
+
+
+def is_well_formed(code: str) -> bool:
+    return bool(re.fullmatch(r"[A-Z]{4}0[A-Z0-9]{6}", code or ""))
+
+
+# ── Build ─────────────────────────────────────────────────────────────────────
+
+def build_index(csv_path: str, out_path: str = DEFAULT_INDEX) -> int:
+    """Compile a directory CSV into the memory-mappable index. Returns record count."""
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        header = {h.strip().upper(): h for h in reader.fieldnames or []}
+        cols = {k: next((header[a] for a in aliases if a in header), None)
+                for k, aliases in _COLUMNS.items()}
+        if cols["ifsc"] is None:
+            raise ValueError(f"{csv_path}: no IFSC column in {list(header)}")
+        rows = {}
+        for row in reader:
+            code = clean_code(row.get(cols["ifsc"]))
+            if is_well_formed(code):
+                rows[code] = {k: (row.get(c) or "").strip() if c else ""
+                              for k, c in cols.items() if k != "ifsc"}
+
+    strings, blob = {"": 0}, bytearray(_LEN.pack(0))
+
+    def intern(s: str) -> int:
+        if s not in strings:
+            data = s.encode("utf-8")[:65535]
+            strings[s] = len(blob)
+            blob.extend(_LEN.pack(len(data)) + data)
+        return strings[s]
+
+    codes = sorted(rows)
+    records = bytearray()
+    for code in codes:
+        r = rows[code]
+        records += _RECORD.pack(code.encode("ascii"), intern(r["bank"]), intern(r["branch"]),
+                                intern(r["centre"]), intern(r["micr"]))
+    keys = bytearray()
+    for key, i in sorted((confusion_key(c), i) for i, c in enumerate(codes)):
+        keys += _KEY.pack(key.encode("ascii"), i)
+
+    records_off = _HEADER.size
+    keys_off = records_off + len(records)
+    strings_off = keys_off + len(keys)
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(codes), records_off, keys_off, strings_off))
+        f.write(records)
+        f.write(keys)
+        f.write(blob)
+    os.replace(tmp, out_path)
+    return len(codes)
+
+
+# ── Index ─────────────────────────────────────────────────────────────────────
+
+class IFSCIndex:
+    """Read-only view of a built index file."""
+
+    def __init__(self, path: str = DEFAULT_INDEX):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n, self._rec, self._keys, self._str = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not an IFSC index")
+
+    def _code_at(self, i: int) -> bytes:
+        off = self._rec + i * _RECORD.size
+        return self._mm[off:off + 11]
+
+    def _key_at(self, i: int) -> bytes:
+        off = self._keys + i * _KEY.size
+        return self._mm[off:off + 11]
+
+    def _string(self, off: int) -> str:
+        (n,) = _LEN.unpack_from(self._mm, self._str + off)
+        start = self._str + off + _LEN.size
+        return self._mm[start:start + n].decode("utf-8")
+
+    def _record(self, i: int) -> dict:
+        code, bank, branch, centre, micr = _RECORD.unpack_from(self._mm, self._rec + i * _RECORD.size)
+        return {"ifsc": code.decode("ascii"), "bank": self._string(bank) or None,
+                "branch": self._string(branch) or None, "centre": self._string(centre) or None,
+                "micr": self._string(micr) or None}
+
+    def _lower_bound(self, at, target: bytes) -> int:
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, code: str):
+        target = code.encode("ascii")
+        i = self._lower_bound(self._code_at, target)
+        return i if i < self.n and self._code_at(i) == target else None
+
+    def lookup(self, code: str):
+        """Directory record of an exact IFSC, or None."""
+        code = clean_code(code)
+        if not is_well_formed(code):
+            return None
+        i = self._find(code)
+        return self._record(i) if i is not None else None
+
+    def _confusable(self, code: str) -> list:
+        key = confusion_key(code).encode("ascii")
+        i = self._lower_bound(self._key_at, key)
+        out = []
+        while i < self.n and self._key_at(i) == key:
+            (idx,) = struct.unpack_from("<I", self._mm, self._keys + i * _KEY.size + 12)
+            out.append(idx)
+            i += 1
+        return out
+
+    def _one_substitution(self, code: str) -> list:
+        prefix = code[:4].encode("ascii")
+        i = self._lower_bound(self._code_at, prefix)
+        target = code.encode("ascii")
+        out = []
+        for j in range(i, min(self.n, i + PREFIX_SCAN_MAX)):
+            other = self._code_at(j)
+            if other[:4] != prefix:
+                break
+            if sum(a != b for a, b in zip(other, target)) == 1:
+                out.append(j)
+        return out
+
+    def correct(self, text):
+        """
+        Nearest valid IFSC for an extracted code. Returns the directory record
+        plus {"input", "match": "exact" | "corrected"}, or None when the code
+        is unknown and no single closest valid code exists.
+        """
+        raw = clean_code(text)
+        if len(raw) != 11:
+            return None
+        code = positional_fix(raw)
+        i = self._find(code) if is_well_formed(code) else None
+        if i is None:
+            candidates = self._confusable(code)
+            if not candidates and is_well_formed(code):
+                candidates = self._one_substitution(code)
+            if not candidates:
+                return None
+            dist = {c: sum(a != b for a, b in zip(self._code_at(c).decode("ascii"), code))
+                    for c in candidates}
+            best = min(dist.values())
+            closest = [c for c, d in dist.items() if d == best]
+            if len(closest) != 1:
+                return None
+            i = closest[0]
+        rec = self._record(i)
+        rec["input"] = raw
+        rec["match"] = "exact" if rec["ifsc"] == raw else "corrected"
+        return rec
+
+
+def get_index():
+    """The process-wide index, or None when no index file has been built."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                path = os.environ.get(INDEX_ENV, DEFAULT_INDEX)
+                if not os.path.exists(path):
+                    return None
+                try:
+                    _index = IFSCIndex(path)
+                    print(f"[IFSC] Index loaded: {_index.n} branches from {path}")
+                except (OSError, ValueError) as e:
+                    print(f"[IFSC] Index unavailable: {e}")
+                    return None
+    return _index
+
+
+def bank_from_ifsc() -> bool:
+    """True when bank / branch should come from the index instead of ROI prompts."""
+    return os.environ.get(BANK_FROM_ENV, "0") == "1" and get_index() is not None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Offline IFSC directory index")
+    p.add_argument("codes", nargs="*", help="IFSC codes to look up / correct")
+    p.add_argument("--build", metavar="CSV", help="Compile a directory CSV into the index")
+    p.add_argument("--index", default=os.environ.get(INDEX_ENV, DEFAULT_INDEX))
+    p.add_argument("--bench", action="store_true", help="Time exact lookups and corrections")
+    args = p.parse_args()
+
+    if args.build:
+        t = time.time()
+        n = build_index(args.build, args.index)
+        print(f"[IFSC] {n} branches → {args.index} "
+              f"({os.path.getsize(args.index) / 2 ** 20:.1f} MB, {time.time() - t:.1f}s)")
+    idx = IFSCIndex(args.index)
+    for code in args.codes:
+        print(f"{code}: {idx.correct(code)}")
+    if args.bench and idx.n:
+        sample = [idx._code_at(i).decode("ascii") for i in range(0, idx.n, max(1, idx.n // 1000))]
+        misread = [s[:4] + "O" + s[5:].replace("0", "O").replace("1", "I") for s in sample]
+        for name, fn, codes in (("lookup", idx.lookup, sample),
+                                ("correct (exact)", idx.correct, sample),
+                                ("correct (misread)", idx.correct, misread)):
+            t = time.perf_counter()
+            for c in codes:
+                fn(c)
+            print(f"[IFSC] {name:<18} {(time.perf_counter() - t) / len(codes) * 1e6:8.1f} µs")
@@ -0,0 +1,101 @@
+"""
+Incremental JSON Field Parser
+=============================
+Feeds on VLM output deltas and reports each top-level key of the first JSON
+object as soon as its value is complete — long before the closing brace.
+
+    parser = JSONFieldStream()
+    for delta in backend.stream(img, prompt):
+        for key, value in parser.feed(delta):
+            ...                      # e.g. emit an SSE "extract_field" event
+
+Anything before the first "{" (markdown fences, chatter) is ignored. Nested
+objects/arrays are returned whole once balanced. A value that is not valid
+JSON (e.g. an unquoted word) is returned as its stripped source text.
+"""
+
+import json
+
+
+class JSONFieldStream:
+    """Character-level scanner over the first top-level JSON object."""
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0            # next character of buf to scan
+        self.depth = 0          # brace/bracket depth (1 = inside the object)
+        self.in_str = False
+        self.escape = False
+        self.key = None         # current key, once its closing quote is seen
+        self.tok_start = None   # buf index where the current key/value began
+        self.expect = "key"     # "key" | "colon" | "value"
+        self.done = False
+        self.fields = {}
+
+    def _emit_value(self, end: int):
+        raw = self.buf[self.tok_start:end].strip()
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        key = self.key
+        self.fields[key] = value
+        self.key, self.tok_start, self.expect = None, None, "key"
+        return key, value
+
+    def feed(self, delta: str) -> list:
+        """Consume `delta`; return [(key, value), ...] completed by it."""
+        out = []
+        if self.done:
+            return out
+        self.buf += delta
+        buf = self.buf
+        i = self.pos
+        while i < len(buf):
+            c = buf[i]
+            if self.in_str:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_str = False
+                    if self.depth == 1 and self.expect == "key":
+                        self.key = json.loads(buf[self.tok_start:i + 1])
+                        self.tok_start, self.expect = None, "colon"
+                    elif self.depth == 1 and self.expect == "value":
+                        out.append(self._emit_value(i + 1))
+                i += 1
+                continue
+
+            if self.depth == 0:
+                if c == "{":
+                    self.depth = 1
+            elif c == '"':
+                self.in_str = True
+                if self.depth == 1 and self.tok_start is None:
+                    self.tok_start = i
+            elif c in "{[":
+                if self.depth == 1 and self.expect == "value" and self.tok_start is None:
+                    self.tok_start = i
+                self.depth += 1
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.expect == "value":
+                    out.append(self._emit_value(i + 1))
+                elif self.depth == 0:
+                    if self.expect == "value" and self.tok_start is not None:
+                        out.append(self._emit_value(i))
+                    self.done = True
+                    i += 1
+                    break
+            elif self.depth == 1:
+                if c == ":" and self.expect == "colon":
+                    self.expect = "value"
+                elif c == "," and self.expect == "value" and self.tok_start is not None:
+                    out.append(self._emit_value(i))
+                elif not c.isspace() and self.expect == "value" and self.tok_start is None:
+                    self.tok_start = i          # bare literal: null / number / true
+            i += 1
+        self.pos = i
+        return out
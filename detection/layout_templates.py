@@ -0,0 +1,429 @@
+"""
+Layout Templates — per-bank ROI registry learned from processed cheques
+=======================================================================
+Cheques of one bank share a layout: the date box, amount box, payee line,
+signature area and MICR band sit at the same relative positions. The
+registry learns those positions per bank from the first LEARN_SAMPLES
+successfully processed cheques, persists them, and later cheques of that
+bank go straight to the learned ROIs:
+
+  extraction  the full / single pipeline is replaced by the ROI passes on
+              the template's crops; when key fields are still missing the
+              cheque falls back to the configured pipeline (a miss)
+  detection   Falcon looks for the signature inside the learned signature
+              area; finding nothing there falls back to the full cheque
+
+Keys: the IFSC bank prefix ("SBIN") of the extracted ifsc_code. Before
+extraction (`key_before_extraction`) the key comes from, in order:
+  micr    the 3-digit MICR bank code (sort code digits 4–6), kept as an alias
+          of the IFSC prefix ("micr:002"). Depends on detection/micr.py: used
+          only when its templates passed held-out validation
+          (`templates_validated()`) and the sort code read is confident
+  header  the IFSC in the printed header read by classical OCR
+          (detection/classical_ocr.py), when an engine is installed
+With neither, the match is "unknown" and the full pipeline runs. A bank seen
+without a readable IFSC is keyed by the MICR alias alone.
+
+What a processed cheque contributes (fractions of the cheque size):
+  handwritten ROIs  bounding box of the blue pen ink inside the prior ROI
+                    (date, payee, amount_words, amount_numeric), when the
+                    field was extracted
+  micr              the decoded code line's box (detection/micr.py)
+  signature         the Falcon signature boxes
+  aspect            width / height, checked at match time
+
+A template is used only when the cheque's aspect and MICR line position
+agree with it (MATCH_ASPECT_TOL, MATCH_MICR_TOL); MISS_LIMIT consecutive
+misses send the bank back to learning. Printed ROIs (header, account,
+holder) keep the cheque_layout priors.
+
+    python -m detection.layout_templates              # list templates
+    python -m detection.layout_templates --reset SBIN
+
+CHEQUE_LAYOUT_TEMPLATES sets the file (default detection/layout_templates.json,
+"0" disables); CHEQUE_LAYOUT_SAMPLES sets LEARN_SAMPLES.
+"""
+
+import json
+import os
+import statistics
+import threading
+
+TEMPLATES_ENV = "CHEQUE_LAYOUT_TEMPLATES"
+SAMPLES_ENV   = "CHEQUE_LAYOUT_SAMPLES"
+DEFAULT_FILE  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layout_templates.json")
+
+LEARN_SAMPLES    = 5
+ROI_MARGIN       = 0.02     # added around the learned extent of a field
+INK_SEARCH_PAD   = 0.04     # ink is looked for this far outside the prior ROI
+INK_MIN_PX       = 40       # fewer blue pixels than this is not a field
+MATCH_ASPECT_TOL = 0.06     # relative width / height difference
+MATCH_MICR_TOL   = 0.03     # MICR line centre, fraction of cheque height
+MISS_LIMIT       = 3
+SAVE_EVERY       = 20       # hit / miss records between writes once learned
+
+# Fields whose absence after the template ROI passes means the layout did not fit
+KEY_FIELDS = ("date", "payee_name", "amount_numeric", "amount_words")
+HANDWRITTEN_ROIS = {"date": "date", "payee": "payee_name",
+                    "amount_words": "amount_words", "amount_numeric": "amount_numeric"}
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _clamp_box(box) -> list:
+    x1, y1, x2, y2 = box
+    return [round(max(0.0, x1), 4), round(max(0.0, y1), 4),
+            round(min(1.0, x2), 4), round(min(1.0, y2), 4)]
+
+
+def _extent(boxes: list, margin: float = ROI_MARGIN) -> list:
+    """Smallest box holding every observed box, plus `margin`."""
+    return _clamp_box((min(b[0] for b in boxes) - margin, min(b[1] for b in boxes) - margin,
+                       max(b[2] for b in boxes) + margin, max(b[3] for b in boxes) + margin))
+
+
+def _filled(v) -> bool:
+    return v not in (None, "", "null")
+
+
+def _ink_boxes(img, fields: dict) -> dict:
+    """Fractional blue-ink box of each extracted handwritten field, within its prior ROI."""
+    import cv2
+    import numpy as np
+    from detection.cheque_layout import FIELD_ROIS, roi_box
+    from detection.quality_gate import _LOWER_HSV, _UPPER_HSV
+
+    w, h = img.size
+    rgb = np.asarray(img.convert("RGB"))
+    out = {}
+    for name, field in HANDWRITTEN_ROIS.items():
+        if not _filled(fields.get(field)):
+            continue
+        x1, y1, x2, y2 = roi_box(img, FIELD_ROIS[name]["box"], INK_SEARCH_PAD)
+        hsv = cv2.cvtColor(np.ascontiguousarray(rgb[y1:y2, x1:x2]), cv2.COLOR_RGB2HSV)
+        ink = cv2.inRange(hsv, _LOWER_HSV, _UPPER_HSV) > 0
+        if ink.sum() < INK_MIN_PX:
+            continue
+        # Rows / columns with a couple of ink pixels; stray specks do not stretch the box
+        rows = np.flatnonzero(ink.sum(axis=1) >= 2)
+        cols = np.flatnonzero(ink.sum(axis=0) >= 2)
+        if not len(rows) or not len(cols):
+            continue
+        out[name] = [round((x1 + cols[0]) / w, 4), round((y1 + rows[0]) / h, 4),
+                     round((x1 + cols[-1] + 1) / w, 4), round((y1 + rows[-1] + 1) / h, 4)]
+    return out
+
+
+def micr_alias(micr: dict):
+    """
+    "micr:<bank code>" of a MICR decode, or None — also None while the MICR
+    templates have not passed held-out validation.
+    """
+    if not micr or not micr.get("bank_code"):
+        return None
+    from detection.micr import MICR_MIN_CONF, templates_validated
+    if (micr.get("confidence") or {}).get("sort_code", 0) < MICR_MIN_CONF \
+            or not templates_validated():
+        return None
+    return f"micr:{micr['bank_code']}"
+
+
+def header_ifsc(img):
+    """IFSC prefix of a confident classical-OCR read of the printed header, or None."""
+    from detection.classical_ocr import CASCADE_MIN_CONF, available_engine, read_printed_fields
+    from detection.cheque_layout import FIELD_ROIS
+
+    if available_engine() is None:
+        return None
+    res = read_printed_fields(img, {"header": FIELD_ROIS["header"]})
+    if res["confidence"].get("ifsc_code", 0) < CASCADE_MIN_CONF:
+        return None
+    return ifsc_prefix(res["fields"])
+
+
+def ifsc_prefix(fields: dict):
+    code = str((fields or {}).get("ifsc_code") or "").upper()
+    return code[:4] if len(code) == 11 and code[:4].isalpha() and code[4] == "0" else None
+
+
+# ── Registry ──────────────────────────────────────────────────────────────────
+
+class TemplateRegistry:
+    """Bank-keyed layout templates, persisted as JSON."""
+
+    def __init__(self, path: str = DEFAULT_FILE, samples: int = LEARN_SAMPLES):
+        self.path = path
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.data = {"aliases": {}, "templates": {}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=1)
+        os.replace(tmp, self.path)
+        self._unsaved = 0
+
+    def resolve(self, fields: dict = None, micr: dict = None):
+        """Template key for a cheque: IFSC prefix, else the MICR bank-code alias."""
+        key = ifsc_prefix(fields)
+        if key:
+            return key
+        alias = micr_alias(micr)
+        return self.data["aliases"].get(alias, alias) if alias else None
+
+    # ── Lookup ────────────────────────────────────────────────────────────────
+
+    def key_before_extraction(self, img, micr: dict) -> tuple:
+        """(key, "micr" | "header") for a cheque before any model runs, or (None, None)."""
+        key = self.resolve(None, micr)
+        if key:
+            return key, "micr"
+        try:
+            key = header_ifsc(img)
+        except Exception as e:
+            print(f"[Layout] Header OCR skipped: {e}")
+            key = None
+        return (key, "header") if key else (None, None)
+
+    def match(self, img_size, micr: dict, key: str = None) -> dict:
+        """
+        Learned template for a cheque about to be processed, under `key`
+        (default: the MICR alias).
+        Returns {"key", "status": "hit" | "learning" | "mismatch" | "unknown",
+                 "reason", "template"} — template is set only on "hit".
+        """
+        key = key or self.resolve(None, micr)
+        if key is None:
+            return {"key": None, "status": "unknown", "template": None,
+                    "reason": "no validated MICR bank code or header IFSC"}
+        tpl = self.data["templates"].get(key)
+        if tpl is None:
+            return {"key": key, "status": "unknown", "reason": "no template", "template": None}
+        if tpl["status"] != "ready":
+            return {"key": key, "status": "learning",
+                    "reason": f"{len(tpl['observations'])}/{self.samples} samples",
+                    "template": None}
+        w, h = img_size
+        aspect = w / h if h else 0
+        if abs(aspect - tpl["aspect"]) > MATCH_ASPECT_TOL * tpl["aspect"]:
+            return {"key": key, "status": "mismatch",
+                    "reason": f"aspect {aspect:.2f} vs {tpl['aspect']:.2f}", "template": None}
+        line = (micr or {}).get("line_box")
+        if line and tpl.get("micr_centre") is not None:
+            centre = (line[1] + line[3]) / 2
+            if abs(centre - tpl["micr_centre"]) > MATCH_MICR_TOL:
+                return {"key": key, "status": "mismatch",
+                        "reason": f"MICR line at {centre:.3f} vs {tpl['micr_centre']:.3f}",
+                        "template": None}
+        return {"key": key, "status": "hit", "reason": "", "template": tpl}
+
+    def rois(self, tpl: dict) -> dict:
+        """FIELD_ROIS with the template's learned boxes (crop_rois `rois=`)."""
+        from detection.cheque_layout import FIELD_ROIS
+        return {name: dict(roi, box=tuple(tpl["rois"].get(name, roi["box"])))
+                for name, roi in FIELD_ROIS.items()}
+
+    @staticmethod
+    def signature_roi(tpl: dict):
+        box = (tpl or {}).get("signature")
+        return tuple(box) if box else None
+
+    def record(self, key: str, hit: bool):
+        """Count a template use; MISS_LIMIT misses in a row restart learning."""
+        with self._lock:
+            tpl = self.data["templates"].get(key)
+            if tpl is None:
+                return
+            tpl["hits" if hit else "misses"] += 1
+            tpl["miss_run"] = 0 if hit else tpl.get("miss_run", 0) + 1
+            self._unsaved += 1
+            if tpl["miss_run"] >= MISS_LIMIT:
+                print(f"[Layout] {key}: {MISS_LIMIT} misses in a row — relearning")
+                tpl.update(status="learning", observations=[], signatures=[], miss_run=0)
+                self._save()
+            elif self._unsaved >= SAVE_EVERY:
+                self._save()
+
+    # ── Learning ──────────────────────────────────────────────────────────────
+
+    def _template(self, key: str, fields: dict) -> dict:
+        return self.data["templates"].setdefault(key, {
+            "bank": fields.get("bank_name"), "status": "learning", "observations": [],
+            "signatures": [], "rois": {}, "signature": None, "aspect": None,
+            "micr_centre": None, "hits": 0, "misses": 0, "miss_run": 0,
+        })
+
+    def observe(self, img, fields: dict, micr: dict) -> bool:
+        """
+        Learn from one successfully extracted cheque (every KEY_FIELDS value
+        present). Returns True when the observation was kept.
+        """
+        if not all(_filled(fields.get(k)) for k in KEY_FIELDS):
+            return False
+        key = self.resolve(fields, micr)
+        if key is None:
+            return False
+        try:
+            boxes = _ink_boxes(img, fields)
+        except Exception as e:
+            print(f"[Layout] Ink boxes unavailable: {e}")
+            boxes = {}
+        if (micr or {}).get("line_box"):
+            boxes["micr"] = micr["line_box"]
+        with self._lock:
+            alias = micr_alias(micr)
+            if alias and alias != key:
+                self.data["aliases"][alias] = key
+            tpl = self._template(key, fields)
+            if tpl["status"] == "ready":
+                return False
+            w, h = img.size
+            tpl["observations"].append({"aspect": round(w / h, 4), "boxes": boxes})
+            if len(tpl["observations"]) >= self.samples:
+                self._finish(key, tpl)
+            self._save()
+        return True
+
+    def observe_signature(self, img_size, bboxes: list, key: str):
+        """Learn the signature area from Falcon boxes (pixels) of a cheque under `key`."""
+        tpl = self.data["templates"].get(key) if key else None
+        if tpl is None or not bboxes or len(tpl["signatures"]) >= self.samples:
+            return
+        w, h = img_size
+        with self._lock:
+            tpl["signatures"].append(_extent([[b[0] / w, b[1] / h, b[2] / w, b[3] / h]
+                                              for b in bboxes], 0.0))
+            if tpl["status"] == "ready" and len(tpl["signatures"]) >= 2:
+                tpl["signature"] = _extent(tpl["signatures"])
+            self._save()
+
+    def _finish(self, key: str, tpl: dict):
+        from detection.cheque_layout import FIELD_ROIS
+
+        obs = tpl["observations"]
+        need = (len(obs) + 1) // 2
+        rois = {}
+        for name in list(HANDWRITTEN_ROIS) + ["micr"]:
+            seen = [o["boxes"][name] for o in obs if name in o["boxes"]]
+            if len(seen) < need:
+                continue
+            box = _extent(seen)
+            if name == "micr":
+                # The line is found by row; keep the prior's horizontal extent
+                prior = FIELD_ROIS["micr"]["box"]
+                box = [prior[0], box[1], prior[2], box[3]]
+            rois[name] = box
+        micr = [o["boxes"]["micr"] for o in obs if "micr" in o["boxes"]]
+        tpl.update(
+            status="ready", rois=rois, miss_run=0,
+            aspect=round(statistics.median(o["aspect"] for o in obs), 4),
+            micr_centre=round(statistics.median((b[1] + b[3]) / 2 for b in micr), 4)
+            if micr else None,
+            signature=_extent(tpl["signatures"]) if len(tpl["signatures"]) >= 2 else None,
+        )
+        print(f"[Layout] {key}: template ready from {len(obs)} cheques "
+              f"(learned {', '.join(rois) or 'no ROIs'})")
+
+    def reset(self, key: str) -> bool:
+        with self._lock:
+            if self.data["templates"].pop(key, None) is None:
+                return False
+            self.data["aliases"] = {a: k for a, k in self.data["aliases"].items() if k != key}
+            self._save()
+            return True
+
+
+def get_registry():
+    """The process-wide registry, or None when CHEQUE_LAYOUT_TEMPLATES=0."""
+    global _registry
+    path = os.environ.get(TEMPLATES_ENV, DEFAULT_FILE)
+    if path == "0":
+        return None
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                try:
+                    _registry = TemplateRegistry(
+                        path, int(os.environ.get(SAMPLES_ENV, LEARN_SAMPLES)))
+                except (OSError, ValueError) as e:
+                    print(f"[Layout] Templates unavailable: {e}")
+                    return None
+    return _registry
+
+
+def match_image(img) -> dict:
+    """
+    Registry match for a cheque before any model runs (decodes the MICR line,
+    else reads the header IFSC). Returns the match dict plus "micr" and
+    "key_source", or None when templates are disabled.
+    """
+    registry = get_registry()
+    if registry is None:
+        return None
+    try:
+        from detection.micr import decode_micr
+        micr = decode_micr(img)
+    except Exception as e:
+        print(f"[Layout] MICR decode skipped: {e}")
+        micr = None
+    key, source = registry.key_before_extraction(img, micr)
+    res = registry.match(img.size, micr, key)
+    res.update(micr=micr, key_source=source)
+    return res
+
+
+def signature_roi(img, default):
+    """
+    (ROI for the Falcon signature pass, match) — the template's learned
+    signature area on a hit, else `default`.
+    """
+    m = match_image(img)
+    roi = TemplateRegistry.signature_roi(m["template"]) if m and m["template"] else None
+    return roi or default, m
+
+
+def record_signature(m: dict, img_size, dets: list):
+    """
+    After signature detection: a template whose area yielded nothing (Falcon
+    fell back to the full cheque) counts a miss; the boxes feed learning.
+    """
+    registry = get_registry()
+    if not m or registry is None or not m["key"]:
+        return
+    if m["template"] and m["template"].get("signature"):
+        registry.record(m["key"], any("roi" in d for d in dets))
+    try:
+        registry.observe_signature(img_size, [d["bbox"] for d in dets if "bbox" in d],
+                                   m["key"])
+    except OSError as e:
+        print(f"[Layout] Signature boxes not saved: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Bank layout template registry")
+    p.add_argument("--file", default=os.environ.get(TEMPLATES_ENV, DEFAULT_FILE))
+    p.add_argument("--reset", metavar="KEY", help="Forget one bank's template")
+    args = p.parse_args()
+
+    reg = TemplateRegistry(args.file)
+    if args.reset:
+        print(f"[Layout] {args.reset}: {'removed' if reg.reset(args.reset) else 'not found'}")
+    aliases = {}
+    for a, k in reg.data["aliases"].items():
+        aliases.setdefault(k, []).append(a)
+    for key, tpl in sorted(reg.data["templates"].items()):
+        print(f"{key:<10} {tpl['status']:<9} {len(tpl['observations'])} samples  "
+              f"hits {tpl['hits']}  misses {tpl['misses']}  "
+              f"{tpl.get('bank') or ''} {' '.join(aliases.get(key, []))}")
+        for name, box in tpl["rois"].items():
+            print(f"    {name:<15} {box}")
+        if tpl.get("signature"):
+            print(f"    {'signature':<15} {tpl['signature']}")
@@ -0,0 +1,407 @@
+"""
+MICR Decoder — E-13B code line, CPU only
+========================================
+Reads the magnetic-ink code line printed along the bottom of every CTS-2010
+cheque in the fixed E-13B font, without any model:
+
+  1. band     — bottom strip (MICR_BAND), Otsu-binarised
+  2. line     — glyph-sized components aligned on one baseline; the median
+                component height is the character height
+  3. cells    — components merged into character cells; a cell made of
+                several parts with small pieces is a delimiter symbol
+                (transit ⑆ / on-us ⑈ / amount ⑇ / dash ⑉), otherwise a digit
+  4. digits   — each digit cell resampled to TEMPLATE_W × TEMPLATE_H and
+                matched against E-13B templates (zero-mean correlation plus
+                width ratio); confidence is the margin over the runner-up
+  5. fields   — digit groups between symbols / wide gaps, assigned by length
+                to the Indian MICR layout:
+
+      ⑈ cheque number (6) ⑈  sort code (9: city 3 · bank 3 · branch 3) ⑆
+        short account number (6) ⑈  transaction code (2)
+
+The full account number is NOT on the code line (only the 6-digit short
+account number), so `account_number` still comes from the VLM.
+
+Templates: detection/micr_templates.json, learned from real cheques, replaces
+the built-in sketches of the E-13B digits (the sketches alone give no
+confident reads). Fields override the VLM (`trusted_fields`) only when the
+learned file records held-out accuracy: confident cheque-number reads must
+have been right at least MICR_LOCK_MIN_PRECISION of the time on cheque books
+left out of training, over at least MICR_LOCK_MIN_READS reads.
+
+    python -m detection.micr --learn Our_Dataset/cheque_images
+    # labels digit cells with the cheque number in each file name
+    # ("Cheque 083654.jpg"); leave-one-book-out accuracy (books = first three
+    # digits), then averages all cells per digit into the shipped file.
+    # Shipped file: 110 cheques in 4 books, held out 93/110 read correctly,
+    # 89 confident reads, all 89 correct
+
+    from detection.micr import decode_micr
+    res = decode_micr(img)   # {"cheque_number", "sort_code", ..., "confidence", "ms"}
+"""
+
+import json
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+MICR_BAND      = (0.82, 1.00)     # fractional rows searched for the code line
+TEMPLATE_W     = 8
+TEMPLATE_H     = 12
+MICR_MIN_CONF  = 0.25             # per-digit margin needed to trust a field
+MICR_LOCK_MIN_PRECISION = 0.99    # held-out accuracy of confident reads before locking
+MICR_LOCK_MIN_READS     = 50      # held-out confident reads behind that figure
+TEMPLATES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "micr_templates.json")
+
+# E-13B digit sketches ('#' = ink), used until learned templates exist
+_SKETCHES = {
+    "0": ["######", "#....#", "#....#", "#....#", "##...#", "##...#",
+          "##...#", "##...#", "##...#", "##...#", "##...#", "######"],
+    "1": ["###.", ".##.", ".##.", ".##.", ".##.", ".##.",
+          ".##.", "####", "####", "####", "####", "####"],
+    "2": ["######", ".....#", ".....#", ".....#", "######", "#.....",
+          "#.....", "####..", "#####.", "######", "######", "######"],
+    "3": ["#####.", "....#.", "....#.", "....#.", ".#####", "....##",
+          "....##", "....##", "....##", "....##", "....##", "######"],
+    "4": ["#.....", "#.....", "#.....", "#...#.", "#...#.", "#...#.",
+          "######", "######", "....##", "....##", "....##", "....##"],
+    "5": ["######", "#.....", "#.....", "#.....", "######", ".....#",
+          ".....#", "..####", "..####", "..####", "..####", "######"],
+    "6": ["#.....", "#.....", "#.....", "#.....", "######", "##...#",
+          "##...#", "##...#", "##...#", "##...#", "##...#", "######"],
+    "7": ["######", ".....#", ".....#", ".....#", "....#.", "....#.",
+          "...###", "...###", "...###", "...###", "...###", "...###"],
+    "8": [".####.", ".#..#.", ".#..#.", ".#..#.", "######", "##...#",
+          "##...#", "##...#", "##...#", "##...#", "##...#", "######"],
+    "9": ["######", "#....#", "#....#", "#....#", "######", ".....#",
+          "....##", "....##", "....##", "....##", "....##", "....##"],
+}
+_SKETCH_WIDTH_RATIO = 0.78        # E-13B digit width / character height
+_SKETCH_ONE_RATIO   = 0.55
+
+_templates = None
+_heldout = None
+
+
+def _book(label: str) -> str:
+    """Cheque book of a labelled cheque number (its first three digits)."""
+    return label[:3]
+
+
+# ── Templates ─────────────────────────────────────────────────────────────────
+
+def _normalise(cell: np.ndarray) -> np.ndarray:
+    """Binary cell → zero-mean, unit-norm TEMPLATE_W × TEMPLATE_H vector."""
+    v = cv2.resize(cell.astype(np.float32), (TEMPLATE_W, TEMPLATE_H),
+                   interpolation=cv2.INTER_AREA).ravel()
+    v = v - v.mean()
+    n = np.linalg.norm(v)
+    return v / n if n else v
+
+
+def _sketch_templates() -> dict:
+    out = {}
+    for d, rows in _SKETCHES.items():
+        a = np.array([[c == "#" for c in r] for r in rows], dtype=np.float32)
+        out[d] = {"vec": _normalise(a),
+                  "width": _SKETCH_ONE_RATIO if d == "1" else _SKETCH_WIDTH_RATIO}
+    return out
+
+
+def load_templates(path: str = None) -> dict:
+    """Learned templates when `path` (default TEMPLATES_FILE) exists, else the built-in sketches."""
+    global _templates, _heldout
+    if _templates is None:
+        path = path or TEMPLATES_FILE
+        _templates, _heldout = _sketch_templates(), None
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                learned = json.load(f)
+            for d, t in learned.get("digits", {}).items():
+                _templates[d] = {"vec": np.array(t["vec"], dtype=np.float32),
+                                 "width": t["width"]}
+            _heldout = learned.get("heldout")
+    return _templates
+
+
+def templates_validated() -> bool:
+    """True when the loaded templates' held-out accuracy allows locking fields."""
+    load_templates()
+    h = _heldout or {}
+    return h.get("confident", 0) >= MICR_LOCK_MIN_READS \
+        and h.get("confident_correct", 0) >= MICR_LOCK_MIN_PRECISION * h["confident"]
+
+
+# ── Segmentation ──────────────────────────────────────────────────────────────
+
+def _code_line(gray: np.ndarray):
+    """
+    Binarised code line of the bottom band.
+    Returns (ink, labels, components, char_h) or None; components are
+    [(x, y, w, h, label)] of the line's glyph parts, sorted by x.
+    """
+    h = gray.shape[0]
+    band = gray[int(h * MICR_BAND[0]): int(h * MICR_BAND[1])]
+    if band.size == 0:
+        return None
+    _, ink = cv2.threshold(band, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    bh = band.shape[0]
+    glyphs = [(x, y, w, hh, i) for i, (x, y, w, hh, area) in enumerate(stats) if i
+              and 0.15 * bh <= hh <= 0.8 * bh and w <= 1.5 * hh and area >= 6]
+    if len(glyphs) < 8:
+        return None
+    char_h = float(np.median([g[3] for g in glyphs]))
+    mid = float(np.median([g[1] + g[3] / 2 for g in glyphs]))
+    top, bottom = mid - 0.65 * char_h, mid + 0.65 * char_h
+    # Keep full glyphs and the small parts of symbols that sit on the line
+    parts = [(x, y, w, hh, i) for i, (x, y, w, hh, area) in enumerate(stats) if i
+             and y >= top and y + hh <= bottom and hh >= 0.15 * char_h and w <= 1.5 * char_h
+             and area >= 0.01 * char_h * char_h]
+    parts.sort()
+    return ink, labels, parts, char_h
+
+
+def _cells(parts: list, char_h: float) -> list:
+    """Merge parts into character cells; mark multi-part cells with small pieces as symbols."""
+    cells = []
+    for x, y, w, h, lab in parts:
+        if cells:
+            c = cells[-1]
+            union = max(c["x2"], x + w) - c["x1"]
+            if union <= 0.9 * char_h and x - c["x2"] < 0.3 * char_h:
+                c["x2"] = max(c["x2"], x + w)
+                c["parts"].append((x, y, w, h, lab))
+                continue
+        cells.append({"x1": x, "x2": x + w, "parts": [(x, y, w, h, lab)]})
+    for c in cells:
+        small = any(p[3] < 0.5 * char_h for p in c["parts"])
+        c["symbol"] = small and (len(c["parts"]) >= 2 or max(p[3] for p in c["parts"]) < 0.5 * char_h)
+    return cells
+
+
+def _cell_image(labels: np.ndarray, cell: dict) -> np.ndarray:
+    """Binary crop of exactly the cell's components, trimmed to their box."""
+    y1 = min(p[1] for p in cell["parts"])
+    y2 = max(p[1] + p[3] for p in cell["parts"])
+    crop = labels[y1:y2, cell["x1"]:cell["x2"]]
+    return np.isin(crop, [p[4] for p in cell["parts"]])
+
+
+def _classify(cell_img: np.ndarray, char_h: float, templates: dict):
+    """(digit, confidence margin) of one cell."""
+    vec = _normalise(cell_img)
+    width = cell_img.shape[1] / char_h
+    scores = sorted(((float(vec @ t["vec"]) - 0.5 * abs(width - t["width"]), d)
+                     for d, t in templates.items()), reverse=True)
+    (best, digit), (second, _) = scores[0], scores[1]
+    return digit, max(0.0, min(1.0, best - second))
+
+
+# ── Decoding ──────────────────────────────────────────────────────────────────
+
+def read_code_line(img: Image.Image, templates: dict = None) -> dict:
+    """
+    Segment and classify the code line.
+    Returns {"text": "⑈083654⑈ 400002003⑆ ...", "groups": [[(digit, conf), ...]],
+             "cells": [...] (for --learn), "line_box": fractional (x1, y1, x2, y2)}
+    — empty text when no line is found.
+    """
+    templates = templates or load_templates()
+    gray = np.asarray(img.convert("L"))
+    line = _code_line(gray)
+    if line is None:
+        return {"text": "", "groups": [], "cells": []}
+    ink, labels, parts, char_h = line
+    cells = _cells(parts, char_h)
+
+    text, groups, current, prev_x2 = "", [], [], None
+    for c in cells:
+        if prev_x2 is not None and c["x1"] - prev_x2 > 0.8 * char_h and current:
+            groups.append(current)
+            current = []
+            text += " "
+        prev_x2 = c["x2"]
+        if c["symbol"]:
+            if current:
+                groups.append(current)
+                current = []
+            text += "⑈"
+            continue
+        c["image"] = _cell_image(labels, c)
+        c["digit"], c["conf"] = _classify(c["image"], char_h, templates)
+        current.append((c["digit"], c["conf"]))
+        text += c["digit"]
+    if current:
+        groups.append(current)
+    # Where the line sits, as fractions of the cheque (layout templates learn it)
+    h, w = gray.shape
+    top = int(h * MICR_BAND[0])
+    line_box = [round(min(p[0] for p in parts) / w, 4),
+                round((top + min(p[1] for p in parts)) / h, 4),
+                round(max(p[0] + p[2] for p in parts) / w, 4),
+                round((top + max(p[1] + p[3] for p in parts)) / h, 4)]
+    return {"text": text, "groups": groups, "cells": cells, "char_h": char_h,
+            "line_box": line_box}
+
+
+def _field(group) -> tuple:
+    return "".join(d for d, _ in group), round(min(c for _, c in group), 3)
+
+
+def decode_micr(img: Image.Image) -> dict:
+    """
+    Decode the MICR code line of a cheque.
+    Returns {"cheque_number", "sort_code", "city_code", "bank_code",
+             "branch_code", "account", "transaction_code",
+             "confidence": {field: 0–1}, "text", "line_box", "ms"}; fields not found are None.
+    """
+    t = time.perf_counter()
+    line = read_code_line(img)
+    out = {"cheque_number": None, "sort_code": None, "city_code": None, "bank_code": None,
+           "branch_code": None, "account": None, "transaction_code": None,
+           "confidence": {}, "text": line["text"], "line_box": line.get("line_box")}
+
+    groups = line["groups"]
+    lens = [len(g) for g in groups]
+    sort_i = lens.index(9) if 9 in lens else None
+    if sort_i is not None:
+        out["sort_code"], out["confidence"]["sort_code"] = _field(groups[sort_i])
+        out["city_code"], out["bank_code"], out["branch_code"] = (
+            out["sort_code"][:3], out["sort_code"][3:6], out["sort_code"][6:])
+    before = range(sort_i) if sort_i is not None else range(len(groups))
+    cheque_i = next((i for i in before if lens[i] == 6), None)
+    if cheque_i is not None:
+        out["cheque_number"], out["confidence"]["cheque_number"] = _field(groups[cheque_i])
+    if sort_i is not None:
+        after = [i for i in range(sort_i + 1, len(groups))]
+        acct_i = next((i for i in after if lens[i] == 6), None)
+        if acct_i is not None:
+            out["account"], out["confidence"]["account"] = _field(groups[acct_i])
+        txn_i = next((i for i in after if lens[i] == 2), None)
+        if txn_i is not None:
+            out["transaction_code"], out["confidence"]["transaction_code"] = _field(groups[txn_i])
+    out["ms"] = round((time.perf_counter() - t) * 1000, 1)
+    return out
+
+
+def trusted_fields(res: dict, min_conf: float = MICR_MIN_CONF) -> dict:
+    """
+    The cheque fields (CHEQUE_FIELDS names) a decode is confident about;
+    none unless the templates passed held-out validation.
+    """
+    fields = {}
+    if not templates_validated():
+        return fields
+    if res.get("cheque_number") and res["confidence"].get("cheque_number", 0) >= min_conf:
+        fields["cheque_number"] = res["cheque_number"]
+    return fields
+
+
+# ── Template learning from labelled file names ────────────────────────────────
+
+def _cheque_cells(line: dict):
+    """Digit cells of the first 6-digit group (the cheque number), or None."""
+    first = next((g for g in line["groups"] if len(g) == 6), None)
+    if first is None:
+        return None
+    digits = [c for c in line["cells"] if not c["symbol"]]
+    offset = sum(len(g) for g in line["groups"][:line["groups"].index(first)])
+    return digits[offset:offset + 6]
+
+
+def _average(samples: list) -> dict:
+    """Templates averaged from [(digit, cell image, char_h)], over the sketches."""
+    sums, widths, counts = {}, {}, {}
+    for d, cell, char_h in samples:
+        sums[d] = sums.get(d, 0) + _normalise(cell)
+        widths[d] = widths.get(d, 0) + cell.shape[1] / char_h
+        counts[d] = counts.get(d, 0) + 1
+    out = _sketch_templates()
+    for d, n in counts.items():
+        v = sums[d] / n
+        v = v - v.mean()
+        out[d] = {"vec": v / (np.linalg.norm(v) or 1), "width": widths[d] / n, "samples": n}
+    return out
+
+
+def learn_templates(image_dir: str, out_path: str = None) -> dict:
+    """
+    Learn digit templates from the cheque-number group, labelled by the
+    6-digit number in each file name. Each cheque book (first three digits)
+    is decoded with templates learned from the other books only; the
+    held-out accuracy is stored with the templates averaged over all books.
+    """
+    global _templates
+    files = sorted(f for f in os.listdir(image_dir) if re.search(r"\d{6}", f)
+                   and f.lower().endswith((".jpg", ".jpeg", ".png", ".tif", ".tiff")))
+    reads = []
+    for name in files:
+        label = re.search(r"\d{6}", name).group(0)
+        line = read_code_line(Image.open(os.path.join(image_dir, name)))
+        reads.append((label, line["char_h"] if line["cells"] else None, _cheque_cells(line)))
+    samples = [(label, [(d, c["image"], char_h) for c, d in zip(cells, label)])
+               for label, char_h, cells in reads if cells]
+
+    heldout = {"cheques": len(files), "books": {}, "correct": 0, "confident": 0,
+               "confident_correct": 0}
+    for book in sorted({_book(label) for label, _, _ in reads}):
+        templates = _average([s for label, group in samples if _book(label) != book
+                              for s in group])
+        stats = {"cheques": 0, "correct": 0, "confident": 0, "confident_correct": 0}
+        for label, char_h, cells in reads:
+            if _book(label) != book:
+                continue
+            stats["cheques"] += 1
+            if not cells:
+                continue
+            digits = [_classify(c["image"], char_h, templates) for c in cells]
+            right = "".join(d for d, _ in digits) == label
+            confident = min(conf for _, conf in digits) >= MICR_MIN_CONF
+            stats["correct"] += right
+            stats["confident"] += confident
+            stats["confident_correct"] += confident and right
+        heldout["books"][book] = stats
+        for k in ("correct", "confident", "confident_correct"):
+            heldout[k] += stats[k]
+
+    final = _average([s for _, group in samples for s in group])
+    learned = {"digits": {d: {"vec": t["vec"].round(5).tolist(), "width": round(t["width"], 4),
+                              "samples": t["samples"]}
+                          for d, t in sorted(final.items()) if "samples" in t},
+               "images": len(samples), "heldout": heldout}
+    with open(out_path or TEMPLATES_FILE, "w", encoding="utf-8") as f:
+        json.dump(learned, f)
+    _templates = None
+
+    per_digit = ", ".join(f"{d}:{t['samples']}" for d, t in learned["digits"].items())
+    print(f"[MICR] learned {len(learned['digits'])} digits from {len(samples)}/{len(files)} "
+          f"cheques ({per_digit})")
+    for book, st in heldout["books"].items():
+        print(f"[MICR] held-out book {book}: {st['correct']}/{st['cheques']} correct, "
+              f"{st['confident_correct']}/{st['confident']} confident reads correct")
+    print(f"[MICR] held-out cheque_number accuracy: {heldout['correct']}/{len(files)}, "
+          f"confident {heldout['confident_correct']}/{heldout['confident']} — fields "
+          f"{'lock' if templates_validated() else 'do not lock'} against the VLM")
+    return learned
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Decode the E-13B MICR line of cheque images")
+    p.add_argument("images", nargs="*", help="Cheque images to decode")
+    p.add_argument("--learn", metavar="DIR", help="Learn digit templates from labelled file names")
+    args = p.parse_args()
+
+    if args.learn:
+        learn_templates(args.learn)
+    for path in args.images:
+        res = decode_micr(Image.open(path))
+        print(f"{os.path.basename(path)}: {res['text']!r}  cheque={res['cheque_number']} "
+              f"sort={res['sort_code']} account={res['account']} txn={res['transaction_code']} "
+              f"conf={res['confidence']} ({res['ms']} ms)")
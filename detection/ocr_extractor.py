@@ -10,41 +10,48 @@ Fields extracted (11):
     signature_present, ifsc_code, account_number
 """
 
+import os
 import re
 import json
 import time
-import tempfile
-import os
 
-from PIL import Image, ImageOps, ImageFilter
+from PIL import Image
 
-_qwen_model = None
-_qwen_processor = None
+_qwen_loaded = False
 QWEN_OCR_MODEL = "mlx-community/Qwen2-VL-2B-4bit"
+EXTRACT_MODE_ENV = "CHEQUE_EXTRACT_MODE"     # "full" | "single" | "roi" | "cascade"
+CACHE_SCHEMA = 4      # bump when regex / repair / normalisation changes cached results
 
 
-def _enhance_for_ocr(img: Image.Image) -> Image.Image:
-    """Create a high-contrast, upscaled copy for text-heavy cheque reading."""
-    enhanced = img.convert("RGB")
-    if enhanced.width < 1600:
-        scale = 1600 / max(1, enhanced.width)
-        enhanced = enhanced.resize(
-            (1600, int(enhanced.height * scale)),
-            Image.Resampling.LANCZOS,
-        )
-    enhanced = ImageOps.autocontrast(enhanced)
-    enhanced = enhanced.filter(ImageFilter.SHARPEN)
-    return enhanced
+def _prepare_for(img: Image.Image, model_id: str, policy: str = None):
+    """
+    Resize the original cheque once, straight to `model_id`'s input grid
+    (see vlm/resolution.py). Returns (image, info) with the image-token count.
+    """
+    _ensure_app_path()
+    from vlm.backends import get_backend
+    from vlm.resolution import prepare
+    return prepare(img, model_id, policy, backend=get_backend())
+
+
+def _ensure_app_path():
+    import sys
+    from pathlib import Path
+    _app_dir = str(Path(__file__).resolve().parent.parent)
+    if _app_dir not in sys.path:
+        sys.path.insert(0, _app_dir)
 
 
 def _load_qwen_vlm():
-    global _qwen_model, _qwen_processor
-    if _qwen_model is not None:
+    global _qwen_loaded
+    if _qwen_loaded:
         return True
     try:
-        from mlx_vlm import load
+        _ensure_app_path()
+        from vlm.backends import get_backend
         print(f"[VLM-OCR] Downloading Qwen2.5-VL model...")
-        _qwen_model, _qwen_processor = load(QWEN_OCR_MODEL)
+        get_backend().load_generator(QWEN_OCR_MODEL)   # loads once per process
+        _qwen_loaded = True
         print(f"[VLM-OCR] Qwen model loaded successfully")
         return True
     except Exception as e:
@@ -52,33 +59,28 @@ def _load_qwen_vlm():
         return False
 
 
+_OCR_PROMPT = (
+    "You are an OCR system. Extract ALL text from this cheque image. "
+    "Return ONLY the raw text found, one item per line. "
+    "Include dates, names, numbers, account details, amounts, and all printed text. "
+    "Do NOT add explanations. Return ONLY the extracted text."
+)
+
+
 def _run_qwen_vlm_ocr(img: Image.Image) -> str:
     if not _load_qwen_vlm():
         print("[VLM-OCR] Qwen model not loaded, skipping OCR hint")
         return ""
     try:
-        from mlx_vlm import generate
-        from mlx_vlm.prompt_utils import apply_chat_template
-        from mlx_vlm.utils import load_config
-        config = load_config(QWEN_OCR_MODEL)
-        
-        ocr_prompt = (
-            "You are an OCR system. Extract ALL text from this cheque image. "
-            "Return ONLY the raw text found, one item per line. "
-            "Include dates, names, numbers, account details, amounts, and all printed text. "
-            "Do NOT add explanations. Return ONLY the extracted text."
-        )
-        
-        tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-        img.save(tmp.name)
-        
+        from vlm.backends import get_backend
+        from vlm.stopping import text_criteria
+
         print("[VLM-OCR] Running Qwen2.5-VL for text extraction...")
-        fmt = apply_chat_template(_qwen_processor, config, ocr_prompt, num_images=1)
-        res = generate(_qwen_model, _qwen_processor, fmt, [tmp.name], verbose=False, max_tokens=1024, temperature=0.1)
-        
-        os.unlink(tmp.name)
-        result = res.text if hasattr(res, "text") else str(res)
-        print(f"[VLM-OCR] OCR text extracted, length: {len(result)}")
+        res = get_backend().complete(img, _OCR_PROMPT, max_tokens=1024,
+                                     model=QWEN_OCR_MODEL, criteria=text_criteria())
+        result = res["text"]
+        print(f"[VLM-OCR] OCR text extracted, length: {len(result)}, "
+              f"tokens: {res.get('generation_tokens')}, stop: {res.get('stop_reason')}")
         return result
     except Exception as e:
         print(f"[VLM-OCR] OCR pass failed: {e}")
@@ -102,6 +104,34 @@ CHEQUE_FIELDS = [
 
 # ── Prompt ────────────────────────────────────────────────────────────────────
 
+# Per-field reading rules, shared by the JSON prompt and the delta repair
+_FIELD_RULES = {
+    "account_holder": "account owner's printed name, usually top-left/top-center; "
+                      "do not confuse it with the payee.",
+    "bank_name": "full bank name or clearest visible bank name.",
+    "branch_name": "branch name/city/address near the bank name or branch label.",
+    "payee_name": "handwritten/typed name on the Pay line after Pay/Pay to.",
+    "amount_numeric": "the NUMBER written in the amount box (right side). "
+                      "Copy every digit exactly; remove commas/spaces; keep decimals if present. "
+                      "Examples: '1,50,000' -> '150000'; '25 000' -> '25000'.",
+    "amount_words": "the amount written in words on the line below 'Pay' "
+                    "including Rupees/Only when visible.",
+    "date": "the date as printed in DD/MM/YYYY or DD-MM-YYYY format. "
+            "Look for the date box at the top-right of the cheque.",
+    "cheque_number": "the 6-digit cheque number, often the first numeric block "
+                     "in the bottom MICR band or labelled Cheque No.",
+    "account_number": "the account number in the MICR band at the bottom "
+                      "(typically 9-18 digits).",
+    "ifsc_code": "11-character code starting with 4 letters then '0' then 6 alphanumeric.",
+    "signature_present": "'yes' if a handwritten signature/stamp-like signature "
+                         "is visible in the signature box, 'no' if the box is empty.",
+}
+
+
+def _field_rules(keys) -> str:
+    return "".join(f"- {k}: {_FIELD_RULES[k]}\n" for k in keys)
+
+
 _JSON_PROMPT = (
     "You are an expert Indian bank cheque OCR and verification assistant. "
     "Read the entire cheque carefully, including handwritten text, printed bank "
@@ -113,47 +143,73 @@ _JSON_PROMPT = (
     '"amount_numeric":null,"amount_words":null,'
     '"signature_present":null,"ifsc_code":null,"account_number":null}\n\n'
     "Field rules:\n"
-    "- account_holder: account owner's printed name, usually top-left/top-center; "
-    "do not confuse it with the payee.\n"
-    "- bank_name: full bank name or clearest visible bank name.\n"
-    "- branch_name: branch name/city/address near the bank name or branch label.\n"
-    "- payee_name: handwritten/typed name on the Pay line after Pay/Pay to.\n"
-    "- amount_numeric: the NUMBER written in the amount box (right side). "
-    "Copy every digit exactly; remove commas/spaces; keep decimals if present. "
-    "Examples: '1,50,000' -> '150000'; '25 000' -> '25000'.\n"
-    "- amount_words: the amount written in words on the line below 'Pay' "
-    "including Rupees/Only when visible.\n"
-    "- date: the date as printed in DD/MM/YYYY or DD-MM-YYYY format. "
-    "Look for the date box at the top-right of the cheque.\n"
-    "- cheque_number: the 6-digit cheque number, often the first numeric block "
-    "in the bottom MICR band or labelled Cheque No.\n"
-    "- account_number: the account number in the MICR band at the bottom "
-    "(typically 9-18 digits).\n"
-    "- ifsc_code: 11-character code starting with 4 letters then '0' then 6 alphanumeric.\n"
-    "- signature_present: 'yes' if a handwritten signature/stamp-like signature "
-    "is visible in the signature box, 'no' if the box is empty.\n"
-    "Never return markdown fences, comments, explanations, or extra keys."
+    + _field_rules(_FIELD_RULES)
+    + "Never return markdown fences, comments, explanations, or extra keys."
 )
 
+# _JSON_PROMPT and _REPAIR_PROMPT are sent as static prefixes: the backend
+# keeps their prefilled KV state, so per cheque only the image and the text
+# below (OCR hint / existing JSON) are prefilled.
+_OCR_HINT_PROMPT = (
+    "\n\nFor reference, here is the raw text extracted from the "
+    "cheque by an OCR engine — use it together with the image to "
+    "fill the JSON; trust the image when they disagree:\n\"\"\"\n"
+    "{ocr_text}"
+    "\n\"\"\""
+)
+
+# Single-model mode: the transcription is already in the conversation
+_SINGLE_HINT_PROMPT = (
+    "\n\nUse your transcription above together with the image to fill the "
+    "JSON; trust the image when they disagree."
+)
+
+_REPAIR_PROMPT = (
+    "You are repairing an Indian cheque OCR JSON result. "
+    "Look again at the image and the OCR text. Return ONLY valid JSON "
+    "with the same 11 keys. Keep existing correct values, and fill any "
+    "missing fields if visible. Existing JSON:\n"
+)
+
+# Delta repair: only the missing keys, their rules, and a per-field token cap.
+# The static part is a cached prefix; the schema below it varies per cheque.
+REPAIR_MODE_ENV = "CHEQUE_REPAIR_MODE"    # "delta" (default) | "roi" | "full"
+
+_DELTA_REPAIR_PROMPT = (
+    "You are re-reading an Indian bank cheque for fields an earlier pass could "
+    "not read. Look carefully at the image and return ONLY one valid JSON object "
+    "with exactly the keys below. Use null only when a field is genuinely not "
+    "visible. Never return markdown fences, comments, explanations, or extra keys.\n"
+)
+
+# Reply tokens per field: the quoted key plus the longest plausible value
+_DELTA_TOKENS = {
+    "account_holder": 24, "bank_name": 20, "branch_name": 24, "cheque_number": 12,
+    "date": 14, "payee_name": 24, "amount_numeric": 14, "amount_words": 40,
+    "signature_present": 8, "ifsc_code": 16, "account_number": 22,
+}
+
 # ── Lazy inference helpers ─────────────────────────────────────────────────────
 
 _load_gemma_fn = None
 _vlm_fn = None
+_stream_fn = None
+_batch_fn = None
+_conversation_fn = None
 
 
 def _ensure_gemma():
-    global _load_gemma_fn, _vlm_fn
+    global _load_gemma_fn, _vlm_fn, _stream_fn, _batch_fn, _conversation_fn
     if _load_gemma_fn is not None:
         return True
     try:
-        import sys
-        from pathlib import Path
-        _app_dir = str(Path(__file__).resolve().parent.parent)
-        if _app_dir not in sys.path:
-            sys.path.insert(0, _app_dir)
-        from agent_studio import _load_gemma, _vlm
+        _ensure_app_path()
+        from agent_studio import _load_gemma, _vlm, _vlm_batch, _vlm_conversation, _vlm_stream
         _load_gemma_fn = _load_gemma
         _vlm_fn = _vlm
+        _stream_fn = _vlm_stream
+        _batch_fn = _vlm_batch
+        _conversation_fn = _vlm_conversation
         print("[VLM-Extract] Gemma functions loaded from agent_studio")
         return True
     except Exception as e:
@@ -161,7 +217,7 @@ def _ensure_gemma():
         return False
 
 
-def _glm_infer(img: Image.Image, prompt: str) -> str:
+def _glm_infer(img: Image.Image, prompt: str, max_new_tokens: int = 512) -> str:
     """Direct inference wrapper for signature localization."""
     if not _ensure_gemma():
         return '{"error": "model not loaded"}'
@@ -169,7 +225,7 @@ def _glm_infer(img: Image.Image, prompt: str) -> str:
         _load_gemma_fn()
     except Exception as e:
         return f'{{"error": "failed to load: {e}"}}'
-    return _vlm_fn(img, prompt)
+    return _vlm_fn(img, prompt, max_tokens=max_new_tokens)
 
 
 # ── Main API ──────────────────────────────────────────────────────────────────
@@ -190,59 +246,190 @@ def is_gemma_loaded() -> bool:
     return _load_gemma_fn is not None and _vlm_fn is not None
 
 
-def extract_cheque_fields(img: Image.Image) -> dict:
+def extract_cheque_fields(img: Image.Image, mode: str = None, policy: str = None) -> dict:
     """
     Hybrid cheque field extraction:
 
       1. Qwen2.5-VL 2B pass     — lightweight VLM OCR on Apple Silicon.
       2. Gemma 4 (mlx_vlm) pass  — fed image + OCR text as a hint, returns JSON.
       3. Regex fallback          — fills any field still null using OCR text.
-    """
-    print("[VLM-Extract] Starting cheque field extraction...")
-    
-    if not _ensure_gemma():
-        return {
-            "error": (
-                "Gemma 4 E2B (mlx_vlm) could not be loaded. "
-                "Ensure mlx-vlm is installed and agent_studio.py is present."
-            )
-        }
 
-    try:
-        print("[VLM-Extract] Loading Gemma 4 model...")
-        _load_gemma_fn()
-        print("[VLM-Extract] Gemma model ready")
-    except Exception as e:
-        return {"error": f"Failed to load Gemma 4 E2B: {e}"}
+    Blocking wrapper around `extract_cheque_field_events`.
+    """
+    result = {}
+    for ev in extract_cheque_field_events(img, mode, policy):
+        if ev["type"] == "result":
+            result = ev["fields"]
+    return result
+
+
+def _shown_value(key: str, value):
+    """Value as it will appear in the final result (same normalisation)."""
+    return _normalise_fields({key: value})[key]
+
+
+def _full_passes(img: Image.Image, field_event, timings: dict, policy: str = None,
+                 cache_ctx: dict = None):
+    """Whole-cheque passes A–C2; yields field events, returns (merged, fields, ocr_text)."""
+    from agent_studio import GEMMA_ID
+    from detection.json_stream import JSONFieldStream
+    from detection.ocr_hint import prepare_hint
+    from vlm.stopping import json_criteria
+
+    def cached(stage):
+        hit = cache_ctx and cache_ctx["cache"].get(cache_ctx["ref"], stage,
+                                                   cache_ctx["versions"][stage])
+        if hit:
+            timings.setdefault("cache", {})[stage] = hit["match"]
+            return hit["value"]
+        return None
 
-    t0 = time.time()
-    ocr_img = _enhance_for_ocr(img)
+    def store(stage, value):
+        if cache_ctx:
+            cache_ctx["cache"].put(cache_ctx["ref"], stage, cache_ctx["versions"][stage], value)
 
     # ── Pass A: Qwen2.5-VL lightweight OCR ────────────────────────────
-    print("[VLM-Extract] Step 1: Running Qwen OCR...")
-    ocr_text = _run_qwen_vlm_ocr(ocr_img)
-
-    # ── Pass B: Gemma JSON (with OCR text as hint) ────────────────────────
-    fields: dict = {}
-    try:
-        print("[VLM-Extract] Step 2: Running Gemma for structured extraction...")
-        prompt = _JSON_PROMPT
+    json_img, json_info = _prepare_for(img, GEMMA_ID, policy)
+    timings["resolution"] = {"policy": json_info["policy"], "json": json_info}
+    t = time.time()
+    ocr_text = cached("ocr")
+    if ocr_text is None:
+        # Each model gets its own single resize of the original image; load Qwen
+        # first so the grid comes from its processor rather than the family default
+        _load_qwen_vlm()
+        ocr_img, ocr_info = _prepare_for(img, QWEN_OCR_MODEL, policy)
+        timings["resolution"]["ocr"] = ocr_info
+        print("[VLM-Extract] Step 1: Running Qwen OCR...")
+        ocr_text = _run_qwen_vlm_ocr(ocr_img)
         if ocr_text:
-            prompt = (
-                _JSON_PROMPT
-                + "\n\nFor reference, here is the raw text extracted from the "
-                "cheque by an OCR engine — use it together with the image to "
-                "fill the JSON; trust the image when they disagree:\n\"\"\"\n"
-                + ocr_text
-                + "\n\"\"\""
+            store("ocr", ocr_text)
+    timings["ocr_s"] = round(time.time() - t, 2)
+
+    # Prompts get the compacted OCR text; the regex passes keep the full text
+    hint_text, timings["hint"] = prepare_hint(ocr_text)
+
+    # ── Pass B: Gemma JSON (with OCR text as hint), streamed ──────────────
+    fields = cached("json")
+    if fields is not None:
+        for k in CHEQUE_FIELDS:
+            ev = field_event(k, fields.get(k), "cache")
+            if ev:
+                yield ev
+    else:
+        try:
+            print("[VLM-Extract] Step 2: Running Gemma for structured extraction...")
+            hint = _OCR_HINT_PROMPT.format(ocr_text=hint_text) if hint_text else ""
+            usage, parts, parser = {}, [], JSONFieldStream()
+            for delta in _stream_fn(json_img, hint, prefix=_JSON_PROMPT, usage=usage,
+                                    criteria=json_criteria()):
+                parts.append(delta)
+                for k, v in parser.feed(delta):
+                    ev = field_event(k, v, "gemma") if k in CHEQUE_FIELDS else None
+                    if ev:
+                        yield ev
+            timings["json"] = _call_timings(usage)
+            fields = _parse_json("".join(parts))
+            if _looks_valid(fields):
+                store("json", fields)
+        except Exception as e:
+            print(f"[VLM-Extract] Gemma JSON pass failed: {e}")
+            fields = {}
+
+    # ── Pass C: regex fallback fills any null/missing field ───────────────
+    merged = yield from _merge_regex(fields, ocr_text, field_event)
+
+    # ── Pass C1: amount figures ⇄ words, IFSC directory — no model ────────
+    yield from _cross_checks(merged, field_event, timings)
+
+    # ── Pass C2: targeted repair when important fields are still missing ───
+    missing, run_repair = _repair_targets(merged, timings)
+    repair_mode = _repair_mode()
+    if run_repair and repair_mode != "full":
+        try:
+            print(f"[VLM-Extract] Step 3: Delta repair ({repair_mode}): {', '.join(missing)}")
+            yield from _delta_repair(img, json_img, missing, merged, field_event, timings,
+                                     repair_mode)
+        except Exception as e:
+            print(f"[VLM-Extract] Missing-field repair failed: {e}")
+    elif run_repair:
+        try:
+            print(f"[VLM-Extract] Step 3: Filling missing fields: {', '.join(missing)}")
+            repair_prompt = (
+                json.dumps(merged, ensure_ascii=False)
+                + "\n\nOCR text:\n"
+                + hint_text
             )
-        raw = _vlm_fn(ocr_img, prompt)
-        fields = _parse_json(raw)
+            usage, parts, parser = {}, [], JSONFieldStream()
+            for delta in _stream_fn(json_img, repair_prompt, prefix=_REPAIR_PROMPT, usage=usage,
+                                    criteria=json_criteria()):
+                parts.append(delta)
+                for k, v in parser.feed(delta):
+                    if k in missing and v not in (None, "", "null"):
+                        merged[k] = v
+                        ev = field_event(k, v, "repair")
+                        if ev:
+                            yield ev
+            timings["repair"] = dict(_call_timings(usage), fields=missing)
+            repair = _parse_json("".join(parts))
+            if isinstance(repair, dict):
+                for k in missing:
+                    v = repair.get(k)
+                    if v not in (None, "", "null"):
+                        merged[k] = v
+                        ev = field_event(k, v, "repair")
+                        if ev:
+                            yield ev
+        except Exception as e:
+            print(f"[VLM-Extract] Missing-field repair failed: {e}")
+
+    # Qwen OCR and Gemma JSON (and repair) each run the vision encoder
+    timings["image_encodes"] = ("ocr" not in timings.get("cache", {})) \
+        + ("json" in timings) + ("repair" in timings) \
+        + len(timings.get("roi_repair", {}).get("rois", []))
+    return merged, fields, ocr_text
+
+
+def _cache_context(img: Image.Image, mode: str, policy: str = None) -> dict:
+    """
+    Cache handle, image keys and per-stage versions, or None when disabled.
+    A version covers everything that changes a stage's output: backend,
+    model ids, prompt texts, resolution policy, OCR hint compaction, and for
+    the final fields the mode, ROI prompts, ink-only crops and the
+    post-processing schema.
+    """
+    try:
+        from agent_studio import GEMMA_ID
+        from detection.cheque_layout import FIELD_ROIS
+        from detection.extraction_cache import get_cache, version_key
+        from detection.ink_isolation import crops_enabled
+        from detection.ocr_hint import hint_settings
+        from vlm.backends import get_backend
+        from vlm.resolution import DEFAULT_POLICY, POLICY_ENV
+
+        cache = get_cache()
+        if cache is None:
+            return None
+        policy = policy or os.environ.get(POLICY_ENV, DEFAULT_POLICY)
+        backend = get_backend().name
+        ocr = version_key(backend, QWEN_OCR_MODEL, _OCR_PROMPT, policy)
+        jsn = version_key(backend, GEMMA_ID, _JSON_PROMPT, _OCR_HINT_PROMPT, ocr,
+                          *hint_settings())
+        engine = None
+        if mode == "cascade":
+            from detection.classical_ocr import available_engine
+            engine = available_engine()
+        fields = version_key(CACHE_SCHEMA, mode, jsn, _REPAIR_PROMPT, _DELTA_REPAIR_PROMPT,
+                             _repair_mode(), _SINGLE_HINT_PROMPT,
+                             json.dumps(FIELD_ROIS, sort_keys=True), engine, crops_enabled())
+        return {"cache": cache, "ref": cache.ref(img),
+                "versions": {"ocr": ocr, "json": jsn, "fields": fields}}
     except Exception as e:
-        print(f"[VLM-Extract] Gemma JSON pass failed: {e}")
-        fields = {}
+        print(f"[VLM-Extract] Result cache unavailable: {e}")
+        return None
 
-    # ── Pass C: regex fallback fills any null/missing field ───────────────
+
+def _merge_regex(fields: dict, ocr_text: str, field_event):
+    """VLM JSON fields, with nulls filled from the regex parse of the OCR text."""
     regex_fields = _parse_raw_to_fields(ocr_text) if ocr_text else {}
     merged = {k: None for k in CHEQUE_FIELDS}
     if isinstance(fields, dict):
@@ -253,55 +440,634 @@ def extract_cheque_fields(img: Image.Image) -> dict:
     for k, v in regex_fields.items():
         if merged.get(k) in (None, "", "null") and v not in (None, "", "null"):
             merged[k] = v
+            ev = field_event(k, v, "regex")
+            if ev:
+                yield ev
+    return merged
 
-    # ── Pass C2: targeted repair when important fields are still missing ───
-    missing = [k for k in CHEQUE_FIELDS if merged.get(k) in (None, "", "null")]
-    key_missing = {"bank_name", "date", "payee_name", "amount_numeric", "amount_words"} & set(missing)
-    if key_missing and len(missing) >= 3:
+
+def _single_passes(img: Image.Image, field_event, timings: dict, policy: str = None):
+    """
+    Single-model mode: Gemma transcribes the cheque, then structures its own
+    transcription as JSON in a second turn of the same conversation, so the
+    image is encoded once and Qwen is never loaded. A third turn repairs
+    missing fields. Yields field events, returns (merged, fields, ocr_text).
+    """
+    from agent_studio import GEMMA_ID
+    from detection.json_stream import JSONFieldStream
+    from vlm.stopping import json_criteria, text_criteria
+
+    json_img, json_info = _prepare_for(img, GEMMA_ID, policy)
+    timings["resolution"] = {"policy": json_info["policy"], "json": json_info}
+    conv = _conversation_fn(json_img)
+
+    # ── Turn 1: transcription (replaces the Qwen OCR hint) ─────────────────
+    print("[VLM-Extract] Single model, turn 1: transcribing...")
+    usage = {}
+    try:
+        ocr_text = "".join(conv.stream(_OCR_PROMPT, max_tokens=1024, usage=usage,
+                                       criteria=text_criteria()))
+    except Exception as e:
+        print(f"[VLM-Extract] Transcription turn failed: {e}")
+        ocr_text = ""
+    timings["ocr"] = _call_timings(usage)
+    timings["ocr_s"] = round((usage.get("prefill_s") or 0) + (usage.get("decode_s") or 0), 2)
+
+    # ── Turn 2: JSON from the same encoded image + transcription ───────────
+    fields: dict = {}
+    try:
+        print("[VLM-Extract] Single model, turn 2: structuring as JSON...")
+        usage, parts, parser = {}, [], JSONFieldStream()
+        for delta in conv.stream(_JSON_PROMPT + _SINGLE_HINT_PROMPT, usage=usage,
+                                 criteria=json_criteria()):
+            parts.append(delta)
+            for k, v in parser.feed(delta):
+                ev = field_event(k, v, "gemma") if k in CHEQUE_FIELDS else None
+                if ev:
+                    yield ev
+        timings["json"] = _call_timings(usage)
+        timings["json"]["image_encodes"] = usage.get("image_encodes")
+        fields = _parse_json("".join(parts))
+    except Exception as e:
+        print(f"[VLM-Extract] Gemma JSON turn failed: {e}")
+
+    merged = yield from _merge_regex(fields, ocr_text, field_event)
+
+    yield from _cross_checks(merged, field_event, timings)
+
+    # ── Turn 3: repair, same conversation ──────────────────────────────────
+    missing, run_repair = _repair_targets(merged, timings)
+    if run_repair:
         try:
-            print(f"[VLM-Extract] Step 3: Filling missing fields: {', '.join(missing)}")
-            repair_prompt = (
-                "You are repairing an Indian cheque OCR JSON result. "
-                "Look again at the image and the OCR text. Return ONLY valid JSON "
-                "with the same 11 keys. Keep existing correct values, and fill any "
-                "missing fields if visible. Existing JSON:\n"
-                + json.dumps(merged, ensure_ascii=False)
-                + "\n\nOCR text:\n"
-                + (ocr_text or "")
-            )
-            repair = _parse_json(_vlm_fn(ocr_img, repair_prompt))
+            print(f"[VLM-Extract] Single model, turn 3: filling {', '.join(missing)}")
+            usage = {}
+            if _repair_mode() == "full":
+                prompt, cap = _REPAIR_PROMPT + json.dumps(merged, ensure_ascii=False), 512
+            else:
+                # The image is already in the conversation: no ROI crops here
+                prompt, cap = _delta_prompt(missing)
+                prompt = _DELTA_REPAIR_PROMPT + prompt
+            text = "".join(conv.stream(prompt, max_tokens=cap, usage=usage,
+                                       criteria=json_criteria()))
+            timings["repair"] = dict(_call_timings(usage), fields=missing, max_tokens=cap)
+            repair = _parse_json(text)
             if isinstance(repair, dict):
-                for k in CHEQUE_FIELDS:
+                for k in missing:
                     v = repair.get(k)
-                    if merged.get(k) in (None, "", "null") and v not in (None, "", "null"):
+                    if v not in (None, "", "null"):
                         merged[k] = v
+                        ev = field_event(k, v, "repair")
+                        if ev:
+                            yield ev
         except Exception as e:
-            print(f"[VLM-Extract] Missing-field repair failed: {e}")
+            print(f"[VLM-Extract] Repair turn failed: {e}")
+
+    timings["image_encodes"] = conv.image_encodes
+    return merged, fields, ocr_text
+
+
+def _roi_answer(crop: dict, text: str) -> dict:
+    """Parse one ROI reply into {field: value}."""
+    if crop["answer"] == "json":
+        parsed = _parse_json(text)
+        return {k: parsed.get(k) for k in crop["fields"]} if isinstance(parsed, dict) else {}
+    value = (text or "").strip().strip("`'\"").strip()
+    if value.lower() in ("", "null", "none", "n/a"):
+        value = None
+    return {crop["fields"][0]: value}
+
+
+def _run_roi_batch(crops: list, merged: dict, field_event, source: str,
+                   timings: dict, key: str):
+    """One batched generation over ROI crops; fills missing `merged` fields."""
+    from vlm.stopping import json_criteria, text_criteria
+
+    t = time.time()
+    results = _batch_fn([
+        {"image": c["image"], "prompt": c["prompt"], "max_tokens": c["max_tokens"],
+         "criteria": json_criteria() if c["answer"] == "json" else text_criteria()}
+        for c in crops
+    ])
+    timings[key] = {
+        "rois":              [c["name"] for c in crops],
+        "image_px":          sum(c["image"].width * c["image"].height for c in crops),
+        "prompt_tokens":     sum(r.get("prompt_tokens") or 0 for r in results),
+        "generation_tokens": sum(r.get("generation_tokens") or 0 for r in results),
+        "duration_s":        round(time.time() - t, 2),
+    }
+    for crop, res in zip(crops, results):
+        for k, v in _roi_answer(crop, res["text"]).items():
+            if merged.get(k) in (None, "", "null") and v not in (None, "", "null"):
+                merged[k] = v
+                ev = field_event(k, v, source)
+                if ev:
+                    yield ev
+
+
+def _signature_from_ink(img: Image.Image) -> str:
+    """signature_present from the quality gate's ink check, not from a VLM."""
+    from detection.quality_gate import INK_MIN_BLUE_PX, INK_MIN_VIOLET_PX, assess_cheque
+    scores = assess_cheque(img)["scores"]
+    signed = scores["blue_ink_px"] >= INK_MIN_BLUE_PX or scores["stroke_components"] > 0 \
+        or scores["violet_ink_px"] >= INK_MIN_VIOLET_PX
+    return "yes" if signed else "no"
+
+
+def _roi_passes(img: Image.Image, field_event, timings: dict, known: dict = None,
+                rois: dict = None):
+    """
+    ROI mode: small per-field crops with short prompts as one batched
+    generation; the repair pass re-asks only ROIs whose fields are missing.
+    ROIs whose fields are all in `known` (e.g. the MICR decode) are skipped;
+    `rois` replaces the layout priors (a learned bank template).
+    Yields field events, returns (merged, fields, ocr_text).
+    """
+    from detection import cheque_layout as layout
+
+    merged = {k: None for k in CHEQUE_FIELDS}
+    merged.update(known or {})
+
+    print("[VLM-Extract] ROI mode: batched field crops...")
+    names = layout.rois_for_fields([k for k in CHEQUE_FIELDS if merged.get(k) is None])
+    yield from _run_roi_batch(layout.crop_rois(img, names, rois=_field_rois(rois)), merged,
+                              field_event, "roi", timings, "roi")
+
+    merged["signature_present"] = _signature_from_ink(img)
+    ev = field_event("signature_present", merged["signature_present"], "roi")
+    if ev:
+        yield ev
+
+    yield from _cross_checks(merged, field_event, timings)
+    missing = [k for k in CHEQUE_FIELDS if merged.get(k) in (None, "", "null")]
+    if missing:
+        names = layout.rois_for_fields(missing)
+        print(f"[VLM-Extract] ROI repair: {', '.join(names)}")
+        crops = layout.crop_rois(img, names, pad=layout.REPAIR_ROI_PAD,
+                                 max_side=layout.REPAIR_ROI_MAX_SIDE, rois=rois)
+        yield from _run_roi_batch(crops, merged, field_event, "repair", timings, "roi_repair")
+
+    return merged, {}, ""
+
+
+def _cascade_passes(img: Image.Image, field_event, timings: dict, known: dict = None,
+                    rois: dict = None):
+    """
+    Cascade mode, cheapest stage first (`known` fields, e.g. the MICR
+    decode, are never re-read; `rois` replaces the layout priors):
+      1. classical OCR + regex grammar on the printed ROIs, with per-field
+         confidence (detection/classical_ocr.py)
+      2. ink check for signature_present
+      3. VLM ROI crops only for handwritten and low-confidence fields
+    Yields field events, returns (merged, fields, ocr_text).
+    """
+    from detection import cheque_layout as layout
+    from detection.classical_ocr import CASCADE_MIN_CONF, read_printed_fields
+
+    merged = {k: None for k in CHEQUE_FIELDS}
+    merged.update(known or {})
+
+    print("[VLM-Extract] Cascade: classical OCR on printed fields...")
+    ocr = read_printed_fields(img, rois)
+    accepted = [k for k, c in ocr["confidence"].items()
+                if c >= CASCADE_MIN_CONF and merged.get(k) is None]
+    for k in accepted:
+        merged[k] = ocr["fields"][k]
+        ev = field_event(k, merged[k], "ocr")
+        if ev:
+            yield ev
+
+    merged["signature_present"] = _signature_from_ink(img)
+    ev = field_event("signature_present", merged["signature_present"], "ink")
+    if ev:
+        yield ev
+
+    weak = [k for k in CHEQUE_FIELDS if merged.get(k) in (None, "", "null")]
+    names = layout.rois_for_fields(weak)
+    if names:
+        print(f"[VLM-Extract] Cascade: VLM for {', '.join(weak)}")
+        yield from _run_roi_batch(layout.crop_rois(img, names, rois=_field_rois(rois)), merged,
+                                  field_event, "roi", timings, "roi")
+
+    # Baseline is one VLM request per ROI (ROI mode) for the same cheque
+    timings["cascade"] = {
+        "engine":            ocr["engine"],
+        "ocr_s":             ocr["ocr_s"],
+        "confidence":        ocr["confidence"],
+        "accepted":          accepted,
+        "vlm_fields":        weak,
+        "vlm_calls":         len(names),
+        "vlm_calls_avoided": len(layout.FIELD_ROIS) - len(names),
+    }
+    print(f"[VLM-Extract] Cascade: {len(accepted)} fields from {ocr['engine'] or 'no OCR engine'}, "
+          f"{len(names)} VLM calls ({len(layout.FIELD_ROIS) - len(names)} avoided)")
+    return merged, {}, ocr["text"]
+
+
+def extract_cheque_field_events(img: Image.Image, mode: str = None, policy: str = None):
+    """
+    Same passes as `extract_cheque_fields`, as a stream of events:
+
+      {"type": "field", "key", "value", "source", "update": bool}
+          whenever a field's displayed value first appears or later changes.
+          The Gemma JSON pass is decoded token by token and parsed
+          incrementally, so fields arrive while the model is still writing.
+          source: "gemma" | "regex" | "repair" | "normalise" | "roi" | "ocr" | "ink"
+                  | "micr" | "amount_check" | "ifsc_index" | "cache"
+      {"type": "result", "fields": {...}}
+          final dict, identical to extract_cheque_fields(); `_timings`
+          includes time_to_first_field_s.
+
+    mode: "full" (default, whole cheque + Qwen OCR hint), "single" (Gemma
+    transcribes, then structures its transcription in the same conversation:
+    one model, one image encode), "roi" (field crops, see
+    detection/cheque_layout.py) or "cascade" (classical OCR first, VLM crops
+    only for handwritten / low-confidence fields); default from
+    CHEQUE_EXTRACT_MODE.
+    policy: image resolution policy for the full / single modes (vlm/resolution.py);
+    default from CHEQUE_RESOLUTION_POLICY.
+    """
+    mode = mode or os.environ.get(EXTRACT_MODE_ENV, "full")
+    print(f"[VLM-Extract] Starting cheque field extraction ({mode} mode)...")
+
+    if not _ensure_gemma():
+        yield {"type": "result", "fields": {
+            "error": (
+                "Gemma 4 E2B (mlx_vlm) could not be loaded. "
+                "Ensure mlx-vlm is installed and agent_studio.py is present."
+            )
+        }}
+        return
+
+    # ── Result cache: a resubmitted / rescanned cheque skips every pass ──
+    t0 = time.time()
+    cache_ctx = _cache_context(img, mode, policy)
+    hit = cache_ctx and cache_ctx["cache"].get(cache_ctx["ref"], "fields",
+                                               cache_ctx["versions"]["fields"])
+    if hit:
+        print(f"[VLM-Extract] Cache hit ({hit['match']}) — returning stored fields")
+        cached = dict(hit["value"])
+        for k in CHEQUE_FIELDS:
+            if cached.get(k) is not None:
+                yield {"type": "field", "key": k, "value": cached[k],
+                       "source": "cache", "update": False}
+        cached["_timings"] = {"cache": {"fields": hit["match"]},
+                              "time_to_first_field_s": round(time.time() - t0, 2)}
+        cached["_duration_s"] = round(time.time() - t0, 2)
+        yield {"type": "result", "fields": cached}
+        return
+
+    try:
+        print("[VLM-Extract] Loading Gemma 4 model...")
+        _load_gemma_fn()
+        print("[VLM-Extract] Gemma model ready")
+    except Exception as e:
+        yield {"type": "result", "fields": {"error": f"Failed to load Gemma 4 E2B: {e}"}}
+        return
+
+    t0 = time.time()
+    timings = {}
+    shown = {}
+    locked = set()      # MICR-decoded fields; later passes cannot overwrite them
+
+    def field_event(key, value, source):
+        if key in locked and source != "micr":
+            return None
+        value = _shown_value(key, value)
+        if value is None or shown.get(key) == value:
+            return None
+        update = key in shown
+        shown[key] = value
+        if "time_to_first_field_s" not in timings:
+            timings["time_to_first_field_s"] = round(time.time() - t0, 2)
+        return {"type": "field", "key": key, "value": value,
+                "source": source, "update": update}
+
+    # ── MICR code line: exact printed digits, no model ───────────────────
+    micr, known = _micr_fields(img, timings)
+    locked.update(known)
+    for k, v in known.items():
+        ev = field_event(k, v, "micr")
+        if ev:
+            yield ev
+
+    # ── Bank layout template: straight to the learned ROIs ────────────────
+    registry, template = _layout_template(img, micr, timings)
+    rois = registry.rois(template) if template else None
+    merged, fallback = None, None
+    if template and mode in ("full", "single"):
+        from detection.layout_templates import KEY_FIELDS
+        print(f"[VLM-Extract] Layout template {timings['template']['key']}: ROI passes")
+        merged, fields, ocr_text = yield from _roi_passes(img, field_event, timings, known, rois)
+        fit = all(merged.get(k) not in (None, "", "null") for k in KEY_FIELDS)
+        registry.record(timings["template"]["key"], fit)
+        if not fit:
+            print("[VLM-Extract] Template mismatch — falling back to the full pipeline")
+            timings["template"].update(status="mismatch",
+                                       reason="key fields missing after the ROI passes")
+            merged, fallback = None, merged
+
+    if merged is None:
+        if mode == "roi":
+            merged, fields, ocr_text = yield from _roi_passes(img, field_event, timings, known,
+                                                              rois)
+        elif mode == "single":
+            merged, fields, ocr_text = yield from _single_passes(img, field_event, timings,
+                                                                 policy)
+        elif mode == "cascade":
+            merged, fields, ocr_text = yield from _cascade_passes(img, field_event, timings,
+                                                                  known, rois)
+        else:
+            merged, fields, ocr_text = yield from _full_passes(img, field_event, timings,
+                                                               policy, cache_ctx)
+        for k, v in (fallback or {}).items():
+            if merged.get(k) in (None, "", "null") and v not in (None, "", "null"):
+                merged[k] = v
+    merged.update(known)
+    if "amounts" not in timings:
+        yield from _cross_checks(merged, field_event, timings)
 
     # ── Pass D: numeric repair — Gemma sometimes splits long digit runs ───
     merged = _repair_numerics(merged, ocr_text)
     merged = _normalise_fields(merged)
+    for k in CHEQUE_FIELDS:
+        ev = field_event(k, merged[k], "normalise")
+        if ev:
+            yield ev
 
     if isinstance(fields, dict) and "raw_response" in fields and not _looks_valid(fields):
         merged["raw_response"] = fields["raw_response"]
     if ocr_text:
         merged["_ocr_text"] = ocr_text
+    if micr:
+        merged["_micr"] = micr
+    if timings["amounts"]["status"] == "mismatch":
+        merged["_amount_check"] = {k: timings["amounts"][k]
+                                   for k in ("status", "numeric_value", "words_value")}
+    if registry and timings["template"]["status"] != "hit":
+        try:
+            registry.observe(img, merged, micr)
+        except OSError as e:
+            print(f"[VLM-Extract] Layout template not saved: {e}")
+    if cache_ctx and "raw_response" not in merged:
+        cache_ctx["cache"].put(cache_ctx["ref"], "fields", cache_ctx["versions"]["fields"], merged)
+    merged["_timings"] = timings
     merged["_duration_s"] = round(time.time() - t0, 2)
-    return merged
+    yield {"type": "result", "fields": merged}
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
+_REPAIR_KEY_FIELDS = {"bank_name", "date", "payee_name", "amount_numeric", "amount_words"}
+
+# Process-wide count of repair passes the amount cross-check made unnecessary
+AMOUNT_REPAIR_STATS = {"cheques": 0, "repairs_needed": 0, "repairs_avoided": 0}
+
+
+def _field_rois(rois: dict = None) -> dict:
+    """
+    Layout ROIs (`rois`: a bank template's, else the priors); the header asks
+    for the IFSC only when bank / branch come from the index.
+    """
+    from detection import cheque_layout as layout
+    from detection.ifsc_index import bank_from_ifsc
+    rois = rois or layout.FIELD_ROIS
+    if bank_from_ifsc():
+        return dict(rois, header=dict(layout.HEADER_IFSC_ONLY, box=rois["header"]["box"]))
+    return rois
+
+
+def _cross_checks(merged: dict, field_event, timings: dict):
+    """Model-free checks run before any repair pass."""
+    yield from _reconcile_amounts(merged, field_event, timings)
+    yield from _validate_ifsc(merged, field_event, timings)
+
+
+def _validate_ifsc(merged: dict, field_event, timings: dict):
+    """
+    Check ifsc_code against the offline directory (detection/ifsc_index.py),
+    correct OCR confusions to the single nearest valid code, and replace
+    bank_name / branch_name with the directory's canonical names. The VLM's
+    readings are kept in timings["ifsc"]["read"]. No-op without a built index.
+    """
+    from detection.ifsc_index import get_index
+
+    idx = get_index()
+    if idx is None or merged.get("ifsc_code") in (None, "", "null"):
+        return
+    t = time.perf_counter()
+    rec = idx.correct(merged["ifsc_code"])
+    timings["ifsc"] = {"match": rec["match"] if rec else "unknown",
+                       "input": merged["ifsc_code"],
+                       "lookup_us": round((time.perf_counter() - t) * 1e6, 1),
+                       "read": {k: merged.get(k) for k in ("bank_name", "branch_name")}}
+    if rec is None:
+        print(f"[VLM-Extract] IFSC {merged['ifsc_code']!r} not in directory")
+        return
+    if rec["match"] == "corrected":
+        print(f"[VLM-Extract] IFSC corrected: {rec['input']} → {rec['ifsc']}")
+    for k, v in (("ifsc_code", rec["ifsc"]), ("bank_name", rec["bank"]),
+                 ("branch_name", rec["branch"])):
+        if v and merged.get(k) != v:
+            merged[k] = v
+            ev = field_event(k, v, "ifsc_index")
+            if ev:
+                yield ev
+
+
+def _reconcile_amounts(merged: dict, field_event, timings: dict):
+    """
+    Cross-check amount_numeric against amount_words (detection/amount_words.py):
+    fill whichever is missing or unreadable from the other, flag mismatches.
+    Yields field events; records the outcome in timings["amounts"].
+    """
+    from detection.amount_words import cross_check
+
+    check = cross_check(merged.get("amount_numeric"), merged.get("amount_words"))
+    timings["amounts"] = {k: check[k] for k in ("status", "numeric_value", "words_value")}
+    if check["status"] == "mismatch":
+        print(f"[VLM-Extract] Amount mismatch: figures {check['numeric_value']} "
+              f"vs words {check['words_value']}")
+    for k in ("amount_numeric", "amount_words"):
+        if check[k] != merged.get(k):
+            merged[k] = check[k]
+            ev = field_event(k, check[k], "amount_check")
+            if ev:
+                yield ev
+
+
+def _repair_targets(merged: dict, timings: dict):
+    """
+    (missing fields, run repair?) for the Gemma repair pass. The amounts count
+    as missing only when the cross-check could read neither of them; the
+    repair the old rule (either amount empty) would have run is counted as
+    avoided in timings["amounts"] and AMOUNT_REPAIR_STATS.
+    """
+    missing = [k for k in CHEQUE_FIELDS if merged.get(k) in (None, "", "null")]
+    amounts = timings.get("amounts", {})
+    if amounts.get("status") == "unusable":
+        missing += [k for k in ("amount_numeric", "amount_words") if k not in missing]
+    run = bool(_REPAIR_KEY_FIELDS & set(missing)) and len(missing) >= 3
+
+    # The old trigger, before the cross-check filled or validated the amounts
+    filled = {"filled_numeric": "amount_numeric", "filled_words": "amount_words"}
+    before = missing + ([filled[amounts["status"]]] if amounts.get("status") in filled else [])
+    needed = bool(_REPAIR_KEY_FIELDS & set(before)) and len(before) >= 3
+    amounts["repair_avoided"] = needed and not run
+    AMOUNT_REPAIR_STATS["cheques"] += 1
+    AMOUNT_REPAIR_STATS["repairs_needed"] += needed
+    AMOUNT_REPAIR_STATS["repairs_avoided"] += amounts["repair_avoided"]
+    return missing, run
+
+
+def _repair_mode() -> str:
+    mode = os.environ.get(REPAIR_MODE_ENV, "delta").strip().lower()
+    return mode if mode in ("delta", "roi", "full") else "delta"
+
+
+def _delta_prompt(missing: list) -> tuple:
+    """(per-cheque prompt, max_tokens) asking for `missing` only."""
+    schema = "{" + ",".join(f'"{k}":null' for k in missing) + "}"
+    return (schema + "\n\nField rules:\n" + _field_rules(missing),
+            4 + sum(_DELTA_TOKENS[k] for k in missing))
+
+
+def _delta_crops(img: Image.Image, missing: list) -> tuple:
+    """
+    Repair-resolution ROI crops for the missing fields, each asking only for
+    its own missing keys. Returns (crops, fields no ROI covers).
+    """
+    from detection import cheque_layout as layout
+
+    rois = _field_rois()
+    names = [n for n in layout.rois_for_fields(missing) if n in rois]
+    crops = layout.crop_rois(img, names, pad=layout.REPAIR_ROI_PAD,
+                             max_side=layout.REPAIR_ROI_MAX_SIDE, rois=rois)
+    for crop in crops:
+        wanted = [k for k in crop["fields"] if k in missing]
+        if crop["answer"] == "json" and wanted != crop["fields"]:
+            prompt, cap = _delta_prompt(wanted)
+            crop.update(fields=wanted, max_tokens=cap,
+                        prompt="This is part of an Indian bank cheque. Return ONLY JSON "
+                               + prompt + "Use null when not visible.")
+    covered = {k for c in crops for k in c["fields"]}
+    return crops, [k for k in missing if k not in covered]
+
+
+def _delta_repair(img: Image.Image, json_img: Image.Image, missing: list, merged: dict,
+                  field_event, timings: dict, mode: str):
+    """
+    Ask again for the `missing` fields only: a minimal schema of those keys
+    with their rules and a reply capped per field, on the whole cheque
+    ("delta") or on their ROI crops first ("roi"), so the cost grows with the
+    number of missing fields. Yields field events.
+    """
+    from detection.json_stream import JSONFieldStream
+    from vlm.stopping import json_criteria
+
+    if mode == "roi":
+        crops, missing = _delta_crops(img, missing)
+        if crops:
+            yield from _run_roi_batch(crops, merged, field_event, "repair", timings, "roi_repair")
+        if not missing:
+            return
+    prompt, cap = _delta_prompt(missing)
+    usage, parts, parser = {}, [], JSONFieldStream()
+    for delta in _stream_fn(json_img, prompt, max_tokens=cap, prefix=_DELTA_REPAIR_PROMPT,
+                            usage=usage, criteria=json_criteria()):
+        parts.append(delta)
+        for k, v in parser.feed(delta):
+            if k in missing and v not in (None, "", "null"):
+                merged[k] = v
+                ev = field_event(k, v, "repair")
+                if ev:
+                    yield ev
+    timings["repair"] = dict(_call_timings(usage), fields=missing, max_tokens=cap)
+    repair = _parse_json("".join(parts))
+    if isinstance(repair, dict):
+        for k in missing:
+            v = repair.get(k)
+            if v not in (None, "", "null"):
+                merged[k] = v
+                ev = field_event(k, v, "repair")
+                if ev:
+                    yield ev
+
+
+def amount_repair_stats() -> dict:
+    """AMOUNT_REPAIR_STATS plus the avoided-repair rate (of repairs the old rule ran)."""
+    s = dict(AMOUNT_REPAIR_STATS)
+    s["avoided_rate"] = round(s["repairs_avoided"] / s["repairs_needed"], 3) \
+        if s["repairs_needed"] else 0.0
+    return s
+
+
+def _layout_template(img: Image.Image, micr: dict, timings: dict):
+    """
+    (registry, learned template or None) for this cheque's bank
+    (detection/layout_templates.py); the match is recorded in timings["template"].
+    """
+    try:
+        from detection.layout_templates import get_registry
+        registry = get_registry()
+    except Exception as e:
+        print(f"[VLM-Extract] Layout templates unavailable: {e}")
+        registry = None
+    if registry is None:
+        timings["template"] = {"key": None, "status": "disabled", "reason": "", "key_source": None}
+        return None, None
+    key, source = registry.key_before_extraction(img, micr)
+    res = registry.match(img.size, micr, key)
+    timings["template"] = dict({k: res[k] for k in ("key", "status", "reason")},
+                               key_source=source)
+    return registry, res["template"]
+
+
+def _micr_fields(img: Image.Image, timings: dict):
+    """
+    Decode the MICR code line (detection/micr.py). Returns (decode, trusted
+    fields); the trusted fields override whatever the VLM passes read.
+    The full account number is not on the code line, so it is not among them.
+    """
+    try:
+        from detection.micr import decode_micr, trusted_fields
+        res = decode_micr(img)
+    except Exception as e:
+        print(f"[VLM-Extract] MICR decode skipped: {e}")
+        return None, {}
+    timings["micr_ms"] = res["ms"]
+    known = trusted_fields(res)
+    print(f"[VLM-Extract] MICR: {res['text']!r} → {known or 'no confident fields'} "
+          f"({res['ms']} ms)")
+    decode = {k: res[k] for k in ("sort_code", "city_code", "bank_code", "branch_code",
+                                  "account", "transaction_code", "confidence", "line_box")}
+    return decode, known
+
+
+def _call_timings(res: dict) -> dict:
+    """Prefill / decode split, token usage and stop reason of one VLM call."""
+    return {k: res.get(k) for k in
+            ("prefill_s", "decode_s", "prompt_tokens", "cached_tokens",
+             "generation_tokens", "stop_reason")}
+
+
 def _looks_valid(d: dict) -> bool:
     if not isinstance(d, dict):
         return False
     return len(set(CHEQUE_FIELDS) & set(d.keys())) >= 4
 
 
+_FENCE_OPEN = re.compile(r"```(?:json)?", re.IGNORECASE)
+
+
 def _parse_json(text: str) -> dict:
     text = (text or "").strip()
-    text = re.sub(r"^```(?:json)?", "", text, flags=re.IGNORECASE).strip()
-    text = re.sub(r"```$", "", text).strip()
+    fence = _FENCE_OPEN.match(text)
+    if fence:
+        text = text[fence.end():]
+    text = text.strip()
+    if text.endswith("```"):
+        text = text[:-3]
+    text = text.strip()
     start = text.find("{")
     end = text.rfind("}")
     if start != -1 and end > start:
@@ -357,13 +1123,17 @@ def _repair_numerics(fields: dict, ocr_text: str) -> dict:
     - Strip internal whitespace/commas from amount_numeric (but keep the digits).
     - Only replace a field from OCR when the field is genuinely missing/empty —
       never replace a plausible VLM value with an OCR heuristic guess.
+
+    OCR lookups go through the precompiled rules of detection/field_grammar.py.
     """
+    from detection.field_grammar import repair_search, repair_six_digit_run, repair_source
 
     def strip_separators(val: str) -> str:
         """Remove spaces, commas, and other non-digit/non-letter chars from a numeric string."""
         return re.sub(r"[\s,_\-]", "", val)
 
     out = dict(fields)
+    src = repair_source(ocr_text)
 
     # amount_numeric: strip formatting separators; fallback to regex only if blank
     amt = out.get("amount_numeric")
@@ -372,31 +1142,29 @@ def _repair_numerics(fields: dict, ocr_text: str) -> dict:
         digits = re.sub(r"\D", "", out["amount_numeric"])
         if len(digits) < 2:
             # Clearly bad — try regex from OCR text
-            m = re.search(r'(?:₹|Rs\.?|INR)\s*([\d,]+(?:\.\d{1,2})?)', ocr_text or "", re.IGNORECASE)
-            if not m:
-                m = re.search(r'\b(\d{3,12}(?:\.\d{1,2})?)\b', ocr_text or "")
+            m = repair_search(src, "amount_currency") or repair_search(src, "amount_any")
             if m:
                 out["amount_numeric"] = strip_separators(m.group(1))
     elif not amt:
-        m = re.search(r'(?:₹|Rs\.?|INR)\s*([\d,]+(?:\.\d{1,2})?)', ocr_text or "", re.IGNORECASE)
+        m = repair_search(src, "amount_currency")
         if m:
             out["amount_numeric"] = strip_separators(m.group(1))
 
     # account_number: only fill if missing
     if not out.get("account_number") and ocr_text:
-        m = re.search(r'(?:A/?c|Account)\s*(?:No\.?|Number)\s*[:\-]?\s*(\d{9,18})', ocr_text, re.IGNORECASE)
+        m = repair_search(src, "account_label")
         if m:
             out["account_number"] = m.group(1)
 
     # cheque_number: only fill if missing
     if not out.get("cheque_number") and ocr_text:
-        m = re.search(r'(?:Cheque|Ch\.?)?\s*(?:No\.?|Number)\s*[:\-]?\s*(\d{6,10})\b', ocr_text, re.IGNORECASE)
+        m = repair_search(src, "cheque_label")
         if m:
             out["cheque_number"] = m.group(1)
         else:
-            runs = re.findall(r"\b\d{6}\b", ocr_text)
-            if runs:
-                out["cheque_number"] = runs[0]
+            run = repair_six_digit_run(src)
+            if run:
+                out["cheque_number"] = run
 
     # ifsc_code: strip internal spaces
     if isinstance(out.get("ifsc_code"), str):
@@ -406,95 +1174,6 @@ def _repair_numerics(fields: dict, ocr_text: str) -> dict:
 
 
 def _parse_raw_to_fields(text: str) -> dict:
-    """Regex fallback parser for Indian bank cheque layouts."""
-    t = re.sub(r"[ \t]+", " ", text.strip())
-    lines = [ln.strip(" :-|\t") for ln in t.splitlines() if ln.strip(" :-|\t")]
-
-    def find(pattern, flags=re.IGNORECASE):
-        m = re.search(pattern, t, flags)
-        return m.group(1).strip() if m else None
-
-    # Date — DD/MM/YYYY, DD-MM-YYYY, D/M/YY, or "15 Apr 2024"
-    date = (
-        find(r'\b(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})\b')
-        or find(r'\b(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\w*\s+\d{2,4})\b')
-    )
-
-    # Amount numeric — prefer currency-prefixed; strip commas afterwards
-    _amt_raw = (
-        find(r'(?:₹|Rs\.?|INR)\s*([\d,]+(?:\.\d{1,2})?)')
-        or find(r'(?:Amount|Amt)[\s:]*(?:₹|Rs\.?)?\s*([\d,]+(?:\.\d{1,2})?)')
-        or find(r'\b(?:Rupees?|Rs\.?)\s*(\d{2,12}(?:\.\d{1,2})?)\b')
-    )
-    amount_num = re.sub(r",", "", _amt_raw) if _amt_raw else None
-
-    # Amount in words — "Rupees ... Only" or "... Rupees Only"
-    amount_words = (
-        find(r'((?:Rupees?|Rs\.?)\s+[^\n\r]{2,120}?\s+[Oo]nly)')
-        or find(r'(?:in\s+words?|amount\s+in\s+words?)[\s:]+([^\n\r]{2,120}(?:[Oo]nly)?)')
-        or find(r'([A-Z][a-z]+(?:\s+[A-Za-z]+){1,10})\s+[Oo]nly')
-    )
-
-    # IFSC — 4 letters + 0 + 6 alphanumeric
-    ifsc = find(r'\b([A-Z]{4}0[A-Z0-9]{6})\b')
-
-    digit_runs = re.findall(r"\b\d{6,18}\b", t)
-
-    # Cheque number — 6-digit run labelled or at MICR start
-    cheque_no = (
-        find(r'(?:Cheque|Ch\.?)\s*(?:No\.?|Number)?\s*[:\-]?\s*(\d{6,10})\b')
-        or next((run for run in digit_runs if len(run) == 6), None)
-    )
-
-    # Account number — labelled or MICR middle segment
-    acct_no = (
-        find(r'(?:A/?c\.?|Account)\s*(?:No\.?|Number)?\s*[:\-]?\s*(\d{9,18})\b')
-        or next((run for run in digit_runs if 9 <= len(run) <= 18 and run != cheque_no), None)
-    )
-
-    # Payee — text after "Pay" up to end-of-line or "or bearer"
-    payee = find(
-        r'\bPay(?:\s+to)?(?:\s+the\s+order\s+of)?\s+([^\n\r]+?)(?:\s+or\s+bearer|\s+rupees?|\s*$)',
-        re.IGNORECASE | re.MULTILINE,
-    )
-    if payee:
-        payee = re.sub(r"\bA/c\s+Payee\b|\bAccount\s+Payee\b", "", payee, flags=re.IGNORECASE).strip(" -")
-
-    # Branch — line after "Branch:" label
-    branch = (
-        find(r'Branch\s*[:\-]\s*([^\n]+)')
-        or find(r'\b([A-Za-z ]+)\s+Branch\b')
-    )
-
-    # Account holder — labelled
-    account_holder = (
-        find(r'(?:A/?c\.?\s*(?:Holder|Name)|Account\s+Holder|Name)\s*[:\-]?\s*([^\n]+)')
-        or find(r'For\s+([A-Z][A-Za-z .&]{3,60})')
-    )
-
-    # Bank name — first clean line that contains "Bank" or common bank abbreviations
-    bank_name = None
-    bank_patterns = r'\b(bank|sbi|hdfc|icici|axis|kotak|canara|pnb|union bank|bank of baroda)\b'
-    for line in lines[:12]:
-        if re.search(bank_patterns, line, re.IGNORECASE) and len(line) > 3:
-            bank_name = line
-            break
-
-    # Signature present — label found in OCR
-    sig_present = None
-    if re.search(r'\b(signature|signatory|signed|please sign above)\b', t, re.IGNORECASE):
-        sig_present = "yes"
-
-    return {
-        "account_holder":    account_holder,
-        "bank_name":         bank_name,
-        "branch_name":       branch,
-        "cheque_number":     cheque_no,
-        "date":              date,
-        "payee_name":        payee,
-        "amount_numeric":    amount_num,
-        "amount_words":      amount_words,
-        "signature_present": sig_present,
-        "ifsc_code":         ifsc,
-        "account_number":    acct_no,
-    }
+    """Regex fallback parser for Indian bank cheque layouts (detection/field_grammar.py)."""
+    from detection.field_grammar import parse_fields
+    return parse_fields(text)
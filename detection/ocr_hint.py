@@ -0,0 +1,165 @@
+"""
+OCR Hint Compaction — shorter Qwen OCR text for the Gemma prompts
+=================================================================
+The Qwen OCR pass returns up to 1024 tokens, pasted into the Gemma JSON
+prompt (as the OCR hint) and again into the repair prompt. Much of it is
+printed cheque boilerplate ("Please sign above", "or Bearer", "Payable at
+par at all branches"), repeated lines and repetition loops, all prefilled
+for nothing.
+
+compact_hint(text) keeps what the fields can come from:
+
+  1. lines are whitespace-normalised, cut to MAX_LINE_CHARS and deduplicated
+     (case- and punctuation-insensitive)
+  2. known boilerplate phrases are removed; a line left with only labels
+     ("Pay", "Rupees", "Date") or punctuation is dropped
+  3. a line is kept only if it carries a signal — digits, an IFSC-like code,
+     currency, amount words, a month name (priority 2), or name-like tokens:
+     two Capitalised words, an ALL-CAPS word or a bank / branch / account
+     label (priority 1)
+  4. over the token budget, lower-priority lines go first; the kept lines
+     stay in their original order
+
+Tokens are estimated the way Gemma's tokenizer splits cheque text: one per
+digit, one per letter run, one per symbol.
+
+The regex fallback and numeric repair still read the full OCR text; only
+the text pasted into prompts is compacted. CHEQUE_OCR_HINT=full disables it,
+CHEQUE_OCR_HINT_TOKENS sets the budget.
+
+    python -m detection.ocr_hint ocr_output.txt     # compacted text + stats
+"""
+
+import os
+import re
+
+HINT_ENV        = "CHEQUE_OCR_HINT"          # "compact" (default) | "full"
+HINT_TOKENS_ENV = "CHEQUE_OCR_HINT_TOKENS"
+DEFAULT_TOKENS  = 256
+MAX_LINE_CHARS  = 160
+
+BOILERPLATE = [
+    r"please\s+sign\s+(?:above|here)",
+    r"authori[sz]ed\s+signator(?:y|ies)",
+    r"(?:or\s+)?bearer",
+    r"payable\s+at\s+par(?:\s+at\s+all\s+(?:our\s+)?branches(?:\s+of\s+[a-z ]+?bank)?)?",
+    r"valid\s+for\s+(?:3|three)\s+months(?:\s+only)?(?:\s+from\s+the\s+date\s+of\s+issue)?",
+    r"cts[\s\-]*2010",
+    r"multi[\s\-]*city(?:\s+cheque)?",
+    r"a/?c\.?\s+payee(?:\s+only)?",
+    r"(?:do\s+not\s+)?write\s+below\s+this\s+line",
+    r"not\s+negotiable",
+    r"d\s*d\s*m\s*m\s*y\s*y\s*y\s*y",
+]
+_BOILERPLATE = re.compile(r"\b(?:" + "|".join(BOILERPLATE) + r")\b", re.IGNORECASE)
+
+_LABELS = {"pay", "rupees", "rupee", "rs", "date", "for", "to", "the", "order", "of", "a",
+           "c", "ac", "no", "sign", "signature", "above", "only", "inr"}
+
+_IFSC     = re.compile(r"\b[A-Z]{4}[0O][A-Z0-9]{6}\b")
+_CURRENCY = re.compile(r"₹|\brs\b\.?|\binr\b|/-", re.IGNORECASE)
+_AMOUNT   = re.compile(r"\b(?:lakhs?|lacs?|crores?|thousand|hundred)\b", re.IGNORECASE)
+_MONTH    = re.compile(r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\b",
+                       re.IGNORECASE)
+_NAME     = re.compile(r"\b[A-Z][a-z]+\s+[A-Z][a-z]+\b|\b[A-Z]{3,}\b")
+_FIELD    = re.compile(r"\b(?:bank|branch|ifsc|a/?c|account)\b", re.IGNORECASE)
+_TOKENS   = re.compile(r"\d|[^\W\d_]+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate prompt tokens of `text` (digit / letter run / symbol)."""
+    return len(_TOKENS.findall(text or ""))
+
+
+def hint_settings() -> tuple:
+    """(mode, token budget) from the environment — part of the JSON cache version."""
+    mode = os.environ.get(HINT_ENV, "compact").strip().lower()
+    try:
+        budget = int(os.environ.get(HINT_TOKENS_ENV, DEFAULT_TOKENS))
+    except ValueError:
+        budget = DEFAULT_TOKENS
+    return ("full" if mode == "full" else "compact"), budget
+
+
+def _priority(line: str) -> int:
+    """2 for field-bearing signals, 1 for name-like tokens, 0 for none."""
+    if any(c.isdigit() for c in line) or _IFSC.search(line) or _CURRENCY.search(line) \
+            or _AMOUNT.search(line) or _MONTH.search(line):
+        return 2
+    return 1 if _NAME.search(line) or _FIELD.search(line) else 0
+
+
+def compact_hint(text: str, budget: int = DEFAULT_TOKENS) -> tuple:
+    """
+    Compact OCR text for a prompt. Returns (text, stats) with stats
+    {"lines_in", "lines_out", "tokens_in", "tokens_out", "dropped": {reason: n}}.
+    """
+    lines = (text or "").splitlines()
+    dropped = {"duplicate": 0, "boilerplate": 0, "no_signal": 0, "budget": 0}
+    seen, kept = set(), []
+    for raw in lines:
+        line = " ".join(raw.split())[:MAX_LINE_CHARS]
+        if not line:
+            continue
+        key = re.sub(r"[\W_]+", "", line.lower())
+        if key in seen:
+            dropped["duplicate"] += 1
+            continue
+        seen.add(key)
+        stripped = line
+        if _BOILERPLATE.search(line):
+            stripped = " ".join(_BOILERPLATE.sub(" ", line).split()).strip(" ,.:;-|")
+        words = re.findall(r"[a-z]+", stripped.lower())
+        if not stripped or (not any(c.isdigit() or c == "₹" for c in stripped)
+                            and all(w in _LABELS for w in words)):
+            dropped["boilerplate"] += 1
+            continue
+        priority = _priority(stripped)
+        if not priority:
+            dropped["no_signal"] += 1
+            continue
+        kept.append((priority, stripped))
+
+    order = sorted(range(len(kept)), key=lambda i: (-kept[i][0], i))
+    chosen, used = set(), 0
+    for i in order:
+        cost = estimate_tokens(kept[i][1]) + 1           # + newline
+        if used + cost > budget:
+            dropped["budget"] += 1
+            continue
+        chosen.add(i)
+        used += cost
+    out = "\n".join(line for i, (_, line) in enumerate(kept) if i in chosen)
+    return out, {"lines_in": sum(1 for l in lines if l.strip()), "lines_out": len(chosen),
+                 "tokens_in": estimate_tokens(text), "tokens_out": estimate_tokens(out),
+                 "dropped": dropped}
+
+
+def prepare_hint(text: str) -> tuple:
+    """OCR text as it goes into prompts under the current settings: (text, stats)."""
+    mode, budget = hint_settings()
+    if mode == "full" or not text:
+        n = estimate_tokens(text)
+        return text or "", {"mode": "full", "tokens_in": n, "tokens_out": n}
+    out, stats = compact_hint(text, budget)
+    stats.update(mode="compact", budget=budget)
+    return out, stats
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    sample = (
+        "STATE BANK OF INDIA\nSTATE BANK OF INDIA\nBranch: Koramangala, Bengaluru\n"
+        "IFSC: SBIN0001234\nPay Ravi Kumar Sharma or Bearer\n"
+        "Rupees Twelve Lakh Fifty Thousand Only\n₹ 12,50,000/-\n"
+        "Please sign above\nAuthorised Signatory\nPayable at par at all branches\n"
+        "Valid for 3 months from the date of issue\nCTS-2010\nA/c No. 30214567891\n"
+        "Date 1 5 0 3 2 0 2 4\nD D M M Y Y Y Y\nFor Sharma Traders\n"
+        "\"083654\" 560002015: 000123\" 29\n" + "Please sign above\n" * 20
+    )
+    text = open(sys.argv[1], encoding="utf-8").read() if len(sys.argv) > 1 else sample
+    out, stats = compact_hint(text, int(os.environ.get(HINT_TOKENS_ENV, DEFAULT_TOKENS)))
+    print(out)
+    print(json.dumps(stats, indent=1))
@@ -0,0 +1,528 @@
+"""
+Presentment Index — duplicate and altered-copy detection across cheques
+=======================================================================
+Persistent index of every processed cheque, so a cheque presented twice
+(physically re-presented, or the same scan resubmitted) or a digitally
+altered copy of an earlier one is flagged at ingest.
+
+Each presentment stores:
+  key       (account_number, cheque_number), hashed to 64 bits
+  sha       first 64 bits of the pixel sha256 (extraction_cache.content_key)
+  whole     64-bit dHash of the whole cheque (8 × 8)
+  band      64-bit dHash of the handwritten band (payee + amount lines, 16 × 4),
+            also stored as four 16-bit segments
+  regions   64-bit dHash (16 × 4) of each REGION_ROIS field area (date, payee,
+            amounts, signature area), packed into one blob
+  amount, date, first-seen time
+
+Lookups:
+  key       a Bloom filter in memory answers "never seen" in constant time
+            without touching disk; only possible hits go to the indexed key
+            column. It is built on the first key lookup, sized from the keyed
+            row count (BLOOM_BITS_PER_ENTRY bits per key, room for twice the
+            rows, at least BLOOM_MIN_CAPACITY keys) and rebuilt at double
+            size from the key column when the index outgrows it
+  image     exact sha, then near-duplicates: whole ≤ NEAR_WHOLE_MAX_BITS AND
+            band ≤ NEAR_BAND_MAX_BITS. Candidates are every cheque of the same
+            account (an altered copy keeps its printed account number) and,
+            across accounts, every row sharing one 16-bit band segment, in a
+            few indexed lookups at any index size (multi-index hashing). By
+            pigeonhole that only guarantees cross-account matches within 3
+            bits of band distance; a copy 4..NEAR_BAND_MAX_BITS (10) bits away
+            is found across accounts only if its changed bits happen to leave
+            one segment intact. Same-account candidates are compared up to
+            the full NEAR_BAND_MAX_BITS.
+            Whole and band alone cannot tell apart two cheques of one book
+            (same print, similar hand: 4 of the 5,995 distinct Our_Dataset
+            pairs are within both limits). A near match therefore also needs
+            at least REGION_MIN_MATCH field regions within REGION_MAX_BITS:
+            an edited copy keeps the fields that were not touched (≥ 4 of 5
+            within 4 bits after a payee / amount / date edit and a JPEG
+            re-encode), while distinct cheques share at most one (the
+            second-closest region of any distinct dataset pair is ≥ 9 bits).
+            Rows recorded before region hashes existed never near-match
+
+Classification ("kind"):
+  same_image    the identical image was processed before
+  represented   the (account, cheque number) was presented before
+  altered_copy  a near-identical image carries a different cheque number,
+                account or amount
+  near_image    a near-identical image (no fields to compare)
+
+Storage is one SQLite file (CHEQUE_PRESENTMENT_DB, default
+cache/presentments.sqlite3, "0" disables) with page cache bounded by
+CACHE_MB, so memory stays flat at tens of millions of rows; the Bloom
+filter is saved next to it.
+
+    from detection.presentment_index import get_index
+    idx = get_index()
+    flag = idx.check(img, fields, record=True)   # {"duplicate", "kind", "matches", ...}
+
+    python -m detection.presentment_index --stats
+    python -m detection.presentment_index --bench 1000000   # synthetic, µs per lookup
+"""
+
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+DB_ENV       = "CHEQUE_PRESENTMENT_DB"
+CAPACITY_ENV = "CHEQUE_PRESENTMENT_CAPACITY"
+DEFAULT_DB   = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "cache", "presentments.sqlite3")
+
+BLOOM_MIN_CAPACITY   = 100_000      # keys; the filter grows with the index
+BLOOM_BITS_PER_ENTRY = 10           # ~1 % false positives with 7 hashes
+BLOOM_HASHES         = 7
+BLOOM_SAVE_EVERY     = 1000         # inserts between Bloom filter writes
+CACHE_MB             = 16           # SQLite page cache
+NEAR_WHOLE_MAX_BITS  = 10           # of 64
+NEAR_BAND_MAX_BITS   = 10           # of 64
+BAND_BOX             = (0.03, 0.17, 0.98, 0.47)   # payee + amount lines (cheque_layout ROIs)
+REGION_ROIS          = ("date", "payee", "amount_words", "amount_numeric", "holder")
+REGION_MAX_BITS      = 6            # of 64, one field region
+REGION_MIN_MATCH     = 2            # field regions that must agree for a near match
+ACCOUNT_SCAN_MAX     = 5000         # newest rows of one account compared
+SEGMENT_SCAN_MAX     = 2000         # newest rows per band segment compared
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS presentments (
+    id        INTEGER PRIMARY KEY,
+    key_hash  INTEGER,
+    acct_hash INTEGER,
+    account   TEXT,
+    cheque    TEXT,
+    amount    TEXT,
+    date      TEXT,
+    sha       INTEGER NOT NULL,
+    whole     INTEGER NOT NULL,
+    band      INTEGER NOT NULL,
+    seg0 INTEGER, seg1 INTEGER, seg2 INTEGER, seg3 INTEGER,
+    seen      REAL NOT NULL,
+    regions   BLOB
+);
+CREATE INDEX IF NOT EXISTS ix_key  ON presentments(key_hash);
+CREATE INDEX IF NOT EXISTS ix_acct ON presentments(acct_hash);
+CREATE INDEX IF NOT EXISTS ix_sha  ON presentments(sha);
+CREATE INDEX IF NOT EXISTS ix_seg0 ON presentments(seg0);
+CREATE INDEX IF NOT EXISTS ix_seg1 ON presentments(seg1);
+CREATE INDEX IF NOT EXISTS ix_seg2 ON presentments(seg2);
+CREATE INDEX IF NOT EXISTS ix_seg3 ON presentments(seg3);
+"""
+_COLUMNS = "id, account, cheque, amount, date, sha, whole, band, seen, regions"
+
+_BLOOM_MAGIC = b"PRBLOOM1"
+_BLOOM_HEAD  = struct.Struct("<8sQIq")     # magic, bits, hashes, last row id
+
+_index = None
+_index_lock = threading.Lock()
+
+
+# ── Fingerprints ──────────────────────────────────────────────────────────────
+
+def _signed(u: int) -> int:
+    """Unsigned 64-bit → SQLite INTEGER."""
+    return u - (1 << 64) if u >= 1 << 63 else u
+
+
+def _unsigned(s: int) -> int:
+    return s + (1 << 64) if s < 0 else s
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _digits(v) -> str:
+    return "".join(c for c in str(v or "") if c.isdigit())
+
+
+def presentment_key(fields: dict):
+    """(account digits, cheque digits) or None when either is missing."""
+    account, cheque = _digits((fields or {}).get("account_number")), \
+        _digits((fields or {}).get("cheque_number"))
+    return (account, cheque) if account and cheque else None
+
+
+def fingerprint(img) -> dict:
+    """{"sha", "whole", "band"} as unsigned 64-bit integers, plus "regions" (one per REGION_ROIS)."""
+    from detection.cheque_layout import FIELD_ROIS
+    from detection.extraction_cache import content_key, dhash
+
+    w, h = img.size
+
+    def crop(box):
+        x1, y1, x2, y2 = box
+        return img.crop((int(w * x1), int(h * y1), int(w * x2), int(h * y2)))
+
+    return {"sha": int(content_key(img)[:16], 16), "whole": dhash(img, 8, 8),
+            "band": dhash(crop(BAND_BOX), 16, 4),
+            "regions": [dhash(crop(FIELD_ROIS[r]["box"]), 16, 4) for r in REGION_ROIS]}
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _pack_regions(regions: list) -> bytes:
+    return struct.pack(f"<{len(regions)}Q", *regions)
+
+
+def _region_matches(stored, regions: list) -> int:
+    """Field regions of a stored row within REGION_MAX_BITS of `regions` (0 for old rows)."""
+    if not stored or len(stored) != 8 * len(regions):
+        return 0
+    return sum(_hamming(a, b) <= REGION_MAX_BITS
+               for a, b in zip(struct.unpack(f"<{len(regions)}Q", stored), regions))
+
+
+def _segments(band: int) -> list:
+    return [(band >> (16 * i)) & 0xFFFF for i in range(4)]
+
+
+# ── Bloom filter ──────────────────────────────────────────────────────────────
+
+class _Bloom:
+    """Fixed-size Bloom filter over 64-bit key hashes (double hashing)."""
+
+    def __init__(self, bits: int, hashes: int = BLOOM_HASHES):
+        self.bits, self.hashes = bits, hashes
+        self.array = bytearray((bits + 7) // 8)
+
+    def _positions(self, h: int):
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, h: int):
+        for p in self._positions(h):
+            self.array[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, h: int) -> bool:
+        return all(self.array[p >> 3] & (1 << (p & 7)) for p in self._positions(h))
+
+
+# ── Index ─────────────────────────────────────────────────────────────────────
+
+class PresentmentIndex:
+    """SQLite-backed presentment index with an in-memory Bloom filter on the key."""
+
+    def __init__(self, path: str = DEFAULT_DB, capacity: int = BLOOM_MIN_CAPACITY):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA cache_size=-{CACHE_MB * 1024}")
+        self._db.executescript(_SCHEMA)
+        if "regions" not in {r[1] for r in self._db.execute("PRAGMA table_info(presentments)")}:
+            self._db.execute("ALTER TABLE presentments ADD COLUMN regions BLOB")
+        self._min_capacity = max(1024, capacity)
+        self._bloom = None          # built on the first key lookup
+        self._bloom_path = path + ".bloom"
+        self._bloom_id = 0
+        self._keys = 0              # keyed rows in the filter
+        self._unsaved = 0
+
+    # ── Bloom filter sizing and persistence ───────────────────────────────────
+
+    def _capacity_for(self, keys: int) -> int:
+        """Power-of-two key capacity with room for twice `keys`."""
+        capacity = self._min_capacity
+        while capacity < 2 * keys:
+            capacity *= 2
+        return capacity
+
+    def _key_bloom(self) -> _Bloom:
+        """The key filter, loaded or built on first use and grown when full."""
+        if self._bloom is None:
+            self._load_bloom()
+        elif self._keys > self._bloom.bits // BLOOM_BITS_PER_ENTRY:
+            t = time.time()
+            self._load_bloom(rebuild=True)
+            print(f"[Presentment] Bloom filter grown to {self._bloom.bits // BLOOM_BITS_PER_ENTRY} "
+                  f"keys in {time.time() - t:.1f}s")
+        return self._bloom
+
+    def _load_bloom(self, rebuild: bool = False):
+        """
+        Load the saved filter if it still has room for the keyed rows (else
+        size a new one from the row count), then add the rows inserted after
+        it was written.
+        """
+        self._keys = self._db.execute("SELECT COUNT(key_hash) FROM presentments").fetchone()[0]
+        self._bloom, last = None, 0
+        try:
+            with open(self._bloom_path, "rb") as f:
+                magic, bits, hashes, last = _BLOOM_HEAD.unpack(f.read(_BLOOM_HEAD.size))
+                if not rebuild and (magic, hashes) == (_BLOOM_MAGIC, BLOOM_HASHES) \
+                        and bits >= self._keys * BLOOM_BITS_PER_ENTRY:
+                    self._bloom = _Bloom(bits)
+                    if f.readinto(self._bloom.array) != len(self._bloom.array):
+                        self._bloom = None
+        except (OSError, struct.error):
+            pass
+        if self._bloom is None:
+            self._bloom, last = _Bloom(self._capacity_for(self._keys) * BLOOM_BITS_PER_ENTRY), 0
+        for (h,) in self._db.execute("SELECT key_hash FROM presentments "
+                                     "WHERE id > ? AND key_hash IS NOT NULL", (last,)):
+            self._bloom.add(_unsigned(h))
+        row = self._db.execute("SELECT MAX(id) FROM presentments").fetchone()
+        self._bloom_id = row[0] or 0
+        if last != self._bloom_id:
+            self._save_bloom()
+
+    def save(self):
+        """Write the Bloom filter (also done every BLOOM_SAVE_EVERY inserts)."""
+        with self._lock:
+            if self._bloom is not None:
+                self._save_bloom()
+
+    def _save_bloom(self):
+        tmp = self._bloom_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_BLOOM_HEAD.pack(_BLOOM_MAGIC, self._bloom.bits, self._bloom.hashes,
+                                     self._bloom_id))
+            f.write(self._bloom.array)
+        os.replace(tmp, self._bloom_path)
+        self._unsaved = 0
+
+    # ── Lookup ────────────────────────────────────────────────────────────────
+
+    def _rows(self, sql: str, args) -> list:
+        return [dict(zip(("id", "account", "cheque", "amount", "date", "sha", "whole",
+                          "band", "seen", "regions"), r))
+                for r in self._db.execute(f"SELECT {_COLUMNS} FROM presentments " + sql, args)]
+
+    def _near(self, fp: dict, acct_hash) -> list:
+        seen, out = set(), []
+        queries = [(f"WHERE seg{i} = ? ORDER BY id DESC LIMIT {SEGMENT_SCAN_MAX}", (s,))
+                   for i, s in enumerate(_segments(fp["band"]))]
+        if acct_hash is not None:
+            queries.insert(0, (f"WHERE acct_hash = ? ORDER BY id DESC LIMIT {ACCOUNT_SCAN_MAX}",
+                               (acct_hash,)))
+        for sql, args in queries:
+            for r in self._rows(sql, args):
+                if r["id"] in seen:
+                    continue
+                seen.add(r["id"])
+                whole = _hamming(_unsigned(r["whole"]), fp["whole"])
+                band = _hamming(_unsigned(r["band"]), fp["band"])
+                if whole > NEAR_WHOLE_MAX_BITS or band > NEAR_BAND_MAX_BITS:
+                    continue
+                regions = _region_matches(r["regions"], fp["regions"])
+                if regions >= REGION_MIN_MATCH:
+                    r["distance"] = {"whole": whole, "band": band, "regions": regions}
+                    out.append(r)
+        return out
+
+    def check(self, img, fields: dict = None, record: bool = False) -> dict:
+        """
+        Duplicate flag for one cheque; with `record`, also add it to the index
+        (an identical image with the same key is stored once).
+
+        Returns {"duplicate", "kind", "matches": [{"id", "account_number",
+        "cheque_number", "amount", "first_seen", "match", "distance"}],
+        "key_checked", "bloom", "lookup_ms"}.
+        """
+        t = time.perf_counter()
+        fp = fingerprint(img)
+        key = presentment_key(fields)
+        key_hash = _hash64("|".join(key)) if key else None
+        acct_hash = _signed(_hash64(key[0])) if key else None
+
+        with self._lock:
+            by_key, bloom = [], None
+            if key_hash is not None:
+                bloom = "hit" if key_hash in self._key_bloom() else "negative"
+                if bloom == "hit":
+                    by_key = [r for r in self._rows("WHERE key_hash = ?", (_signed(key_hash),))
+                              if (r["account"], r["cheque"]) == key]
+            by_sha = self._rows("WHERE sha = ?", (_signed(fp["sha"]),))
+            near = self._near(fp, acct_hash)
+
+            kind, matches = None, {}
+            amount = _digits((fields or {}).get("amount_numeric"))
+            for r in near:
+                altered = key is not None and r["account"] is not None and (
+                    (r["account"], r["cheque"]) != key
+                    or bool(amount and r["amount"] and r["amount"] != amount))
+                matches[r["id"]] = dict(r, match="altered" if altered else "near")
+            for r in by_sha:
+                matches[r["id"]] = dict(r, match="image",
+                                        distance={"whole": 0, "band": 0,
+                                                  "regions": len(REGION_ROIS)})
+            for r in by_key:
+                if matches.get(r["id"], {}).get("match") != "altered":
+                    matches[r["id"]] = dict(matches.get(r["id"], r), match="key")
+            same_image = bool(by_sha)
+            if any(m["match"] == "altered" for m in matches.values()):
+                kind = "altered_copy"
+            elif by_key:
+                kind = "same_image" if all(_unsigned(r["sha"]) == fp["sha"]
+                                           for r in by_key) else "represented"
+            elif by_sha:
+                kind = "same_image"
+            elif near:
+                kind = "near_image"
+
+            if record and not (same_image and (by_key or key is None)):
+                self._insert(key, key_hash, acct_hash, fields or {}, fp)
+
+        return {
+            "duplicate":   kind is not None,
+            "kind":        kind,
+            "matches":     [{"id": m["id"], "account_number": m["account"],
+                             "cheque_number": m["cheque"], "amount": m["amount"],
+                             "first_seen": time.strftime("%Y-%m-%dT%H:%M:%S",
+                                                         time.localtime(m["seen"])),
+                             "match": m["match"], "distance": m.get("distance")}
+                            for m in sorted(matches.values(), key=lambda m: m["id"])[:10]],
+            "key_checked": key is not None,
+            "bloom":       bloom,
+            "lookup_ms":   round((time.perf_counter() - t) * 1000, 2),
+        }
+
+    def _insert(self, key, key_hash, acct_hash, fields: dict, fp: dict):
+        bloom = self._key_bloom() if key_hash is not None else self._bloom
+        seg = _segments(fp["band"])
+        cur = self._db.execute(
+            "INSERT INTO presentments (key_hash, acct_hash, account, cheque, amount, date, "
+            "sha, whole, band, seg0, seg1, seg2, seg3, seen, regions) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (_signed(key_hash) if key_hash is not None else None, acct_hash,
+             key[0] if key else None, key[1] if key else None,
+             _digits(fields.get("amount_numeric")) or None, fields.get("date"),
+             _signed(fp["sha"]), _signed(fp["whole"]), _signed(fp["band"]),
+             *seg, time.time(), _pack_regions(fp["regions"])))
+        self._db.commit()
+        if bloom is None:
+            return                  # no filter to keep current until the first key
+        if key_hash is not None:
+            bloom.add(key_hash)
+            self._keys += 1
+        self._bloom_id = cur.lastrowid
+        self._unsaved += 1
+        if self._unsaved >= BLOOM_SAVE_EVERY:
+            self._save_bloom()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self._db.execute("SELECT COUNT(*) FROM presentments").fetchone()[0]
+            bloom = self._key_bloom()
+        size = sum(os.path.getsize(p) for p in (self.path, self.path + "-wal", self._bloom_path)
+                   if os.path.exists(p))
+        fill = sum(bin(b).count("1") for b in bloom.array[:1 << 16]) \
+            / (8 * min(len(bloom.array), 1 << 16))
+        return {"rows": n, "disk_mb": round(size / 2 ** 20, 1),
+                "bloom_keys": bloom.bits // BLOOM_BITS_PER_ENTRY,
+                "bloom_mb": round(len(bloom.array) / 2 ** 20, 2),
+                "bloom_fp_rate": round(fill ** bloom.hashes, 5)}
+
+
+def get_index():
+    """The process-wide index, or None when CHEQUE_PRESENTMENT_DB=0."""
+    global _index
+    path = os.environ.get(DB_ENV, DEFAULT_DB)
+    if path == "0":
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = PresentmentIndex(
+                        path, int(os.environ.get(CAPACITY_ENV, BLOOM_MIN_CAPACITY)))
+                    import atexit
+                    atexit.register(_index.save)
+                except (OSError, sqlite3.Error, ValueError) as e:
+                    print(f"[Presentment] Index unavailable: {e}")
+                    return None
+    return _index
+
+
+def duplicate_flag(img, fields: dict = None, record: bool = False) -> dict:
+    """`check` on the process-wide index; {"duplicate": None, ...} when unavailable."""
+    idx = get_index()
+    if idx is None:
+        return {"duplicate": None, "kind": None, "matches": [], "error": "index disabled"}
+    try:
+        return idx.check(img, fields, record)
+    except Exception as e:
+        print(f"[Presentment] Check failed: {e}")
+        return {"duplicate": None, "kind": None, "matches": [], "error": str(e)}
+
+
+def _bench(n: int, path: str):
+    """Synthetic index of `n` rows; µs per key / image lookup and resident memory."""
+    import random
+    import resource
+    import sys
+
+    rnd = random.Random(7)
+    if os.path.exists(path):
+        os.remove(path)
+    idx = PresentmentIndex(path)
+    t = time.time()
+    batch = []
+    for i in range(n):
+        key = (str(10 ** 11 + i), f"{i % 10 ** 6:06d}")
+        kh, band = _hash64("|".join(key)), rnd.getrandbits(64)
+        batch.append((_signed(kh), _signed(_hash64(key[0])), key[0], key[1], "1000", None,
+                      _signed(rnd.getrandbits(64)), _signed(rnd.getrandbits(64)),
+                      _signed(band), *_segments(band), time.time()))
+        if len(batch) == 50000 or i == n - 1:
+            idx._db.executemany("INSERT INTO presentments (key_hash, acct_hash, account, "
+                                "cheque, amount, date, sha, whole, band, seg0, seg1, seg2, "
+                                "seg3, seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                batch)
+            idx._db.commit()
+            batch = []
+    print(f"[Presentment] {n} rows in {time.time() - t:.1f}s")
+    t = time.time()
+    bloom = idx._key_bloom()
+    print(f"[Presentment] Bloom filter built in {time.time() - t:.1f}s, {idx.stats()}")
+
+    probes = 2000
+    for name, keys in (("key (new)", [(str(9 * 10 ** 11 + i), "000001") for i in range(probes)]),
+                       ("key (seen)", [(str(10 ** 11 + rnd.randrange(n)), None)
+                                       for _ in range(probes)])):
+        t = time.perf_counter()
+        for account, cheque in keys:
+            cheque = cheque or f"{(int(account) - 10 ** 11) % 10 ** 6:06d}"
+            kh = _hash64(f"{account}|{cheque}")
+            if kh in bloom:
+                idx._rows("WHERE key_hash = ?", (_signed(kh),))
+        print(f"[Presentment] {name:<12} {(time.perf_counter() - t) / probes * 1e6:8.1f} µs")
+    t = time.perf_counter()
+    for _ in range(probes):
+        idx._near({"whole": rnd.getrandbits(64), "band": rnd.getrandbits(64),
+                   "regions": [rnd.getrandbits(64) for _ in REGION_ROIS]}, None)
+    print(f"[Presentment] {'near image':<12} {(time.perf_counter() - t) / probes * 1e6:8.1f} µs")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss     # bytes on macOS, KiB on Linux
+    print(f"[Presentment] max RSS {rss / (2 ** 20 if sys.platform == 'darwin' else 1024):.0f} MB")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    p = argparse.ArgumentParser(description="Duplicate-presentment index")
+    p.add_argument("images", nargs="*", help="Cheque images to check (not recorded)")
+    p.add_argument("--db", default=os.environ.get(DB_ENV, DEFAULT_DB))
+    p.add_argument("--stats", action="store_true")
+    p.add_argument("--bench", type=int, metavar="N", help="Synthetic index of N rows")
+    args = p.parse_args()
+
+    if args.bench:
+        _bench(args.bench, args.db + ".bench")
+    else:
+        idx = PresentmentIndex(args.db)
+        if args.stats:
+            print(json.dumps(idx.stats(), indent=1))
+        if args.images:
+            from PIL import Image
+            for path in args.images:
+                print(path, json.dumps(idx.check(Image.open(path).convert("RGB")), indent=1))
@@ -0,0 +1,179 @@
+"""
+Cheque Quality Gate — millisecond pre-check before the model stages
+===================================================================
+Runs on a small grayscale copy of the upload and rejects items that the
+expensive stages (Falcon, Line Sweep, SVM, Qwen OCR, Gemma) cannot help with:
+
+  NOT_A_CHEQUE  — aspect ratio far from a CTS cheque AND no MICR glyph row
+  UNREADABLE    — too blurred (variance of Laplacian) or too flat (contrast)
+  UNSIGNED      — no pen ink in the signature area; blocks signature
+                  verification only, field extraction still runs
+                  (blocks_extraction)
+
+Checks, all on a WORK_WIDTH-wide copy except the violet-ink count:
+  1. aspect ratio vs. CTS-2010 (202 × 92 mm ≈ 2.2)
+  2. MICR band: glyph-sized dark components in the bottom strip
+  3. blur: variance of the Laplacian; contrast: grayscale standard deviation
+  4. signature area: blue-ink pixels (same HSV range as OCR_Algorithm), or
+     stroke-sized dark components after ruled lines are removed, or
+     violet-ink pixels on the area cropped from the upload at
+     SIGNATURE_WORK_WIDTH — thin violet ballpoint is outside the blue range
+     and fades above INK_DARK_LEVEL at WORK_WIDTH (Cheque 309160: 304 px;
+     print-only signature areas of the dataset ≤ 44 px)
+
+Usage:
+    from detection.quality_gate import assess_cheque
+    gate = assess_cheque(pil_img)
+    if gate["verdict"]:      # "UNSIGNED" | "UNREADABLE" | "NOT_A_CHEQUE"
+        ...                  # short-circuit, skip signature stages
+    if blocks_extraction(gate):
+        ...                  # skip field extraction too
+"""
+
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from detection.OCR.OCR_Algorithm import _LOWER_HSV, _UPPER_HSV
+
+# ── Thresholds ────────────────────────────────────────────────────────────────
+
+WORK_WIDTH = 800
+
+ASPECT_RANGE   = (1.8, 2.9)     # CTS-2010 cheque is ~2.2; scans add margins
+MICR_BAND      = (0.84, 0.99)   # fractional rows of the MICR strip
+MICR_MIN_GLYPHS = 10
+
+BLUR_MIN     = 40.0             # variance of Laplacian at WORK_WIDTH
+CONTRAST_MIN = 20.0             # grayscale std-dev
+
+SIGNATURE_AREA       = (0.55, 0.50, 1.0, 0.86)   # above the MICR strip
+SIGNATURE_WORK_WIDTH = 1600     # cheque width the violet-ink count runs at
+INK_DARK_LEVEL       = 120
+INK_MIN_STROKE_H     = 0.035    # stroke component height / cheque height
+INK_MIN_BLUE_PX      = 150
+INK_MIN_VIOLET_PX    = 150      # at SIGNATURE_WORK_WIDTH
+
+# Violet / purple ballpoint, next to the blue range
+_LOWER_VIOLET_HSV = np.array([130, 60, 0])
+_UPPER_VIOLET_HSV = np.array([165, 255, 190])
+
+VERDICTS = ("NOT_A_CHEQUE", "UNREADABLE", "UNSIGNED")
+EXTRACTION_VERDICTS = ("NOT_A_CHEQUE", "UNREADABLE")   # also skip field extraction
+
+
+# ── Individual checks ─────────────────────────────────────────────────────────
+
+def _micr_glyphs(gray: np.ndarray) -> int:
+    """Count E-13B-sized dark components in the bottom MICR strip."""
+    h = gray.shape[0]
+    band = gray[int(h * MICR_BAND[0]): int(h * MICR_BAND[1])]
+    if band.size == 0:
+        return 0
+    _, ink = cv2.threshold(band, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    bh = band.shape[0]
+    glyphs = 0
+    for x, y, w, hh, area in stats[1:]:
+        if 0.15 * bh <= hh <= 0.8 * bh and w <= 1.5 * hh and area >= 6:
+            glyphs += 1
+    return glyphs
+
+
+def _signature_ink(img: Image.Image, rgb: np.ndarray, gray: np.ndarray) -> dict:
+    """
+    Blue-ink pixels and stroke-sized dark components in the signature area of
+    the WORK_WIDTH copy; violet-ink pixels in the same area cropped from the
+    upload `img` at SIGNATURE_WORK_WIDTH (never upscaled).
+    """
+    h, w = gray.shape
+    x1, y1, x2, y2 = SIGNATURE_AREA
+    sl = (slice(int(h * y1), int(h * y2)), slice(int(w * x1), int(w * x2)))
+
+    hsv  = cv2.cvtColor(rgb[sl], cv2.COLOR_RGB2HSV)
+    blue = int(np.count_nonzero(cv2.inRange(hsv, _LOWER_HSV, _UPPER_HSV)))
+
+    scale = min(1.0, SIGNATURE_WORK_WIDTH / img.width)
+    area = img.crop((int(img.width * x1), int(img.height * y1),
+                     int(img.width * x2), int(img.height * y2)))
+    if scale < 1.0:
+        area = area.resize((max(1, round(area.width * scale)),
+                            max(1, round(area.height * scale))), Image.BOX)
+    violet = int(np.count_nonzero(cv2.inRange(cv2.cvtColor(np.asarray(area), cv2.COLOR_RGB2HSV),
+                                              _LOWER_VIOLET_HSV, _UPPER_VIOLET_HSV)))
+
+    dark = (gray[sl] < INK_DARK_LEVEL).astype(np.uint8) * 255
+    # remove ruled lines / box edges before looking for strokes
+    rw = max(15, dark.shape[1] // 6)
+    rh = max(15, dark.shape[0] // 3)
+    lines = cv2.morphologyEx(dark, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (rw, 1)))
+    lines |= cv2.morphologyEx(dark, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, rh)))
+    strokes = cv2.subtract(dark, lines)
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(strokes, connectivity=8)
+    min_h = INK_MIN_STROKE_H * h
+    tall = int(sum(1 for _, _, _, ch, area in stats[1:] if ch >= min_h and area >= 12))
+    return {"blue_ink_px": blue, "violet_ink_px": violet, "stroke_components": tall}
+
+
+def blocks_extraction(gate: dict) -> bool:
+    """True when field extraction should be skipped too (UNSIGNED does not)."""
+    return gate["verdict"] in EXTRACTION_VERDICTS
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+
+def assess_cheque(img: Image.Image) -> dict:
+    """
+    Score an upload and decide whether it is worth running the model stages.
+
+    Returns:
+        {
+            "verdict":     None | "NOT_A_CHEQUE" | "UNREADABLE" | "UNSIGNED",
+            "reason":      str,
+            "scores":      {aspect, micr_glyphs, blur, contrast,
+                            blue_ink_px, violet_ink_px, stroke_components},
+            "duration_ms": float,
+        }
+    """
+    t0 = time.perf_counter()
+    full = rgb_img = img.convert("RGB")
+    aspect = rgb_img.width / max(1, rgb_img.height)
+    if rgb_img.width != WORK_WIDTH:
+        rgb_img = rgb_img.resize(
+            (WORK_WIDTH, max(1, round(WORK_WIDTH / aspect))), Image.BILINEAR)
+    rgb  = np.asarray(rgb_img)
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+
+    scores = {
+        "aspect":      round(aspect, 3),
+        "micr_glyphs": _micr_glyphs(gray),
+        "blur":        round(float(cv2.Laplacian(gray, cv2.CV_64F).var()), 1),
+        "contrast":    round(float(gray.std()), 1),
+    }
+    scores.update(_signature_ink(full, rgb, gray))
+
+    verdict, reason = None, "ok"
+    aspect_ok = ASPECT_RANGE[0] <= aspect <= ASPECT_RANGE[1]
+    micr_ok   = scores["micr_glyphs"] >= MICR_MIN_GLYPHS
+    if not aspect_ok and not micr_ok:
+        verdict = "NOT_A_CHEQUE"
+        reason  = (f"Aspect ratio {aspect:.2f} is outside {ASPECT_RANGE} and no MICR "
+                   f"band was found ({scores['micr_glyphs']} glyphs).")
+    elif scores["blur"] < BLUR_MIN or scores["contrast"] < CONTRAST_MIN:
+        verdict = "UNREADABLE"
+        reason  = (f"Image too blurred or flat (sharpness {scores['blur']} < {BLUR_MIN} "
+                   f"or contrast {scores['contrast']} < {CONTRAST_MIN}).")
+    elif scores["blue_ink_px"] < INK_MIN_BLUE_PX and scores["violet_ink_px"] < INK_MIN_VIOLET_PX \
+            and scores["stroke_components"] == 0:
+        verdict = "UNSIGNED"
+        reason  = "No pen ink found in the signature area."
+
+    return {
+        "verdict":     verdict,
+        "reason":      reason,
+        "scores":      scores,
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
@@ -79,8 +79,27 @@ def _preprocess_path(path: Path) -> np.ndarray:
     return preproc.preproc(str(path), display=False)
 
 
-def _preprocess_pil(img: Image.Image) -> np.ndarray:
-    """Preprocess an uploaded PIL crop using the same binary-crop idea."""
+def _ink_binary(img: Image.Image) -> np.ndarray | None:
+    """Isolated pen-ink plane of a crop (detection/ink_isolation.py), or None."""
+    try:
+        from detection.ink_isolation import signature_binary, signature_enabled
+    except ImportError:                 # run as a script outside the repo root
+        return None
+    return signature_binary(img) if signature_enabled() else None
+
+
+def _preprocess_pil(img: Image.Image, isolate: bool = True) -> np.ndarray:
+    """Preprocess an uploaded PIL crop using the same binary-crop idea.
+
+    With CHEQUE_INK_SIGNATURE=1 cheque crops first go through ink isolation,
+    so the printed caption and box rules do not add SIFT keypoints. By default
+    (model.pkl is trained on Otsu binaries), with too little isolated ink, or
+    with `isolate` off the grey crop is Otsu-thresholded as before.
+    """
+    if isolate:
+        binary = _ink_binary(img)
+        if binary is not None:
+            return binary
     arr = np.asarray(img.convert("RGB"), dtype=np.float32)
     grey = np.mean(arr, axis=2)
     bin_img = preproc.greybin(grey)
@@ -227,6 +246,40 @@ def _model() -> dict:
     return _MODEL_CACHE
 
 
+def _confidence(margin: float) -> float:
+    if not math.isfinite(margin):
+        confidence = 0.5
+    else:
+        confidence = 1.0 / (1.0 + math.exp(-min(abs(margin), 50.0)))
+    return max(0.50, min(0.99, confidence))
+
+
+def _classify_binaries(binaries: list[np.ndarray]) -> list[tuple[str, float]]:
+    """Classify preprocessed binary crops with one scaler/SVM call for all rows."""
+    model = _model()
+    results: list[tuple[str, float] | None] = [None] * len(binaries)
+    rows, row_idx = [], []
+    for i, binary in enumerate(binaries):
+        des = _sift_descriptors(binary)
+        if des is None or len(des) == 0:
+            results[i] = ("UNKNOWN", 0.50)
+            continue
+        geom = _geometric_features(binary)
+        bow = _histogram_from_descriptors(des, model["vocabulary"], VOCAB_SIZE)
+        rows.append(np.concatenate([bow, geom]).astype("float32"))
+        row_idx.append(i)
+
+    if rows:
+        x = model["scaler"].transform(np.vstack(rows))
+        preds = model["classifier"].predict(x)
+        margins = model["classifier"].decision_function(x)
+        for i, pred, margin in zip(row_idx, preds, np.atleast_1d(margins)):
+            label = "REAL" if int(pred) == 1 else "FORGED"
+            confidence = _confidence(float(margin))
+            results[i] = ("UNKNOWN", confidence) if confidence < MIN_CONFIDENCE else (label, confidence)
+    return results
+
+
 def verify(pil_img: Image.Image) -> tuple[str, float]:
     """Verify a cropped signature image locally.
 
@@ -234,29 +287,25 @@ def verify(pil_img: Image.Image) -> tuple[str, float]:
         ("REAL", confidence), ("FORGED", confidence), or
         ("UNKNOWN", confidence) when the SVM margin is too weak.
     """
-    model = _model()
-    binary = _preprocess_pil(pil_img)
-    des = _sift_descriptors(binary)
-    if des is None or len(des) == 0:
-        return "UNKNOWN", 0.50
+    _model()
+    return _classify_binaries([_preprocess_pil(pil_img)])[0]
 
-    geom = _geometric_features(binary)
-    bow = _histogram_from_descriptors(des, model["vocabulary"], VOCAB_SIZE)
-    x = np.concatenate([bow, geom]).astype("float32").reshape(1, -1)
-    x = model["scaler"].transform(x)
 
-    pred = int(model["classifier"].predict(x)[0])
-    label = "REAL" if pred == 1 else "FORGED"
+def verify_batch(pil_imgs: list[Image.Image]) -> list[tuple[str, float]]:
+    """Verify several signature crops (e.g. joint-account signatories) at once.
 
-    margin = float(model["classifier"].decision_function(x)[0])
-    if not math.isfinite(margin):
-        confidence = 0.5
-    else:
-        confidence = 1.0 / (1.0 + math.exp(-min(abs(margin), 50.0)))
-    confidence = max(0.50, min(0.99, confidence))
-    if confidence < MIN_CONFIDENCE:
-        return "UNKNOWN", confidence
-    return label, confidence
+    SIFT runs per crop, but scaling and the SVM decision run once over the
+    stacked feature matrix. A crop without ink yields ("UNKNOWN", 0.50)
+    instead of raising, so one blank band does not sink the others.
+    """
+    _model()
+    binaries = []
+    for img in pil_imgs:
+        try:
+            binaries.append(_preprocess_pil(img))
+        except ValueError:
+            binaries.append(np.zeros((1, 1), dtype="uint8"))
+    return _classify_binaries(binaries)
 
 
 def verify_signature_pil(pil_img: Image.Image) -> tuple[str, float]:
@@ -264,6 +313,11 @@ def verify_signature_pil(pil_img: Image.Image) -> tuple[str, float]:
     return verify(pil_img)
 
 
+def verify_signatures_pil(pil_imgs: list[Image.Image]) -> list[tuple[str, float]]:
+    """Batched counterpart of verify_signature_pil()."""
+    return verify_batch(pil_imgs)
+
+
 def verify_signature_file(path: str | Path) -> tuple[str, float]:
     """Verify a local cropped signature image file."""
     img = Image.open(path).convert("RGB")
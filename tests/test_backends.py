@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from vlm.backends import TransformersBackend  # noqa: E402
+
+
+class _Processor:
+    tokenizer = None
+
+    def apply_chat_template(self, messages, add_generation_prompt=True):
+        return "prompt"
+
+    def __call__(self, text, images, return_tensors):
+        return {"input_ids": torch.zeros((1, 4), dtype=torch.long)}
+
+
+class _Tokenizer:
+    def decode(self, ids, **kw):
+        return "".join(f"t{i} " for i in ids)
+
+
+class _CountingNet:
+    """Fake model that records how many decode steps run at the same time."""
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.running = self.peak = 0
+        self.lock = threading.Lock()
+
+    def generate(self, input_ids, streamer, stopping_criteria, **kw):
+        streamer.put(input_ids)
+        for i in range(self.steps):
+            with self.lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            time.sleep(0.01)
+            with self.lock:
+                self.running -= 1
+            if any(c(None, None) for c in stopping_criteria):
+                break
+            streamer.put(torch.tensor([[i]]))
+        streamer.end()
+        return torch.zeros((1, 4 + self.steps), dtype=torch.long)
+
+
+class _FailingNet:
+    def generate(self, **kw):
+        raise RuntimeError("out of memory")
+
+
+def test_generate_failure_ends_the_stream():
+    backend = TransformersBackend()
+    backend.load_generator = lambda model: (_FailingNet(), _Processor())
+    usage, outcome = {}, {}
+
+    def consume():
+        try:
+            "".join(backend._raw_stream(Image.new("RGB", (64, 32)), "Read it", 16,
+                                        "stub-model", None, usage))
+        except RuntimeError as e:
+            outcome["error"] = e
+
+    reader = threading.Thread(target=consume, daemon=True)
+    reader.start()
+    reader.join(timeout=10)
+    assert not reader.is_alive(), "stream hung after generate() raised"
+    assert "out of memory" in str(outcome.get("error"))
+    assert usage["generation_tokens"] is None
+
+
+def test_interleaved_streams_run_one_decode_step_at_a_time():
+    net, processor = _CountingNet(steps=6), _Processor()
+    processor.tokenizer = _Tokenizer()
+    backend = TransformersBackend()
+    backend.load_generator = lambda model: (net, processor)
+    streams = [backend._raw_stream(Image.new("RGB", (64, 32)), "Read it", 16, "stub-model",
+                                   None, {}) for _ in range(2)]
+
+    texts = ["", ""]
+    live = [0, 1]
+    while live:                         # the scheduler's loop: one delta per stream per step
+        for i in list(live):
+            try:
+                texts[i] += next(streams[i])
+            except StopIteration:
+                live.remove(i)
+    assert texts == ["t0 t1 t2 t3 t4 t5 "] * 2
+    assert net.peak == 1
@@ -0,0 +1,29 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("cv2")
+from PIL import Image
+
+from detection.batch_runner import MANIFEST_NAME, run_batch
+
+
+def test_resume_retries_failed_files(tmp_path):
+    src, dst = tmp_path / "in", tmp_path / "out"
+    src.mkdir()
+    dst.mkdir()
+    for name in ("a.png", "b.png", "c.png"):
+        Image.new("RGB", (32, 16), (200, 200, 200)).save(src / name)
+    with open(dst / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"file": "a.png", "status": "ok", "out": "R_a.png", "ms": {}}) + "\n")
+        f.write(json.dumps({"file": "b.png", "status": "error", "reason": "MemoryError",
+                            "ms": {}}) + "\n")
+
+    res = run_batch(str(src), str(dst), process=lambda img: img, out_prefix="R_",
+                    executor="thread", workers=1)
+
+    assert res["resumed"] == 1 and res["processed"] == 2 and res["failed"] == 0
+    assert os.path.exists(dst / "R_b.png") and not os.path.exists(dst / "R_a.png")
+    rows = [json.loads(line) for line in open(dst / MANIFEST_NAME, encoding="utf-8")]
+    assert [r["status"] for r in rows if r["file"] == "b.png"] == ["error", "ok"]
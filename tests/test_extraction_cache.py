@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance
+
+from detection.extraction_cache import ExtractionCache
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "Our_Dataset", "cheque_images")
+
+
+def _cheque() -> Image.Image:
+    """Synthetic cheque: printed rules plus a handwritten-looking scrawl."""
+    img = Image.new("RGB", (800, 360), (245, 240, 230))
+    d = ImageDraw.Draw(img)
+    for y in (110, 170, 230):
+        d.line((40, y, 760, y), fill=(60, 60, 60), width=2)
+    d.line([(60 + i * 22, 95 - (i % 3) * 9) for i in range(30)], fill=(20, 30, 120), width=3)
+    d.line([(80 + i * 18, 155 - (i % 4) * 7) for i in range(25)], fill=(20, 30, 120), width=3)
+    d.rectangle((600, 250, 740, 300), outline=(60, 60, 60), width=2)
+    return img
+
+
+def _rescan(img: Image.Image, angle: float = 0.0, shift: float = 0.0,
+            brightness: float = 1.0) -> Image.Image:
+    w, h = img.size
+    out = img.rotate(angle, resample=Image.BICUBIC, fillcolor=(255, 255, 255))
+    out = out.crop((int(w * shift), int(h * shift), w, h))
+    return ImageEnhance.Brightness(out).enhance(brightness)
+
+
+def _dataset_cheque(name: str) -> Image.Image:
+    path = os.path.join(DATASET, name)
+    if not os.path.exists(path):
+        pytest.skip(f"{name} not in the dataset")
+    return Image.open(path).convert("RGB")
+
+
+def test_near_match_skips_closer_image_without_the_stage(tmp_path):
+    cache = ExtractionCache(path=str(tmp_path))
+    query = _cheque()
+    closer, further = _rescan(query, angle=0.3), _rescan(query, angle=-0.8, shift=0.01)
+    cache.put(cache.ref(closer), "fields", "old", {"payee": "stale"})
+    cache.put(cache.ref(further), "fields", "v2", {"payee": "fresh"})
+
+    hit = cache.get(cache.ref(query), "fields", "v2")
+    assert hit is not None and hit["match"] == "near"
+    assert hit["value"] == {"payee": "fresh"}
+    assert cache.get(cache.ref(query), "fields", "old")["value"] == {"payee": "stale"}
+    assert cache.get(cache.ref(query), "json", "v2") is None
+
+
+def test_rescanned_dataset_cheque_hits_and_same_book_cheque_misses(tmp_path):
+    cache = ExtractionCache(path=str(tmp_path))
+    img = _dataset_cheque("Cheque 309151.jpg")
+    cache.put(cache.ref(img), "fields", "v1", {"payee": "cached"})
+
+    for rescan in (_rescan(img, angle=0.5), _rescan(img, angle=-1.0), _rescan(img, shift=0.01),
+                   _rescan(img, brightness=1.08), _rescan(img, 1.0, 0.01, 1.08)):
+        hit = cache.get(cache.ref(rescan), "fields", "v1")
+        assert hit is not None and hit["match"] == "near"
+
+    # closest pair of distinct cheques from one book in the dataset
+    other = _dataset_cheque("Cheque 309158.jpg")
+    assert cache.get(cache.ref(other), "fields", "v1") is None
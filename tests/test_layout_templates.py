@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("cv2")
+from detection import layout_templates as lt  # noqa: E402
+from detection import micr  # noqa: E402
+
+DECODE = {"bank_code": "211", "confidence": {"sort_code": 0.9}, "line_box": None}
+
+
+def test_micr_alias_requires_validated_templates(monkeypatch):
+    monkeypatch.setattr(micr, "templates_validated", lambda: True)
+    assert lt.micr_alias(DECODE) == "micr:211"
+    monkeypatch.setattr(micr, "templates_validated", lambda: False)
+    assert lt.micr_alias(DECODE) is None
+
+
+def test_key_falls_back_to_header_ifsc(tmp_path, monkeypatch):
+    registry = lt.TemplateRegistry(str(tmp_path / "layout.json"))
+    monkeypatch.setattr(micr, "templates_validated", lambda: False)
+    monkeypatch.setattr(lt, "header_ifsc", lambda img: "UTIB")
+    assert registry.key_before_extraction(None, DECODE) == ("UTIB", "header")
+    monkeypatch.setattr(lt, "header_ifsc", lambda img: None)
+    assert registry.key_before_extraction(None, DECODE) == (None, None)
+    assert registry.match((1600, 730), DECODE)["status"] == "unknown"
@@ -0,0 +1,40 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("cv2")
+from detection import micr  # noqa: E402
+
+
+@pytest.fixture
+def templates(tmp_path, monkeypatch):
+    """Point the decoder at a copy of the shipped templates with a given held-out score."""
+    with open(micr.TEMPLATES_FILE, encoding="utf-8") as f:
+        shipped = json.load(f)
+    path = str(tmp_path / "micr_templates.json")
+    monkeypatch.setattr(micr, "TEMPLATES_FILE", path)
+
+    def use(heldout):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(dict(shipped, heldout=heldout), f)
+        monkeypatch.setattr(micr, "_templates", None)
+
+    yield use
+    micr._templates = None
+
+
+def test_shipped_templates_are_validated_on_held_out_books():
+    micr._templates = None
+    assert os.path.exists(micr.TEMPLATES_FILE)
+    assert micr.templates_validated()
+
+
+def test_unvalidated_templates_do_not_lock_fields(templates):
+    res = {"cheque_number": "083654", "confidence": {"cheque_number": 0.9}}
+    templates(None)
+    assert micr.trusted_fields(res) == {}
+    templates({"confident": 89, "confident_correct": 80})
+    assert micr.trusted_fields(res) == {}
+    templates({"confident": 89, "confident_correct": 89})
+    assert micr.trusted_fields(res) == {"cheque_number": "083654"}
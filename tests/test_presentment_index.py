@@ -0,0 +1,77 @@
+import os
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from detection import presentment_index as pi
+from detection.cheque_layout import FIELD_ROIS
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "Our_Dataset", "cheque_images")
+ACCOUNT = "50100123456789"
+
+
+def _cheque(number: str) -> Image.Image:
+    path = os.path.join(DATASET, f"Cheque {number}.jpg")
+    if not os.path.exists(path):
+        pytest.skip(f"cheque {number} not in the dataset")
+    return Image.open(path).convert("RGB")
+
+
+def _fields(number: str, amount: str = "25000") -> dict:
+    return {"account_number": ACCOUNT, "cheque_number": number, "amount_numeric": amount}
+
+
+def _record(idx, i: int, rnd: random.Random):
+    key = (str(10 ** 6 + i), "7")
+    key_hash = pi._hash64("|".join(key))
+    fp = {"sha": rnd.getrandbits(64), "whole": rnd.getrandbits(64), "band": rnd.getrandbits(64),
+          "regions": [rnd.getrandbits(64) for _ in pi.REGION_ROIS]}
+    with idx._lock:
+        idx._insert(key, key_hash, pi._signed(pi._hash64(key[0])), {}, fp)
+    return key_hash
+
+
+def test_bloom_filter_is_lazy_and_grows_with_the_index(tmp_path):
+    path = str(tmp_path / "presentments.sqlite3")
+    idx = pi.PresentmentIndex(path, capacity=1024)
+    assert idx._bloom is None
+
+    rnd = random.Random(3)
+    hashes = [_record(idx, i, rnd) for i in range(1500)]
+    assert idx._bloom.bits // pi.BLOOM_BITS_PER_ENTRY >= 2 * 1500
+    assert all(h in idx._bloom for h in hashes)
+    idx.save()
+
+    reopened = pi.PresentmentIndex(path, capacity=1024)
+    assert reopened._bloom is None
+    assert all(h in reopened._key_bloom() for h in hashes)
+    assert reopened._bloom.bits == idx._bloom.bits
+
+
+def test_same_book_cheques_are_not_flagged(tmp_path):
+    # Pairs whose whole / band dHashes fall within the near limits
+    idx = pi.PresentmentIndex(str(tmp_path / "presentments.sqlite3"))
+    for number in ("309127", "309074", "309092", "309123"):
+        idx.check(_cheque(number), _fields(number), record=True)
+    for number in ("309129", "309097", "309101"):
+        flag = idx.check(_cheque(number), _fields(number))
+        assert not flag["duplicate"], (number, flag)
+
+
+def test_edited_amount_is_flagged_altered_copy(tmp_path):
+    idx = pi.PresentmentIndex(str(tmp_path / "presentments.sqlite3"))
+    original = _cheque("309127")
+    idx.check(original, _fields("309127"), record=True)
+
+    edited = original.copy()
+    w, h = edited.size
+    x1, y1, x2, y2 = FIELD_ROIS["amount_numeric"]["box"]
+    box = (int(w * (x1 + 0.05)), int(h * (y1 + 0.03)), int(w * (x2 - 0.05)), int(h * (y2 - 0.03)))
+    draw = ImageDraw.Draw(edited)
+    draw.rectangle(box, fill=(235, 235, 230))
+    draw.text((box[0] + 10, box[1] + 5), "99,000/-", fill=(20, 30, 140))
+
+    flag = idx.check(edited, _fields("309127", "99000"))
+    assert flag["kind"] == "altered_copy"
@@ -0,0 +1,38 @@
+"""Quality gate regressions on dataset cheques."""
+
+import os
+
+import pytest
+
+pytest.importorskip("cv2")
+from PIL import Image
+
+from detection.quality_gate import SIGNATURE_AREA, assess_cheque, blocks_extraction
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "Our_Dataset", "cheque_images")
+
+
+def _cheque(name: str) -> Image.Image:
+    path = os.path.join(DATASET, name)
+    if not os.path.exists(path):
+        pytest.skip(f"{name} not in the dataset")
+    return Image.open(path).convert("RGB")
+
+
+def test_violet_ink_signature_is_signed():
+    # thin violet ballpoint: no blue-range pixels, no dark strokes at WORK_WIDTH
+    gate = assess_cheque(_cheque("Cheque 309160.jpg"))
+    assert gate["verdict"] is None, gate
+    assert gate["scores"]["violet_ink_px"] > 0
+
+
+def test_print_only_signature_area_is_unsigned():
+    img = _cheque("Cheque 309160.jpg")
+    w, h = img.size
+    x1, y1, x2, y2 = SIGNATURE_AREA
+    box = (int(w * x1), int(h * y1), int(w * x2), int(h * y2))
+    img.paste(img.getpixel((int(w * 0.6), int(h * 0.05))), box)
+    gate = assess_cheque(img)
+    assert gate["verdict"] == "UNSIGNED"
+    assert not blocks_extraction(gate)
@@ -0,0 +1,27 @@
+import pytest
+
+from vlm.backends import StubBackend
+from vlm.scheduler import Scheduler, StreamEngine
+
+
+class _FailingStart(StubBackend):
+    """Stub whose requests for the prompt "bad" fail when they are started."""
+
+    def _raw_stream(self, image, prompt, max_tokens, model, prefix, usage):
+        if prompt == "bad":
+            raise RuntimeError("cannot start")
+        return super()._raw_stream(image, prompt, max_tokens, model, prefix, usage)
+
+
+def test_start_failure_fails_only_the_admitted_request(tmp_path):
+    backend = _FailingStart(path=str(tmp_path / "stub.json"), generate_latency_s=0.05,
+                            detect_latency_s=0.0)
+    sched = Scheduler(backend, max_active=4, engine=StreamEngine(backend))
+    with sched._cv:                     # admitted together in one loop iteration
+        good = sched.submit(None, "Describe the cheque", max_tokens=16, model="stub-model")
+        bad = sched.submit(None, "bad", max_tokens=16, model="stub-model")
+
+    with pytest.raises(RuntimeError, match="cannot start"):
+        "".join(bad)
+    assert "".join(good)
+    assert sched.stats["failed"] == 1 and sched.stats["completed"] == 1
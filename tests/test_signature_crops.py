@@ -0,0 +1,42 @@
+"""Signature crop splitting on dataset cheques."""
+
+import os
+
+import pytest
+
+pytest.importorskip("cv2")
+from PIL import Image
+
+from agent import signature_crops
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "Our_Dataset", "cheque_images")
+
+# Falcon-sized box around the one signature on Cheque 309107; it also takes
+# in the foot of the amount-in-words ink above the signature
+SIGNATURE_BOX = [1980, 524, 2252, 811]
+
+
+def _cheque(name: str) -> Image.Image:
+    path = os.path.join(DATASET, name)
+    if not os.path.exists(path):
+        pytest.skip(f"{name} not in the dataset")
+    return Image.open(path).convert("RGB")
+
+
+def test_single_signature_box_stays_one_crop():
+    crops = signature_crops(_cheque("Cheque 309107.jpg"), [SIGNATURE_BOX])
+    assert len(crops) == 1
+    assert crops[0]["bbox"] == SIGNATURE_BOX
+
+
+def test_two_signatures_side_by_side_are_split():
+    sig = _cheque("Cheque 309107.jpg").crop((1990, 670, 2240, 805))
+    paper = sig.getpixel((0, 0))
+    joint = Image.new("RGB", (2 * sig.width + 150, sig.height + 40), paper)
+    joint.paste(sig, (20, 20))
+    joint.paste(sig, (sig.width + 130, 20))
+
+    crops = signature_crops(joint, [[20, 20, joint.width - 20, joint.height - 20]])
+    assert len(crops) == 2
+    assert crops[0]["bbox"][2] < crops[1]["bbox"][0]
@@ -0,0 +1,61 @@
+import pytest
+
+from vlm.backends import StubBackend, prompt_key
+from vlm.stopping import json_criteria, text_criteria
+
+MODEL = "stub-model"
+RECORDINGS = {
+    "json":  '```json\n{"amount_numeric": "25000", "date": "12/03/2024"}\n```\n'
+             "The cheque looks valid and was signed by the account holder.",
+    "stop":  "Answer: the payee is Suresh Traders.\nQuestion: who signed it?",
+    "loop":  "State Bank of India\nMG Road\n" + "Pay Suresh Traders\n" * 60,
+    "ngram": "Rupees " + "Twenty Five Thousand Only and " * 40,
+    "eos":   "A plain short answer.",
+    "cap":   " ".join(f"w{i}" for i in range(50)),
+}
+
+
+@pytest.fixture
+def stub(tmp_path):
+    backend = StubBackend(path=str(tmp_path / "stub.json"), generate_latency_s=0.0,
+                          detect_latency_s=0.0)
+    for name, text in RECORDINGS.items():
+        backend.recordings["generate"][prompt_key(MODEL, name)] = text
+    return backend
+
+
+def test_balanced_json_stops_after_the_object(stub):
+    out = stub.complete(None, "json", model=MODEL, criteria=json_criteria())
+    assert out["stop_reason"] == "json_complete"
+    assert out["text"].endswith("}") and "looks valid" not in out["text"]
+
+
+def test_stop_sequence_cuts_before_the_match(stub):
+    out = stub.complete(None, "stop", model=MODEL, stop=["\nQuestion:"])
+    assert out["stop_reason"] == "stop_sequence"
+    assert out["text"] == "Answer: the payee is Suresh Traders."
+
+
+def test_repeated_line_is_cut(stub):
+    out = stub.complete(None, "loop", model=MODEL, criteria=text_criteria())
+    assert out["stop_reason"] == "repetition"
+    assert out["text"] == "State Bank of India\nMG Road\nPay Suresh Traders"
+
+
+def test_repeated_ngram_is_cut(stub):
+    out = stub.complete(None, "ngram", model=MODEL, criteria=text_criteria())
+    assert out["stop_reason"] == "repetition"
+    assert out["generation_tokens"] < 60
+    assert out["text"] == "Rupees Twenty Five Thousand Only and"
+
+
+def test_short_answer_ends_on_eos(stub):
+    out = stub.complete(None, "eos", model=MODEL, criteria=json_criteria())
+    assert out["stop_reason"] == "eos"
+    assert out["text"] == RECORDINGS["eos"]
+
+
+def test_token_cap_reports_max_tokens(stub):
+    out = stub.complete(None, "cap", model=MODEL, max_tokens=10, criteria=text_criteria())
+    assert out["stop_reason"] == "max_tokens"
+    assert out["generation_tokens"] == 10
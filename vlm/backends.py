@@ -0,0 +1,642 @@
+"""
+VLM Backends — pluggable model runtimes
+=======================================
+Every model call in the app goes through one backend object:
+
+    stream(image, prompt, max_tokens, stop, model, criteria)  → text deltas as decoded
+    complete(...)           → {"text", token counts, prefill_s, decode_s, stop_reason}
+    generate(...)           → text
+    detect(image, query, task, ...)  → [{"bbox": [x1, y1, x2, y2], ...}]
+    conversation(image, model)       → multi-turn chat; .stream(prompt, ...) per turn
+                                       (mlx keeps the encoded image in the KV cache)
+
+Backends implement `_raw_stream`; `stream` applies the stop criteria
+(vlm/stopping.py) and `complete` / `generate` are built on it.
+
+Backends:
+  mlx   — Apple Silicon. Gemma / Qwen via mlx_vlm (vlm.runtime), Falcon
+          Perception via agent_studio's MLX path. The original behaviour.
+  cpu   — Linux / any CPU. Hugging Face transformers on torch. detect() asks
+          the VLM for boxes (no Falcon port), callers keep their heuristic
+          fallback when it returns nothing.
+  stub  — deterministic replay of recorded outputs with configurable
+          latency. No model weights, no accelerator — for load tests and
+          end-to-end benchmarks of cheque_studio on any machine.
+
+Selection (first match):
+    set_backend(obj)                    # programmatic override
+    CHEQUE_VLM_BACKEND=mlx|cpu|stub     # environment
+    auto: mlx if mlx_vlm is importable, else cpu
+
+Stub configuration:
+    CHEQUE_VLM_STUB_FILE     recordings JSON (default vlm/stub_recordings.json)
+    CHEQUE_VLM_STUB_LATENCY  "generate_s[,detect_s]" (default "0.8,0.15")
+
+Admission-control queue for concurrent requests (vlm/scheduler.py):
+    CHEQUE_VLM_SCHEDULER=1  [CHEQUE_VLM_MAX_ACTIVE=8  CHEQUE_VLM_TOKEN_BUDGET=16384]
+
+Recording real outputs for the stub:
+    CHEQUE_VLM_RECORD=vlm/stub_recordings.json python cheque_studio.py
+    # every generate/detect call of the real backend is also written to the file
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+
+from PIL import Image
+
+from vlm.stopping import StopSequences, guard
+
+BACKEND_ENV = "CHEQUE_VLM_BACKEND"
+RECORD_ENV  = "CHEQUE_VLM_RECORD"
+STUB_FILE_ENV    = "CHEQUE_VLM_STUB_FILE"
+STUB_LATENCY_ENV = "CHEQUE_VLM_STUB_LATENCY"
+
+DEFAULT_STUB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "stub_recordings.json")
+
+# MLX checkpoint → equivalent transformers checkpoint for the CPU backend.
+CPU_MODEL_MAP = {
+    "mlx-community/gemma-4-e2b-it-8bit": "google/gemma-4-e2b-it",
+    "mlx-community/Qwen2-VL-2B-4bit":    "Qwen/Qwen2-VL-2B-Instruct",
+}
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    """Stable key for a (model, prompt) pair — used by the stub recordings."""
+    return hashlib.sha1(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+# ── Interface ─────────────────────────────────────────────────────────────────
+
+class VLMBackend:
+    """Base class. Subclasses implement `generate` and `detect`."""
+
+    name = "base"
+
+    def load_generator(self, model: str) -> None:
+        """Load (or warm) the VLM `model`. Idempotent."""
+
+    def load_detector(self) -> None:
+        """Load (or warm) the detection model. Idempotent."""
+
+    def input_spec(self, model: str) -> dict:
+        """Image grid of a loaded `model` (vlm.resolution spec), or None if unknown."""
+        return None
+
+    def _raw_stream(self, image, prompt, max_tokens, model, prefix, usage):
+        """Yield decoded text deltas until EOS / max_tokens; fill `usage` on exit."""
+        raise NotImplementedError
+
+    def stream(self, image: Image.Image, prompt: str, max_tokens: int = 512,
+               stop=None, model: str = None, prefix: str = None, usage: dict = None,
+               criteria=None):
+        """
+        Yield generated text deltas. The logical prompt is `prefix + prompt`;
+        backends that can reuse the prefix's KV state do so.
+
+        `stop` strings and `criteria` (vlm.stopping) end decoding early.
+        `usage`, if given, is filled when the stream ends with
+        {"prompt_tokens", "cached_tokens", "generation_tokens", "prefill_s",
+         "decode_s", "stop_reason"} (None when unknown).
+        """
+        usage = {} if usage is None else usage
+        crit = list(criteria or [])
+        if stop:
+            crit.append(StopSequences(stop))
+        raw = self._raw_stream(image, prompt, max_tokens, model, prefix, usage)
+        return guard(raw, crit, usage, max_tokens)
+
+    def complete(self, image: Image.Image, prompt: str, max_tokens: int = 512,
+                 stop=None, model: str = None, prefix: str = None, criteria=None) -> dict:
+        """`stream` collected into {"text", **usage}."""
+        usage = {}
+        text = "".join(self.stream(image, prompt, max_tokens=max_tokens, stop=stop,
+                                   model=model, prefix=prefix, usage=usage,
+                                   criteria=criteria))
+        return {"text": text, **usage}
+
+    def generate(self, image: Image.Image, prompt: str, max_tokens: int = 512,
+                 stop=None, model: str = None, criteria=None) -> str:
+        return self.complete(image, prompt, max_tokens=max_tokens, stop=stop, model=model,
+                             criteria=criteria)["text"]
+
+    def batch(self, requests: list, model: str = None) -> list:
+        """
+        Run several small image + prompt requests as one batch.
+        requests: [{"image", "prompt", "max_tokens"?, "criteria"?}]
+        Returns one `complete`-style dict per request, in order. The default
+        runs them back to back; backends with padded batching override it.
+        """
+        return [self.complete(r["image"], r["prompt"], max_tokens=r.get("max_tokens", 64),
+                              model=model, criteria=r.get("criteria"))
+                for r in requests]
+
+    def conversation(self, image: Image.Image, model: str = None) -> "VLMConversation":
+        """Multi-turn chat about `image`; backends that can keep the encoded image override."""
+        return VLMConversation(self, image, model)
+
+    def detect(self, image: Image.Image, query: str, task: str = "segmentation",
+               max_dimension: int = 1024, max_new_tokens: int = 100) -> list:
+        raise NotImplementedError
+
+
+class VLMConversation:
+    """
+    Several questions about one image, each seeing the earlier turns.
+    `stream(prompt, ...)` has the same keywords as VLMBackend.stream. This
+    default re-sends the image with the earlier turns inlined as text, so
+    every turn re-encodes the image (usage["image_encodes"] counts them).
+    """
+
+    def __init__(self, backend: VLMBackend, image: Image.Image, model: str = None):
+        self.backend = backend
+        self.image = image
+        self.model = model
+        self.turns = []             # [(prompt, answer)]
+        self.image_encodes = 0
+
+    def _raw_turn(self, prompt, max_tokens, usage):
+        history = "".join(f"Earlier question:\n{q}\n\nYour earlier answer:\n{a}\n\n"
+                          for q, a in self.turns)
+        self.image_encodes += 1
+        usage["image_encodes"] = self.image_encodes
+        return self.backend._raw_stream(self.image, history + prompt, max_tokens,
+                                        self.model, None, usage)
+
+    def stream(self, prompt: str, max_tokens: int = 512, stop=None, usage: dict = None,
+               criteria=None):
+        usage = {} if usage is None else usage
+        crit = list(criteria or [])
+        if stop:
+            crit.append(StopSequences(stop))
+        parts = []
+        try:
+            for delta in guard(self._raw_turn(prompt, max_tokens, usage), crit, usage, max_tokens):
+                parts.append(delta)
+                yield delta
+        finally:
+            self.turns.append((prompt, "".join(parts)))
+
+    def complete(self, prompt: str, max_tokens: int = 512, stop=None, criteria=None) -> dict:
+        usage = {}
+        text = "".join(self.stream(prompt, max_tokens=max_tokens, stop=stop, usage=usage,
+                                   criteria=criteria))
+        return {"text": text, **usage}
+
+
+# ── MLX (Apple Silicon) ───────────────────────────────────────────────────────
+
+class MLXBackend(VLMBackend):
+    name = "mlx"
+
+    def load_generator(self, model):
+        from vlm import runtime
+        runtime.load(model)
+
+    def load_detector(self):
+        from agent_studio import _load_falcon_mlx
+        _load_falcon_mlx()
+
+    def input_spec(self, model):
+        from vlm import runtime
+        from vlm.resolution import spec_from_processor
+        bundle = runtime._BUNDLES.get(model)
+        return spec_from_processor(bundle["processor"]) if bundle else None
+
+    def _raw_stream(self, image, prompt, max_tokens, model, prefix, usage):
+        from vlm import runtime
+        return runtime.stream(model, image, prompt, max_tokens=max_tokens,
+                              temperature=0.1, prefix=prefix, usage=usage)
+
+    def conversation(self, image, model=None):
+        return MLXConversation(self, image, model)
+
+    def detect(self, image, query, task="segmentation", max_dimension=1024, max_new_tokens=100):
+        from agent_studio import _load_falcon_mlx, _run_falcon_mlx
+        _load_falcon_mlx()
+        return _run_falcon_mlx(image, query, task, max_dimension, max_new_tokens)
+
+
+class MLXConversation(VLMConversation):
+    """Keeps the mlx_vlm KV cache (encoded image included) between turns."""
+
+    def __init__(self, backend, image, model=None):
+        super().__init__(backend, image, model)
+        self._conv = None
+
+    def _raw_turn(self, prompt, max_tokens, usage):
+        from vlm import runtime
+        if self._conv is None:
+            self._conv = runtime.Conversation(self.model, self.image)
+        return self._conv.stream(prompt, max_tokens=max_tokens, usage=usage)
+
+
+# ── CPU (transformers) ────────────────────────────────────────────────────────
+
+_DETECT_PROMPT = (
+    "Locate every {query} in this image. Reply with ONLY a JSON list of boxes "
+    "[[x1, y1, x2, y2], ...] in 0-1000 coordinates relative to the image width "
+    "and height. Reply [] if there is none."
+)
+_BOX_RE = re.compile(r"\[\s*(\d+(?:\.\d+)?)\s*,\s*(\d+(?:\.\d+)?)\s*,\s*"
+                     r"(\d+(?:\.\d+)?)\s*,\s*(\d+(?:\.\d+)?)\s*\]")
+
+
+class TransformersBackend(VLMBackend):
+    """CPU inference with Hugging Face transformers (greedy decoding)."""
+
+    name = "cpu"
+
+    def __init__(self, detect_model: str = None, threads: int = None):
+        self._models = {}
+        self._lock = threading.Lock()
+        self.detect_model = detect_model or os.environ.get(
+            "CHEQUE_VLM_DETECT_MODEL", "mlx-community/Qwen2-VL-2B-4bit")
+        self.threads = threads
+
+    @staticmethod
+    def hf_id(model: str) -> str:
+        return CPU_MODEL_MAP.get(model, model)
+
+    def load_generator(self, model):
+        hf_id = self.hf_id(model)
+        if hf_id in self._models:
+            return self._models[hf_id]
+        with self._lock:
+            if hf_id not in self._models:
+                import torch
+                from transformers import AutoModelForImageTextToText, AutoProcessor
+                if self.threads:
+                    torch.set_num_threads(self.threads)
+                print(f"[VLM-CPU] Loading {hf_id} on CPU...")
+                processor = AutoProcessor.from_pretrained(hf_id)
+                net = AutoModelForImageTextToText.from_pretrained(
+                    hf_id, torch_dtype=torch.float32).eval()
+                self._models[hf_id] = (net, processor)
+        return self._models[hf_id]
+
+    def load_detector(self):
+        self.load_generator(self.detect_model)
+
+    def input_spec(self, model):
+        from vlm.resolution import spec_from_processor
+        loaded = self._models.get(self.hf_id(model))
+        return spec_from_processor(loaded[1]) if loaded else None
+
+    def _raw_stream(self, image, prompt, max_tokens, model, prefix, usage):
+        # No prefix KV reuse here: transformers drops pixel_values whenever the
+        # cache is non-empty, so an image after a cached prefix would be lost.
+        import torch
+        from transformers import StoppingCriteria, TextIteratorStreamer
+
+        net, processor = self.load_generator(model)
+        messages = [{"role": "user", "content": [
+            {"type": "image"}, {"type": "text", "text": (prefix or "") + prompt}]}]
+        text = processor.apply_chat_template(messages, add_generation_prompt=True)
+        inputs = processor(text=[text], images=[image.convert("RGB")], return_tensors="pt")
+
+        cancelled = threading.Event()
+        turn = threading.Semaphore(0)
+
+        class _Cancel(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return cancelled.is_set()
+
+        class _Lockstep(TextIteratorStreamer):
+            # generate() runs in its own thread; holding it after every token
+            # until the reader asks for the next one keeps it from decoding
+            # ahead, so interleaved streams never run two model steps at once
+            def put(self, value):
+                prompt = self.skip_prompt and self.next_tokens_are_prompt
+                super().put(value)
+                if not prompt and not cancelled.is_set():
+                    turn.acquire()
+
+        streamer = _Lockstep(processor.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        kw = {"max_new_tokens": max_tokens, "do_sample": False, "streamer": streamer,
+              "stopping_criteria": [_Cancel()]}
+        result = {}
+
+        def _run():
+            try:
+                with torch.inference_mode():
+                    result["out"] = net.generate(**inputs, **kw)
+            except BaseException as e:
+                # generate() never reached streamer.end(): unblock the reader
+                result["error"] = e
+                streamer.end()
+
+        t0 = time.perf_counter()
+        worker = threading.Thread(target=_run, daemon=True)
+        worker.start()
+        t_first = None
+        try:
+            for delta in streamer:
+                if t_first is None:
+                    t_first = time.perf_counter()
+                yield delta
+                turn.release()     # the reader wants more: one more decode step
+            worker.join()
+            if "error" in result:
+                raise result["error"]
+        finally:
+            cancelled.set()        # a stop criterion fired → end generate()
+            turn.release()
+            worker.join()
+            t_end = time.perf_counter()
+            t_first = t_first or t_end
+            n_prompt = int(inputs["input_ids"].shape[1])
+            out = result.get("out")
+            usage.update({
+                "prompt_tokens":     n_prompt,
+                "cached_tokens":     0,
+                "generation_tokens": int(out.shape[1] - n_prompt) if out is not None else None,
+                "prefill_s":         round(t_first - t0, 3),
+                "decode_s":          round(t_end - t_first, 3),
+            })
+
+    def batch(self, requests, model=None):
+        """One padded generate() over every request (left padding, greedy)."""
+        import torch
+        if not requests:
+            return []
+        net, processor = self.load_generator(model)
+        texts = [processor.apply_chat_template(
+                     [{"role": "user", "content": [{"type": "image"},
+                                                   {"type": "text", "text": r["prompt"]}]}],
+                     add_generation_prompt=True)
+                 for r in requests]
+        processor.tokenizer.padding_side = "left"
+        inputs = processor(text=texts, images=[r["image"].convert("RGB") for r in requests],
+                           padding=True, return_tensors="pt")
+        max_tokens = max(r.get("max_tokens", 64) for r in requests)
+        t0 = time.perf_counter()
+        with torch.inference_mode():
+            out = net.generate(**inputs, max_new_tokens=max_tokens, do_sample=False)
+        wall = round(time.perf_counter() - t0, 3)
+        n_prompt = int(inputs["input_ids"].shape[1])
+        results = []
+        for i, r in enumerate(requests):
+            ids = out[i, n_prompt:][: r.get("max_tokens", 64)]
+            usage = {"prompt_tokens": int(inputs["attention_mask"][i].sum()),
+                     "cached_tokens": 0, "generation_tokens": int(ids.shape[0]),
+                     "prefill_s": None, "decode_s": wall}
+            text = "".join(guard(iter([processor.decode(ids, skip_special_tokens=True)]),
+                                 r.get("criteria"), usage, r.get("max_tokens", 64)))
+            results.append({"text": text, **usage})
+        return results
+
+    def detect(self, image, query, task="segmentation", max_dimension=1024, max_new_tokens=100):
+        img = image
+        if max(img.size) > max_dimension:
+            s = max_dimension / max(img.size)
+            img = img.resize((max(1, round(img.width * s)), max(1, round(img.height * s))),
+                             Image.BILINEAR)
+        raw = self.generate(img, _DETECT_PROMPT.format(query=query),
+                            max_tokens=max(max_new_tokens, 64), model=self.detect_model)
+        w, h = image.size
+        dets = []
+        for m in _BOX_RE.finditer(raw):
+            x1, y1, x2, y2 = (float(v) / 1000 for v in m.groups())
+            box = [max(0, int(x1 * w)), max(0, int(y1 * h)),
+                   min(w, int(x2 * w)), min(h, int(y2 * h))]
+            if box[2] > box[0] and box[3] > box[1]:
+                dets.append({"bbox": box})
+        return dets
+
+
+# ── Deterministic stub ────────────────────────────────────────────────────────
+
+_STUB_FIELDS = {
+    "account_holder":    "RAVI KUMAR",
+    "bank_name":         "State Bank of India",
+    "branch_name":       "MG Road",
+    "cheque_number":     "083654",
+    "date":              "12/03/2024",
+    "payee_name":        "Suresh Traders",
+    "amount_numeric":    "25,000.00",
+    "amount_words":      "Rupees Twenty Five Thousand Only",
+    "signature_present": "yes",
+    "ifsc_code":         "SBIN0001234",
+    "account_number":    "30012345678",
+}
+_STUB_OCR = "\n".join([
+    "State Bank of India", "MG Road", "IFSC SBIN0001234", "Pay Suresh Traders",
+    "Rupees Twenty Five Thousand Only", "25,000.00", "12032024",
+    "A/c No 30012345678", "For RAVI KUMAR", "083654",
+])
+_STUB_ANSWER = "This is a signed Indian bank cheque for Rs. 25,000.00 payable to Suresh Traders."
+
+# Fractional box used when no detection was recorded for "signature".
+_STUB_SIGNATURE_BOX = (0.62, 0.58, 0.92, 0.80)
+
+# Share of the simulated generate latency spent in prefill.
+_STUB_PREFILL_SHARE = 0.4
+
+
+class _StubConversation(VLMConversation):
+    """Replays each turn by its own prompt and counts one image encode, like MLX."""
+
+    def _raw_turn(self, prompt, max_tokens, usage):
+        self.image_encodes = 1
+        usage["image_encodes"] = 1
+        return self.backend._raw_stream(self.image, prompt, max_tokens, self.model, None, usage)
+
+
+class StubBackend(VLMBackend):
+    """
+    Replays recorded outputs deterministically.
+
+    Recordings file:
+        {"generate": {prompt_key: text},
+         "detect":   {query: [[fx1, fy1, fx2, fy2], ...]}}   # fractional boxes
+
+    A prompt with no recording gets a canned answer chosen by prompt type
+    (OCR dump, JSON fields, or free text), so every endpoint works even with
+    an empty file.
+    """
+
+    name = "stub"
+
+    def __init__(self, path: str = None, generate_latency_s: float = None,
+                 detect_latency_s: float = None):
+        self.path = path or os.environ.get(STUB_FILE_ENV, DEFAULT_STUB_FILE)
+        lat = os.environ.get(STUB_LATENCY_ENV, "0.8,0.15").split(",")
+        self.generate_latency_s = (generate_latency_s if generate_latency_s is not None
+                                   else float(lat[0]))
+        self.detect_latency_s = (detect_latency_s if detect_latency_s is not None
+                                 else float(lat[1] if len(lat) > 1 else lat[0]))
+        self.recordings = {"generate": {}, "detect": {}}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.recordings["generate"].update(data.get("generate", {}))
+            self.recordings["detect"].update(data.get("detect", {}))
+        self.stats = {"generate": 0, "detect": 0, "replayed": 0, "canned": 0}
+        self._prefixes = set()
+
+    @staticmethod
+    def _canned(prompt: str) -> str:
+        if "OCR system" in prompt:
+            return _STUB_OCR
+        if "JSON" in prompt:
+            return json.dumps(_STUB_FIELDS, indent=2)
+        return _STUB_ANSWER
+
+    def plan(self, prompt, max_tokens, model, prefix) -> dict:
+        """
+        What a replay of this request produces, without sleeping. Simulated
+        accounting: prompt length in whitespace tokens; prefill time scaled by
+        the share of the prompt that is not a previously seen prefix; decode
+        time spread evenly over the output.
+        """
+        full = (prefix or "") + prompt
+        cached = len(prefix.split()) if prefix and prefix in self._prefixes else 0
+        if prefix:
+            self._prefixes.add(prefix)
+        total = max(1, len(full.split()))
+
+        self.stats["generate"] += 1
+        text = self.recordings["generate"].get(prompt_key(model, full))
+        if text is None:
+            self.stats["canned"] += 1
+            text = self._canned(full)
+        else:
+            self.stats["replayed"] += 1
+        return {
+            "pieces":        re.findall(r"\s*\S+", text)[:max_tokens] or [text],
+            "prompt_tokens": total,
+            "cached_tokens": cached,
+            "prefill_s":     self.generate_latency_s * _STUB_PREFILL_SHARE * (total - cached) / total,
+            "decode_s":      self.generate_latency_s * (1 - _STUB_PREFILL_SHARE),
+        }
+
+    def _raw_stream(self, image, prompt, max_tokens, model, prefix, usage):
+        """Replay word by word with the planned prefill / decode latency."""
+        p = self.plan(prompt, max_tokens, model, prefix)
+        pieces = p["pieces"]
+        time.sleep(p["prefill_s"])
+        sent = 0
+        try:
+            for piece in pieces:
+                time.sleep(p["decode_s"] / len(pieces))
+                sent += 1
+                yield piece
+        finally:
+            usage.update({"prompt_tokens": p["prompt_tokens"], "cached_tokens": p["cached_tokens"],
+                          "generation_tokens": sent, "prefill_s": round(p["prefill_s"], 3),
+                          "decode_s": round(p["decode_s"] * sent / len(pieces), 3)})
+
+    def conversation(self, image, model=None):
+        return _StubConversation(self, image, model)
+
+    def detect(self, image, query, task="segmentation", max_dimension=1024, max_new_tokens=100):
+        self.stats["detect"] += 1
+        time.sleep(self.detect_latency_s)
+        boxes = self.recordings["detect"].get(query)
+        if boxes is None:
+            boxes = [_STUB_SIGNATURE_BOX] if query == "signature" else []
+        w, h = image.size
+        return [{"bbox": [int(x1 * w), int(y1 * h), int(x2 * w), int(y2 * h)]}
+                for x1, y1, x2, y2 in boxes]
+
+
+class RecordingBackend(VLMBackend):
+    """Wraps a real backend and appends its outputs to a stub recordings file."""
+
+    def __init__(self, inner: VLMBackend, path: str):
+        self.inner = inner
+        self.name = inner.name
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"generate": {}, "detect": {}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data.update(json.load(f))
+
+    def _flush(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def load_generator(self, model):
+        self.inner.load_generator(model)
+
+    def load_detector(self):
+        self.inner.load_detector()
+
+    def input_spec(self, model):
+        return self.inner.input_spec(model)
+
+    def conversation(self, image, model=None):
+        return self.inner.conversation(image, model)
+
+    def stream(self, image, prompt, max_tokens=512, stop=None, model=None, prefix=None,
+               usage=None, criteria=None):
+        parts = []
+        for delta in self.inner.stream(image, prompt, max_tokens=max_tokens, stop=stop,
+                                       model=model, prefix=prefix, usage=usage,
+                                       criteria=criteria):
+            parts.append(delta)
+            yield delta
+        with self._lock:
+            self.data["generate"][prompt_key(model, (prefix or "") + prompt)] = "".join(parts)
+            self._flush()
+
+    def detect(self, image, query, task="segmentation", max_dimension=1024, max_new_tokens=100):
+        dets = self.inner.detect(image, query, task, max_dimension, max_new_tokens)
+        w, h = image.size
+        boxes = [[round(b[0] / w, 4), round(b[1] / h, 4), round(b[2] / w, 4), round(b[3] / h, 4)]
+                 for b in (d["bbox"] for d in dets if "bbox" in d)]
+        with self._lock:
+            self.data["detect"][query] = boxes
+            self._flush()
+        return dets
+
+
+# ── Selection ─────────────────────────────────────────────────────────────────
+
+_BACKENDS = {"mlx": MLXBackend, "cpu": TransformersBackend, "stub": StubBackend}
+_active = None
+_active_lock = threading.Lock()
+
+
+def default_backend_name() -> str:
+    name = os.environ.get(BACKEND_ENV, "").strip().lower()
+    if name:
+        if name not in _BACKENDS:
+            raise ValueError(f"{BACKEND_ENV}={name!r}: expected one of {sorted(_BACKENDS)}")
+        return name
+    return "mlx" if importlib.util.find_spec("mlx_vlm") is not None else "cpu"
+
+
+def get_backend() -> VLMBackend:
+    """The process-wide backend (created on first use)."""
+    global _active
+    if _active is None:
+        with _active_lock:
+            if _active is None:
+                backend = _BACKENDS[default_backend_name()]()
+                record = os.environ.get(RECORD_ENV)
+                if record and backend.name != "stub":
+                    backend = RecordingBackend(backend, record)
+                if os.environ.get("CHEQUE_VLM_SCHEDULER", "") not in ("", "0"):
+                    from vlm.scheduler import ScheduledBackend
+                    backend = ScheduledBackend(backend)
+                print(f"[VLM] Backend: {backend.name}")
+                _active = backend
+    return _active
+
+
+def set_backend(backend) -> VLMBackend:
+    """Replace the process-wide backend with an instance or a name."""
+    global _active
+    _active = _BACKENDS[backend]() if isinstance(backend, str) else backend
+    return _active
@@ -0,0 +1,122 @@
+"""
+OCR Hint Benchmark — prompt size, prefill and accuracy with / without compaction
+================================================================================
+Runs the full extraction on a directory of cheques once per OCR hint setting
+(detection/ocr_hint.py) and reports, per setting:
+
+  hint_tokens    mean estimated tokens of the OCR text pasted into prompts
+  prompt_tokens  mean prompt tokens of the Gemma JSON pass (as the backend counts them)
+  prefill_s      mean Gemma JSON prefill time
+  repair_s       mean repair-pass prefill time, over cheques that ran one
+  latency_s      mean end-to-end extraction time
+  cheque_no      cheque_number accuracy against the number in the file name
+  accuracy       field accuracy against --labels when given, otherwise field
+                 agreement with the first setting listed (the reference)
+
+Settings are "full" (OCR text pasted verbatim) or "compact[:<tokens>]".
+The result cache is disabled so every setting runs its own passes.
+
+    python -m vlm.bench_hint Our_Dataset/cheque_images --limit 20
+    python -m vlm.bench_hint DIR --settings full compact:256 compact:128 --out hint.json
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from PIL import Image
+
+from vlm.bench_resolution import _IMAGE_EXTS, _field_hits, _mean, _norm
+
+
+def _apply(setting: str):
+    """Point the extractor's hint settings (read per call) at `setting`."""
+    from detection.ocr_hint import DEFAULT_TOKENS, HINT_ENV, HINT_TOKENS_ENV
+
+    mode, _, budget = setting.partition(":")
+    os.environ[HINT_ENV] = mode
+    os.environ[HINT_TOKENS_ENV] = budget or str(DEFAULT_TOKENS)
+
+
+def run(image_dir: str, settings: list, labels: dict = None, limit: int = None) -> dict:
+    from detection.extraction_cache import CACHE_ENV
+    from detection.ocr_extractor import CHEQUE_FIELDS, extract_cheque_fields
+
+    os.environ[CACHE_ENV] = "0"
+    files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(_IMAGE_EXTS))
+    files = files[:limit] if limit else files
+    results = {s: {} for s in settings}
+
+    for name in files:
+        img = Image.open(os.path.join(image_dir, name)).convert("RGB")
+        for setting in settings:
+            _apply(setting)
+            t = time.time()
+            fields = extract_cheque_fields(img, mode="full")
+            timings = fields.get("_timings") or {}
+            jsn = timings.get("json") or {}
+            results[setting][name] = {
+                "fields":        {k: fields.get(k) for k in CHEQUE_FIELDS},
+                "latency_s":     round(time.time() - t, 2),
+                "hint_tokens":   (timings.get("hint") or {}).get("tokens_out"),
+                "prompt_tokens": jsn.get("prompt_tokens"),
+                "prefill_s":     jsn.get("prefill_s"),
+                "repair_s":      (timings.get("repair") or {}).get("prefill_s"),
+            }
+            r = results[setting][name]
+            print(f"[Bench-Hint] {name} {setting}: {r['latency_s']}s, "
+                  f"hint {r['hint_tokens']} tok, prefill {r['prefill_s']}s")
+
+    reference = settings[0]
+    summary = {}
+    for setting in settings:
+        runs = results[setting]
+        hit = total = cheque_hit = cheque_total = 0
+        for name, r in runs.items():
+            truth = (labels or {}).get(name) or (None if labels else
+                                                  results[reference][name]["fields"])
+            if truth is not None:
+                h, n = _field_hits(r["fields"], truth)
+                hit, total = hit + h, total + n
+            m = re.search(r"\d{6}", name)
+            if m:
+                cheque_total += 1
+                cheque_hit += _norm(r["fields"].get("cheque_number")) == m.group(0)
+        summary[setting] = {
+            k: _mean([r[k] for r in runs.values()])
+            for k in ("hint_tokens", "prompt_tokens", "prefill_s", "repair_s", "latency_s")
+        }
+        summary[setting]["cheque_no"] = round(cheque_hit / cheque_total, 3) if cheque_total else None
+        summary[setting]["accuracy"] = round(hit / total, 3) if total else None
+    return {"files": len(files), "reference": "labels" if labels else reference,
+            "summary": summary, "runs": results}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Compare OCR hint compaction settings")
+    p.add_argument("image_dir", nargs="?", default="Our_Dataset/cheque_images")
+    p.add_argument("--settings", nargs="+", default=["full", "compact"])
+    p.add_argument("--labels", help="JSON file of ground-truth fields per file name")
+    p.add_argument("--limit", type=int, help="Only the first N images")
+    p.add_argument("--out", help="Write the full report (per-image runs) as JSON")
+    args = p.parse_args()
+
+    labels = None
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = json.load(f)
+
+    report = run(args.image_dir, args.settings, labels, args.limit)
+    columns = (("hint_tokens", 10), ("prompt_tokens", 11), ("prefill_s", 11),
+               ("repair_s", 10), ("latency_s", 11), ("cheque_no", 11), ("accuracy", 10))
+    print(f"\n{report['files']} cheques, accuracy vs {report['reference']}")
+    print(f"{'setting':<14}{'hint tok':>10}{'prompt tok':>11}{'prefill s':>11}"
+          f"{'repair s':>10}{'latency s':>11}{'cheque no':>11}{'accuracy':>10}")
+    for setting, s in report["summary"].items():
+        print(f"{setting:<14}" + "".join(f"{'-' if s[k] is None else s[k]:>{w}}"
+                                         for k, w in columns))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
@@ -0,0 +1,143 @@
+"""
+Extraction Mode Benchmark — latency and peak memory per mode
+============================================================
+Runs `extract_cheque_fields` over a directory of cheques once per extraction
+mode, each mode in a FRESH process so its peak memory only counts the models
+that mode actually loads (the two-model "full" flow keeps Qwen2-VL and Gemma
+resident; "single" loads Gemma only).
+
+Reported per mode:
+  latency_s      mean / p50 / max per-cheque extraction time (first cheque,
+                 which includes model loading, reported separately as cold_s)
+  peak_mem_mb    accelerator peak (mlx) when available, plus process max RSS
+  image_encodes  mean vision-encoder passes per cheque (when reported)
+  repairs        Gemma repair passes run / avoided by the amount cross-check
+  repair_s       mean repair time (prefill + decode, ROI crops included) and
+                 per missing field, over cheques that ran a repair
+  fields         mean number of non-null fields
+
+    python -m vlm.bench_modes Our_Dataset/cheque_images --modes full single --limit 10
+    python -m vlm.bench_modes DIR --modes full --repair delta roi full   # CHEQUE_REPAIR_MODE
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+
+def _peak_memory_mb() -> dict:
+    out = {}
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out["rss_mb"] = round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        import mlx.core as mx
+        peak = mx.get_peak_memory() if hasattr(mx, "get_peak_memory") else mx.metal.get_peak_memory()
+        out["mlx_mb"] = round(peak / 2 ** 20, 1)
+    except Exception:
+        pass
+    return out
+
+
+def _child(image_dir: str, mode: str, limit: int) -> dict:
+    """One mode, in this process. Returns the raw per-cheque measurements."""
+    from PIL import Image
+    from detection.ocr_extractor import CHEQUE_FIELDS, extract_cheque_fields
+
+    files = sorted(f for f in os.listdir(image_dir)
+                   if f.lower().endswith((".jpg", ".jpeg", ".png")))[:limit]
+    runs = []
+    for name in files:
+        img = Image.open(os.path.join(image_dir, name)).convert("RGB")
+        t = time.time()
+        fields = extract_cheque_fields(img, mode=mode)
+        timings = fields.get("_timings") or {}
+        repair = timings.get("repair") or {}
+        roi_repair = timings.get("roi_repair") or {}
+        runs.append({
+            "file":          name,
+            "latency_s":     round(time.time() - t, 2),
+            "image_encodes": timings.get("image_encodes"),
+            "repair":        "repair" in timings,
+            "repair_avoided": bool((timings.get("amounts") or {}).get("repair_avoided")),
+            "repair_s":      round((repair.get("prefill_s") or 0) + (repair.get("decode_s") or 0)
+                                   + (roi_repair.get("duration_s") or 0), 2)
+                             if repair or roi_repair else None,
+            "repair_fields": len(set(repair.get("fields") or [])
+                                 | {k for r in roi_repair.get("rois", [])
+                                    for k in _roi_fields(r)}) or None,
+            "fields":        sum(1 for k in CHEQUE_FIELDS if fields.get(k) not in (None, "")),
+        })
+    return {"mode": mode, "runs": runs, "peak": _peak_memory_mb()}
+
+
+def _roi_fields(name: str) -> list:
+    from detection.cheque_layout import FIELD_ROIS
+    return FIELD_ROIS.get(name, {}).get("fields", [])
+
+
+def _summary(res: dict) -> dict:
+    runs = res["runs"]
+    repaired = [r for r in runs if r.get("repair_s") is not None]
+    warm = sorted(r["latency_s"] for r in runs[1:]) or [r["latency_s"] for r in runs]
+    enc = [r["image_encodes"] for r in runs if r["image_encodes"] is not None]
+    return {
+        "cheques":       len(runs),
+        "cold_s":        runs[0]["latency_s"] if runs else None,
+        "mean_s":        round(sum(warm) / len(warm), 2) if warm else None,
+        "p50_s":         warm[len(warm) // 2] if warm else None,
+        "max_s":         warm[-1] if warm else None,
+        "image_encodes": round(sum(enc) / len(enc), 2) if enc else None,
+        "fields":        round(sum(r["fields"] for r in runs) / len(runs), 1) if runs else None,
+        "repairs":       f"{sum(r.get('repair', False) for r in runs)}"
+                         f"/-{sum(r.get('repair_avoided', False) for r in runs)}",
+        "repair_s":      round(sum(r["repair_s"] for r in repaired) / len(repaired), 2)
+                         if repaired else None,
+        "repair_s/field": round(sum(r["repair_s"] / (r["repair_fields"] or 1) for r in repaired)
+                                / len(repaired), 3) if repaired else None,
+        **res["peak"],
+    }
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Compare extraction modes: latency and peak memory")
+    p.add_argument("image_dir", nargs="?", default="Our_Dataset/cheque_images")
+    p.add_argument("--modes", nargs="+", default=["full", "single"])
+    p.add_argument("--limit", type=int, default=10)
+    p.add_argument("--repair", nargs="+", default=[None],
+                   help="Repair modes to compare (CHEQUE_REPAIR_MODE: delta, roi, full)")
+    p.add_argument("--out", help="Write the full report as JSON")
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child:
+        print("__RESULT__" + json.dumps(_child(args.image_dir, args.child, args.limit)))
+        sys.exit(0)
+
+    report = {}
+    for mode in args.modes:
+        for repair in args.repair:
+            label = f"{mode}:{repair}" if repair else mode
+            env = dict(os.environ, CHEQUE_REPAIR_MODE=repair) if repair else None
+            print(f"[Bench-Modes] {label}: fresh process, {args.limit} cheques...")
+            proc = subprocess.run([sys.executable, "-m", "vlm.bench_modes", args.image_dir,
+                                   "--child", mode, "--limit", str(args.limit)],
+                                  capture_output=True, text=True, env=env)
+            line = next((ln for ln in proc.stdout.splitlines()
+                         if ln.startswith("__RESULT__")), None)
+            if line is None:
+                print(f"[Bench-Modes] {label} failed:\n{proc.stderr[-2000:]}")
+                continue
+            report[label] = _summary(json.loads(line[len("__RESULT__"):]))
+
+    cols = ("cold_s", "mean_s", "p50_s", "max_s", "mlx_mb", "rss_mb", "image_encodes", "fields",
+            "repairs", "repair_s", "repair_s/field")
+    print(f"\n{'mode':<14}" + "".join(f"{c:>15}" for c in cols))
+    for mode, s in report.items():
+        print(f"{mode:<14}" + "".join(f"{str(s.get(c, '-')):>15}" for c in cols))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
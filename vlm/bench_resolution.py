@@ -0,0 +1,120 @@
+"""
+Resolution Policy Benchmark
+===========================
+Runs the full extraction on a directory of cheques once per resolution policy
+(vlm/resolution.py) and reports, per policy:
+
+  image_tokens  mean image tokens per cheque (Qwen OCR + Gemma JSON)
+  latency_s     mean end-to-end extraction time
+  prefill_s     mean Gemma JSON prefill time
+  cheque_no     cheque_number accuracy against the number in the file name
+                ("Cheque 083654.jpg")
+  accuracy      field accuracy against --labels when given
+                ({"<file>": {"<field>": "<value>", ...}}), otherwise field
+                agreement with the first policy listed (the reference)
+
+    python -m vlm.bench_resolution Our_Dataset/cheque_images --limit 20
+    python -m vlm.bench_resolution DIR --policies legacy native budget:512 --out bench.json
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from PIL import Image
+
+_IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+
+
+def _norm(v) -> str:
+    return re.sub(r"[\s,.\-/]", "", str(v or "")).lower()
+
+
+def _field_hits(fields: dict, truth: dict) -> tuple:
+    """(matching, compared) over the non-empty fields of `truth`."""
+    keys = [k for k, v in truth.items() if v not in (None, "") and not k.startswith("_")]
+    return sum(1 for k in keys if _norm(fields.get(k)) == _norm(truth[k])), len(keys)
+
+
+def _mean(xs):
+    xs = [x for x in xs if x is not None]
+    return round(sum(xs) / len(xs), 3) if xs else None
+
+
+def run(image_dir: str, policies: list, labels: dict = None, limit: int = None) -> dict:
+    from detection.ocr_extractor import CHEQUE_FIELDS, extract_cheque_fields
+
+    files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(_IMAGE_EXTS))
+    files = files[:limit] if limit else files
+    results = {p: {} for p in policies}
+
+    for name in files:
+        img = Image.open(os.path.join(image_dir, name)).convert("RGB")
+        for policy in policies:
+            t = time.time()
+            fields = extract_cheque_fields(img, mode="full", policy=policy)
+            res = (fields.get("_timings") or {}).get("resolution") or {}
+            results[policy][name] = {
+                "fields":       {k: fields.get(k) for k in CHEQUE_FIELDS},
+                "latency_s":    round(time.time() - t, 2),
+                "prefill_s":    ((fields.get("_timings") or {}).get("json") or {}).get("prefill_s"),
+                "image_tokens": sum((res.get(k) or {}).get("image_tokens") or 0
+                                    for k in ("ocr", "json")) or None,
+            }
+            print(f"[Bench-Res] {name} {policy}: {results[policy][name]['latency_s']}s, "
+                  f"{results[policy][name]['image_tokens']} image tokens")
+
+    reference = policies[0]
+    summary = {}
+    for policy in policies:
+        runs = results[policy]
+        hit = total = cheque_hit = cheque_total = 0
+        for name, r in runs.items():
+            truth = (labels or {}).get(name) or (None if labels else
+                                                  results[reference][name]["fields"])
+            if truth is not None:
+                h, n = _field_hits(r["fields"], truth)
+                hit, total = hit + h, total + n
+            m = re.search(r"\d{6}", name)
+            if m:
+                cheque_total += 1
+                cheque_hit += _norm(r["fields"].get("cheque_number")) == m.group(0)
+        summary[policy] = {
+            "image_tokens": _mean([r["image_tokens"] for r in runs.values()]),
+            "latency_s":    _mean([r["latency_s"] for r in runs.values()]),
+            "prefill_s":    _mean([r["prefill_s"] for r in runs.values()]),
+            "cheque_no":    round(cheque_hit / cheque_total, 3) if cheque_total else None,
+            "accuracy":     round(hit / total, 3) if total else None,
+        }
+    return {"files": len(files), "reference": "labels" if labels else reference,
+            "summary": summary, "runs": results}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Compare VLM image resolution policies")
+    p.add_argument("image_dir", nargs="?", default="Our_Dataset/cheque_images")
+    p.add_argument("--policies", nargs="+", default=["legacy", "native", "native+enhance"])
+    p.add_argument("--labels", help="JSON file of ground-truth fields per file name")
+    p.add_argument("--limit", type=int, help="Only the first N images")
+    p.add_argument("--out", help="Write the full report (per-image runs) as JSON")
+    args = p.parse_args()
+
+    labels = None
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = json.load(f)
+
+    report = run(args.image_dir, args.policies, labels, args.limit)
+    print(f"\n{report['files']} cheques, accuracy vs {report['reference']}")
+    print(f"{'policy':<16}{'img tok':>9}{'latency s':>11}{'prefill s':>11}"
+          f"{'cheque no':>11}{'accuracy':>10}")
+    for policy, s in report["summary"].items():
+        print(f"{policy:<16}" + "".join(f"{'-' if s[k] is None else s[k]:>{w}}" for k, w in
+                                         (("image_tokens", 9), ("latency_s", 11),
+                                          ("prefill_s", 11), ("cheque_no", 11),
+                                          ("accuracy", 10))))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
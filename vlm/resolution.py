@@ -0,0 +1,146 @@
+"""
+VLM Resolution Policy — one resize straight to the model's input grid
+=====================================================================
+The legacy extraction path LANCZOS-upscaled every cheque to 1600 px, ran
+autocontrast + sharpen, and then the VLM processor resized it again to its
+own grid. This module resizes the ORIGINAL image once, directly to the size
+the model's processor would produce, so the processor resize is a no-op and
+the number of image tokens is known up front.
+
+Grid specs come from the loaded processor when available (backend.input_spec)
+and fall back to per-family defaults:
+
+  fixed    — square encoder input (Gemma / SigLIP 896 × 896 → 256 tokens)
+  dynamic  — patch grid (Qwen2-VL: 14 px patches, 2 × 2 merge → 28 px per
+             token, bounded by min/max pixels); a token budget caps the grid
+
+Policies:
+  legacy          1600 px LANCZOS + autocontrast + sharpen (previous behaviour)
+  native          one resize to the model grid
+  native+enhance  native, then autocontrast + sharpen on the small image
+  budget:<N>      dynamic grids capped at N image tokens (fixed grids: native)
+
+Selected per call or by CHEQUE_RESOLUTION_POLICY (default "native").
+
+    from vlm.resolution import prepare
+    img_for_model, info = prepare(img, model_id)   # info: size, image_tokens, policy
+
+Benchmark: python -m vlm.bench_resolution
+"""
+
+import os
+
+from PIL import Image, ImageFilter, ImageOps
+
+POLICY_ENV = "CHEQUE_RESOLUTION_POLICY"
+DEFAULT_POLICY = "native"
+POLICIES = ("legacy", "native", "native+enhance", "budget:<N>")
+
+LEGACY_WIDTH = 1600
+DEFAULT_TOKEN_BUDGET = 1024     # dynamic grids: plenty for 300 DPI cheque text
+
+FAMILY_DEFAULTS = {
+    "qwen":  {"kind": "dynamic", "patch": 28, "min_pixels": 56 * 56,
+              "max_pixels": 12845056},
+    "gemma": {"kind": "fixed", "size": (896, 896), "tokens": 256},
+}
+
+
+# ── Grid specs ────────────────────────────────────────────────────────────────
+
+def spec_from_processor(processor) -> dict:
+    """Read the image grid of a Hugging Face / mlx_vlm processor, or None."""
+    ip = getattr(processor, "image_processor", None)
+    if ip is None:
+        return None
+    if hasattr(ip, "min_pixels") and hasattr(ip, "max_pixels"):
+        patch = getattr(ip, "patch_size", 14) * getattr(ip, "merge_size", 2)
+        return {"kind": "dynamic", "patch": patch,
+                "min_pixels": ip.min_pixels, "max_pixels": ip.max_pixels}
+    size = getattr(ip, "size", None)
+    if isinstance(size, dict) and "height" in size and "width" in size:
+        tokens = getattr(processor, "image_seq_length", None) or 256
+        return {"kind": "fixed", "size": (size["width"], size["height"]), "tokens": tokens}
+    return None
+
+
+def grid_spec(model_id: str, backend=None) -> dict:
+    """Input grid of `model_id` on `backend` (loaded processor first, then family)."""
+    if backend is not None:
+        spec = backend.input_spec(model_id)
+        if spec:
+            return spec
+    low = (model_id or "").lower()
+    for family, spec in FAMILY_DEFAULTS.items():
+        if family in low:
+            return spec
+    return None
+
+
+def _round_to(v: float, m: int) -> int:
+    return max(m, int(round(v / m)) * m)
+
+
+def target_size(size, spec: dict, token_budget: int = DEFAULT_TOKEN_BUDGET):
+    """(width, height, image_tokens) the model would encode for an image of `size`."""
+    w, h = size
+    if spec["kind"] == "fixed":
+        tw, th = spec["size"]
+        return tw, th, spec["tokens"]
+    p = spec["patch"]
+    max_px = min(spec["max_pixels"], token_budget * p * p) if token_budget else spec["max_pixels"]
+    scale = min(1.0, (max_px / float(w * h)) ** 0.5)
+    if w * h * scale * scale < spec["min_pixels"]:
+        scale = (spec["min_pixels"] / float(w * h)) ** 0.5
+    tw, th = _round_to(w * scale, p), _round_to(h * scale, p)
+    while tw * th > max_px and (tw > p or th > p):      # rounding overshoot
+        if tw >= th:
+            tw -= p
+        else:
+            th -= p
+    return tw, th, (tw // p) * (th // p)
+
+
+# ── Preparation ───────────────────────────────────────────────────────────────
+
+def _enhance(img: Image.Image) -> Image.Image:
+    return ImageOps.autocontrast(img).filter(ImageFilter.SHARPEN)
+
+
+def legacy(img: Image.Image) -> Image.Image:
+    """The previous `_enhance_for_ocr`: 1600 px LANCZOS, autocontrast, sharpen."""
+    out = img.convert("RGB")
+    if out.width < LEGACY_WIDTH:
+        scale = LEGACY_WIDTH / out.width
+        out = out.resize((LEGACY_WIDTH, int(out.height * scale)), Image.Resampling.LANCZOS)
+    return _enhance(out)
+
+
+def prepare(img: Image.Image, model_id: str, policy: str = None, backend=None):
+    """
+    Resize `img` for `model_id` under `policy`.
+    Returns (image, {"policy", "size", "image_tokens"}); image_tokens is None
+    when the model's grid is unknown.
+    """
+    policy = policy or os.environ.get(POLICY_ENV, DEFAULT_POLICY)
+    rgb = img.convert("RGB")
+    spec = grid_spec(model_id, backend)
+
+    if policy == "legacy" or spec is None:
+        out = legacy(rgb)
+        tokens = target_size(out.size, spec)[2] if spec else None
+        return out, {"policy": "legacy", "size": list(out.size), "image_tokens": tokens}
+
+    budget = DEFAULT_TOKEN_BUDGET
+    if policy.startswith("budget:"):
+        budget = int(policy.split(":", 1)[1])
+    elif policy not in ("native", "native+enhance"):
+        raise ValueError(f"unknown resolution policy {policy!r}; expected one of {POLICIES}")
+
+    tw, th, tokens = target_size(rgb.size, spec, budget)
+    if (tw, th) != rgb.size:
+        shrinking = tw * th < rgb.width * rgb.height
+        rgb = rgb.resize((tw, th), Image.BOX if shrinking else Image.BICUBIC)
+    if policy == "native+enhance":
+        rgb = _enhance(rgb)
+    return rgb, {"policy": policy, "size": [tw, th], "image_tokens": tokens}
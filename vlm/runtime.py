@@ -0,0 +1,505 @@
+"""
+VLM Runtime — in-memory model invocation
+=========================================
+One place that owns the mlx_vlm models used by agent_studio (Gemma 4) and
+detection/ocr_extractor (Qwen2-VL OCR hint).
+
+What it removes from every model call, compared with the old
+NamedTemporaryFile flow:
+  - PNG encode of the (often 1600 px wide) cheque image
+  - disk write + re-read + PNG decode inside mlx_vlm
+  - load_config(model_id) — a config.json read + parse per call
+  - apply_chat_template for prompts that were already formatted once
+
+Instead:
+  - model, processor and config are loaded once per model id (`load`)
+  - formatted chat prompts are cached per (prompt, num_images)
+  - decoded PIL images are passed straight to mlx_vlm.generate
+  - `stream(..., prefix=...)` keeps the prefilled KV state of a
+    long static prompt prefix and only prefill the image + per-request text
+  - `Conversation` asks several questions about one image and keeps the KV
+    cache between turns, so the image is encoded once
+
+`stats()` reports per-call preparation time of `stream`; `measure_legacy_overhead()`
+times the removed tempfile/config path for a given image so the saving can
+be reported per call.
+
+Usage:
+    from vlm import runtime
+    text = "".join(runtime.stream(GEMMA_ID, pil_img, prompt, max_tokens=512))
+
+CLI:
+    python -m vlm.runtime path/to/cheque.jpg      # legacy-overhead report
+"""
+
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+_BUNDLES: dict = {}
+_LOAD_LOCK = threading.Lock()
+_TEMPLATE_CACHE_SIZE = 64
+
+_STATS = {"calls": 0, "prep_ms": 0.0, "template_hits": 0, "template_misses": 0}
+
+
+# ── Loading ───────────────────────────────────────────────────────────────────
+
+def load(model_id: str) -> dict:
+    """Load model, processor and config for `model_id` once; return the bundle."""
+    bundle = _BUNDLES.get(model_id)
+    if bundle is not None:
+        return bundle
+    with _LOAD_LOCK:
+        bundle = _BUNDLES.get(model_id)
+        if bundle is None:
+            from mlx_vlm import load as _mlx_load
+            from mlx_vlm.utils import load_config
+            model, processor = _mlx_load(model_id)
+            bundle = {
+                "model":     model,
+                "processor": processor,
+                "config":    load_config(model_id),
+                "templates": OrderedDict(),
+            }
+            _BUNDLES[model_id] = bundle
+    return bundle
+
+
+def is_loaded(model_id: str) -> bool:
+    return model_id in _BUNDLES
+
+
+# ── Prompt / image preparation ────────────────────────────────────────────────
+
+def chat_prompt(bundle: dict, prompt: str, num_images: int = 1) -> str:
+    """Chat-template `prompt` for the bundle's model, cached per prompt."""
+    key = (prompt, num_images)
+    cache = bundle["templates"]
+    fmt = cache.get(key)
+    if fmt is not None:
+        cache.move_to_end(key)
+        _STATS["template_hits"] += 1
+        return fmt
+    from mlx_vlm.prompt_utils import apply_chat_template
+    fmt = apply_chat_template(bundle["processor"], bundle["config"], prompt, num_images=num_images)
+    cache[key] = fmt
+    if len(cache) > _TEMPLATE_CACHE_SIZE:
+        cache.popitem(last=False)
+    _STATS["template_misses"] += 1
+    return fmt
+
+
+def as_model_image(img: Image.Image) -> Image.Image:
+    """Decoded RGB image handed directly to the processor (no disk round trip)."""
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+# ── Inference ─────────────────────────────────────────────────────────────────
+
+def _result_timings(res, wall_s: float) -> dict:
+    """Split an mlx_vlm GenerationResult into prefill / decode seconds."""
+    p_tok = int(getattr(res, "prompt_tokens", 0) or 0)
+    p_tps = float(getattr(res, "prompt_tps", 0) or 0)
+    g_tok = int(getattr(res, "generation_tokens", 0) or 0)
+    prefill = p_tok / p_tps if p_tps else 0.0
+    return {
+        "prompt_tokens":     p_tok,
+        "generation_tokens": g_tok,
+        "prefill_s":         round(prefill, 3),
+        "decode_s":          round(max(0.0, wall_s - prefill), 3),
+    }
+
+
+# ── Prompt-prefix KV cache ────────────────────────────────────────────────────
+#
+# Long static instructions (the extraction field rules) are placed BEFORE the
+# image in the user turn, so the chat-formatted text up to the end of the
+# rules is identical for every cheque. Its KV state is prefilled once per
+# (model, prefix) and deep-copied into each request; only the image tokens and
+# the per-cheque text are prefilled after that.
+
+_PREFIX_CACHE_SIZE = 4
+_prefix_disabled: set = set()
+
+
+def _split_prompt(bundle: dict, static: str, dynamic: str):
+    """Chat-format [static text, image, dynamic text]; split after `static`."""
+    processor = bundle["processor"]
+    messages = [{"role": "user", "content": [
+        {"type": "text", "text": static},
+        {"type": "image"},
+        {"type": "text", "text": dynamic},
+    ]}]
+    fmt = processor.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
+    cut = fmt.index(static) + len(static)
+    return fmt[:cut], fmt[cut:]
+
+
+def _make_cache(model):
+    try:
+        from mlx_vlm.models.cache import make_prompt_cache
+        return make_prompt_cache(model.language_model)
+    except ImportError:
+        return model.language_model.make_cache()
+
+
+def _prefix_entry(bundle: dict, prefix_text: str) -> dict:
+    """Prefilled KV cache for `prefix_text` (built once, LRU per bundle)."""
+    caches = bundle.setdefault("prefixes", OrderedDict())
+    entry = caches.get(prefix_text)
+    if entry is not None:
+        caches.move_to_end(prefix_text)
+        return entry
+
+    import mlx.core as mx
+    tokenizer = getattr(bundle["processor"], "tokenizer", bundle["processor"])
+    ids = tokenizer.encode(prefix_text, add_special_tokens=False)
+    t = time.perf_counter()
+    cache = _make_cache(bundle["model"])
+    bundle["model"].language_model(mx.array([ids]), cache=cache)
+    mx.eval([c.state for c in cache])
+    entry = {"cache": cache, "tokens": len(ids),
+             "build_s": round(time.perf_counter() - t, 3)}
+    caches[prefix_text] = entry
+    if len(caches) > _PREFIX_CACHE_SIZE:
+        caches.popitem(last=False)
+    return entry
+
+
+def _eos_ids(processor) -> set:
+    tokenizer = getattr(processor, "tokenizer", processor)
+    ids = {tokenizer.eos_token_id}
+    for tok in ("<end_of_turn>", "<turn|>", "<|im_end|>"):
+        tid = tokenizer.convert_tokens_to_ids(tok)
+        if isinstance(tid, int) and tid != tokenizer.unk_token_id:
+            ids.add(tid)
+    return {i for i in ids if i is not None}
+
+
+def _stream_cached(bundle: dict, img: Image.Image, static: str, dynamic: str,
+                   max_tokens: int, temperature: float, usage: dict):
+    """Yield text deltas of a prefix-cached generation; fill `usage` at the end."""
+    import copy
+    import mlx.core as mx
+    try:
+        from mlx_vlm.generate import generate_step
+    except ImportError:
+        from mlx_vlm.utils import generate_step
+
+    t_prep = time.perf_counter()
+    prefix_text, suffix_text = _split_prompt(bundle, static, dynamic)
+    _STATS["prep_ms"] += (time.perf_counter() - t_prep) * 1000
+    entry = _prefix_entry(bundle, prefix_text)
+    processor = bundle["processor"]
+    tokenizer = getattr(processor, "tokenizer", processor)
+
+    t0 = time.perf_counter()
+    inputs = processor(text=[suffix_text], images=[as_model_image(img)],
+                       return_tensors="np", add_special_tokens=False)
+    input_ids = mx.array(inputs["input_ids"])
+    pixel_values = mx.array(inputs["pixel_values"])
+    mask = mx.array(inputs["attention_mask"]) if "attention_mask" in inputs else None
+    cache = copy.deepcopy(entry["cache"])
+
+    eos = _eos_ids(processor)
+    tokens, t_first, sent = [], None, ""
+    try:
+        for tok, _ in generate_step(input_ids, bundle["model"], pixel_values, mask,
+                                    max_tokens=max_tokens, temperature=temperature,
+                                    prompt_cache=cache):
+            tok = tok.item() if hasattr(tok, "item") else int(tok)
+            if t_first is None:
+                t_first = time.perf_counter()
+            if tok in eos:
+                break
+            tokens.append(tok)
+            text = tokenizer.decode(tokens, skip_special_tokens=True)
+            if not text.endswith("\ufffd") and len(text) > len(sent):   # wait for full UTF-8
+                yield text[len(sent):]
+                sent = text
+        text = tokenizer.decode(tokens, skip_special_tokens=True)
+        if len(text) > len(sent):
+            yield text[len(sent):]
+    finally:
+        # Also runs when a stop criterion closes the stream early
+        t_end = time.perf_counter()
+        t_first = t_first or t_end
+        usage.update({
+            "prompt_tokens":     entry["tokens"] + int(input_ids.shape[1]),
+            "cached_tokens":     entry["tokens"],
+            "generation_tokens": len(tokens),
+            "prefill_s":         round(t_first - t0, 3),
+            "decode_s":          round(t_end - t_first, 3),
+        })
+
+
+def _stream_full(bundle: dict, img: Image.Image, prompt: str,
+                 max_tokens: int, temperature: float, usage: dict):
+    """Yield text deltas of a plain (full-prefill) mlx_vlm generation."""
+    from mlx_vlm import stream_generate
+
+    t0 = time.perf_counter()
+    fmt = chat_prompt(bundle, prompt, num_images=1)
+    image = as_model_image(img)
+    _STATS["prep_ms"] += (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    last, n = None, 0
+    try:
+        for res in stream_generate(bundle["model"], bundle["processor"], fmt,
+                                   [image], max_tokens=max_tokens,
+                                   temperature=temperature):
+            last, n = res, n + 1
+            delta = res.text if hasattr(res, "text") else str(res)
+            if delta:
+                yield delta
+    finally:
+        usage["cached_tokens"] = 0
+        usage.update(_result_timings(last, time.perf_counter() - t0))
+        usage["generation_tokens"] = usage["generation_tokens"] or n
+
+
+def stream(model_id: str, img: Image.Image, prompt: str, max_tokens: int = 512,
+           temperature: float = 0.1, prefix: str = None, usage: dict = None):
+    """
+    Yield generated text deltas as they are decoded. The logical prompt is
+    `prefix + prompt`; with `prefix` its KV state is reused across calls
+    (failures before the first token disable the cached path for that model
+    and fall back to a full prefill). `usage`, if given, is filled with token
+    counts and prefill / decode seconds when the stream ends.
+    """
+    usage = {} if usage is None else usage
+    t0 = time.perf_counter()
+    bundle = load(model_id)
+    _STATS["prep_ms"] += (time.perf_counter() - t0) * 1000
+    _STATS["calls"] += 1
+    if prefix and model_id not in _prefix_disabled:
+        started = False
+        try:
+            for delta in _stream_cached(bundle, img, prefix, prompt,
+                                        max_tokens, temperature, usage):
+                started = True
+                yield delta
+            return
+        except Exception as e:
+            if started:
+                raise
+            _prefix_disabled.add(model_id)
+            print(f"[VLM] Prefix cache unavailable for {model_id}: {e} — using full prefill")
+    yield from _stream_full(bundle, img, (prefix or "") + prompt, max_tokens, temperature, usage)
+
+
+# ── Multi-turn conversation over one image encoding ───────────────────────────
+#
+# The first turn prefills [image, prompt] and decodes the answer; the KV cache
+# then holds the encoded image, the prompt and every generated token. A later
+# turn only prefills the chat markup that closes the answer plus the new user
+# text, so the vision tower runs once per cheque. If the continuation cannot
+# be derived (template rewrote the answer, cache not trimmable, model rejects
+# text-only input on a warm cache) the turn falls back to a full prefill of the
+# whole conversation, image included.
+
+_conversation_disabled: set = set()
+
+
+def _trim_cache(cache: list, keep: int) -> bool:
+    """Drop cached positions beyond `keep`; False if any layer cannot."""
+    for c in cache:
+        extra = getattr(c, "offset", keep) - keep
+        if extra <= 0:
+            continue
+        if not (hasattr(c, "trim") and getattr(c, "is_trimmable", lambda: True)()):
+            return False
+        c.trim(extra)
+    return True
+
+
+class Conversation:
+    """Multi-turn chat about one image that keeps its KV cache between turns."""
+
+    def __init__(self, model_id: str, img: Image.Image, temperature: float = 0.1):
+        self.model_id = model_id
+        self.bundle = load(model_id)
+        self.image = as_model_image(img)
+        self.temperature = temperature
+        self.messages = []
+        self.cache = None
+        self.cached_text = ""       # chat-formatted text the cache corresponds to
+        self.image_encodes = 0
+
+    def _format(self) -> str:
+        return self.bundle["processor"].apply_chat_template(
+            self.messages, add_generation_prompt=True, tokenize=False)
+
+    def _inputs(self, fmt: str):
+        """(input_ids, pixel_values, mask, cached_tokens) for the next turn."""
+        import mlx.core as mx
+        processor = self.bundle["processor"]
+        tokenizer = getattr(processor, "tokenizer", processor)
+        if self.cache is not None and self.model_id not in _conversation_disabled \
+                and fmt.startswith(self.cached_text):
+            ids = tokenizer.encode(fmt[len(self.cached_text):], add_special_tokens=False)
+            return mx.array([ids]), None, None, self.cache[0].offset
+        # Full prefill of the conversation so far, image included
+        self.cache = _make_cache(self.bundle["model"])
+        self.image_encodes += 1
+        inputs = processor(text=[fmt], images=[self.image], return_tensors="np",
+                           add_special_tokens=False)
+        mask = mx.array(inputs["attention_mask"]) if "attention_mask" in inputs else None
+        return mx.array(inputs["input_ids"]), mx.array(inputs["pixel_values"]), mask, 0
+
+    def stream(self, prompt: str, max_tokens: int = 512, usage: dict = None):
+        """Ask `prompt` as the next user turn; yield the answer's text deltas."""
+        usage = {} if usage is None else usage
+        warm = self.cache is not None and self.model_id not in _conversation_disabled
+        started = False
+        try:
+            for delta in self._turn(prompt, max_tokens, usage):
+                started = True
+                yield delta
+            return
+        except Exception as e:
+            if started or not warm:
+                raise
+            # Warm-cache continuation rejected: redo this turn from scratch
+            _conversation_disabled.add(self.model_id)
+            self.messages.pop()
+            usage.clear()
+            print(f"[VLM] Conversation cache unavailable for {self.model_id}: {e} "
+                  f"— full prefill per turn")
+        yield from self._turn(prompt, max_tokens, usage)
+
+    def _turn(self, prompt: str, max_tokens: int, usage: dict):
+        try:
+            from mlx_vlm.generate import generate_step
+        except ImportError:
+            from mlx_vlm.utils import generate_step
+
+        processor = self.bundle["processor"]
+        tokenizer = getattr(processor, "tokenizer", processor)
+        content = [{"type": "text", "text": prompt}]
+        if not self.messages:
+            content.insert(0, {"type": "image"})
+        self.messages.append({"role": "user", "content": content})
+        fmt = self._format()
+
+        t0 = time.perf_counter()
+        input_ids, pixel_values, mask, cached = self._inputs(fmt)
+        eos = _eos_ids(processor)
+        tokens, t_first, sent, ok = [], None, "", False
+        try:
+            for tok, _ in generate_step(input_ids, self.bundle["model"], pixel_values, mask,
+                                        max_tokens=max_tokens, temperature=self.temperature,
+                                        prompt_cache=self.cache):
+                tok = tok.item() if hasattr(tok, "item") else int(tok)
+                if t_first is None:
+                    t_first = time.perf_counter()
+                if tok in eos:
+                    break
+                tokens.append(tok)
+                text = tokenizer.decode(tokens, skip_special_tokens=True)
+                if not text.endswith("\ufffd") and len(text) > len(sent):   # wait for full UTF-8
+                    yield text[len(sent):]
+                    sent = text
+            text = tokenizer.decode(tokens, skip_special_tokens=True)
+            if len(text) > len(sent):
+                yield text[len(sent):]
+            ok = True
+        except GeneratorExit:
+            ok = True               # closed early by a stop criterion
+            raise
+        finally:
+            t_end = time.perf_counter()
+            t_first = t_first or t_end
+            prompt_len = cached + int(input_ids.shape[1])
+            usage.update({
+                "prompt_tokens":     prompt_len,
+                "cached_tokens":     cached,
+                "generation_tokens": len(tokens),
+                "prefill_s":         round(t_first - t0, 3),
+                "decode_s":          round(t_end - t_first, 3),
+                "image_encodes":     self.image_encodes,
+            })
+            if ok:
+                self._close_turn(fmt, tokens, prompt_len)
+            else:
+                self.cache = None   # state unknown after a failed step
+
+    def _close_turn(self, fmt: str, tokens: list, prompt_len: int):
+        """Record the answer; keep the cache only if it matches the transcript."""
+        tokenizer = getattr(self.bundle["processor"], "tokenizer", self.bundle["processor"])
+        answer = tokenizer.decode(tokens, skip_special_tokens=True)
+        self.messages.append({"role": "assistant", "content": [{"type": "text", "text": answer}]})
+        if self.cache is None or not _trim_cache(self.cache, prompt_len + len(tokens)):
+            self.cache = None
+            return
+        self.cached_text = fmt + answer
+        probe = self.bundle["processor"].apply_chat_template(
+            self.messages, add_generation_prompt=False, tokenize=False)
+        if not probe.startswith(self.cached_text):
+            self.cache = None       # template rewrote the answer; re-prefill next turn
+
+
+# ── Overhead accounting ───────────────────────────────────────────────────────
+
+def measure_legacy_overhead(img: Image.Image, model_id: str = None) -> dict:
+    """
+    Time the per-call work the old tempfile flow did for `img`:
+    PNG encode + write, re-read + decode, and (if given) load_config.
+    """
+    out = {}
+    t = time.perf_counter()
+    tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
+    try:
+        img.save(tmp.name)
+        out["png_write_ms"] = (time.perf_counter() - t) * 1000
+
+        t = time.perf_counter()
+        with Image.open(tmp.name) as im:
+            im.convert("RGB").load()
+        out["png_read_ms"] = (time.perf_counter() - t) * 1000
+    finally:
+        tmp.close()
+        os.unlink(tmp.name)
+
+    if model_id:
+        try:
+            from mlx_vlm.utils import load_config
+            t = time.perf_counter()
+            load_config(model_id)
+            out["load_config_ms"] = (time.perf_counter() - t) * 1000
+        except Exception:
+            pass
+
+    out = {k: round(v, 2) for k, v in out.items()}
+    out["total_ms"] = round(sum(out.values()), 2)
+    return out
+
+
+def stats() -> dict:
+    """Per-call preparation cost of the in-memory path (counted by `stream`)."""
+    calls = _STATS["calls"]
+    return {
+        "calls":            calls,
+        "prep_ms_per_call": round(_STATS["prep_ms"] / calls, 3) if calls else 0.0,
+        "template_hits":    _STATS["template_hits"],
+        "template_misses":  _STATS["template_misses"],
+        "models_loaded":    sorted(_BUNDLES),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    p = argparse.ArgumentParser(description="Report the per-call overhead removed by the in-memory VLM path")
+    p.add_argument("image", help="Cheque image")
+    p.add_argument("--model", default=None, help="Model id for the load_config timing")
+    args = p.parse_args()
+
+    report = measure_legacy_overhead(Image.open(args.image).convert("RGB"), args.model)
+    print(json.dumps({"removed_per_call_ms": report}, indent=2))
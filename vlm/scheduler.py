@@ -0,0 +1,360 @@
+"""
+VLM Scheduler — admission-control queue in front of a backend
+=============================================================
+Concurrent requests (/api/extract/stream, /api/reason/stream,
+/api/cheque/extract) used to call the backend from their own threads and
+contended on the one resident model. The scheduler owns the model instead:
+requests are queued, and a single loop thread advances the active set one
+step at a time, re-forming it at every step:
+
+  admit   — FIFO queue → active set while len(active) < max_active and the
+            set's token estimate (prompt + image + max_tokens) fits the
+            token budget; newly admitted requests are started
+  step    — one step (one text delta) for every active request, in turn
+  retire  — finished / cancelled / failed requests leave immediately,
+            freeing their slot and budget for the next queued request
+
+Each request gets its own stream of text deltas (same contract as
+VLMBackend.stream, stop criteria included); closing it cancels the request.
+
+This is admission control and round-robin interleaving, NOT batching: one
+queued model call is in flight at a time (mlx streams decode inside the
+loop thread; each cpu stream's generate() thread waits for its reader
+before every decode step), so total throughput stays that of sequential
+calls. Multi-turn conversations and detect() bypass the queue.
+What it buys is bounded memory and fairness — a short answer no longer
+waits behind a long one.
+
+Enable for the app with CHEQUE_VLM_SCHEDULER=1 (CHEQUE_VLM_MAX_ACTIVE,
+CHEQUE_VLM_TOKEN_BUDGET). get_backend() then returns a ScheduledBackend.
+
+Load test (stub backend, no weights):
+    python -m vlm.scheduler --load-test
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from vlm.backends import StubBackend, VLMBackend
+from vlm.stopping import guard
+
+SCHEDULER_ENV    = "CHEQUE_VLM_SCHEDULER"
+MAX_ACTIVE_ENV   = "CHEQUE_VLM_MAX_ACTIVE"
+TOKEN_BUDGET_ENV = "CHEQUE_VLM_TOKEN_BUDGET"
+
+DEFAULT_MAX_ACTIVE   = 8
+DEFAULT_TOKEN_BUDGET = 16384
+DEFAULT_IMAGE_TOKENS = 256          # estimate when the model's grid is unknown
+
+_DONE = object()
+
+
+# ── Requests ──────────────────────────────────────────────────────────────────
+
+class _Request:
+    def __init__(self, image, prompt, max_tokens, model, prefix, usage, cost):
+        self.image = image
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.model = model
+        self.prefix = prefix
+        self.usage = usage
+        self.cost = cost
+        self.out = queue.Queue()
+        self.state = None
+        self.cancelled = False
+        self.t_submit = time.perf_counter()
+
+
+# ── Engine ────────────────────────────────────────────────────────────────────
+
+class StreamEngine:
+    """Each active request is a backend `_raw_stream`, advanced one delta per step."""
+
+    def __init__(self, backend: VLMBackend):
+        self.backend = backend
+
+    def start(self, reqs: list) -> list:
+        """Start each request; one exception (or None) per request, in order."""
+        errors = []
+        for r in reqs:
+            try:
+                r.state = self.backend._raw_stream(r.image, r.prompt, r.max_tokens,
+                                                   r.model, r.prefix, r.usage)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    def step(self, reqs: list) -> list:
+        """One delta per request; None marks a finished one, an exception a failed one."""
+        out = []
+        for r in reqs:
+            try:
+                out.append(next(r.state))
+            except StopIteration:
+                out.append(None)
+            except Exception as e:
+                out.append(e)
+        return out
+
+    def stop(self, req):
+        close = getattr(req.state, "close", None)
+        if close:
+            close()
+
+
+# ── Scheduler ─────────────────────────────────────────────────────────────────
+
+class Scheduler:
+    """Queue + step-interleaving loop over one backend."""
+
+    def __init__(self, backend: VLMBackend, max_active: int = None, token_budget: int = None,
+                 engine: StreamEngine = None):
+        self.backend = backend
+        self.max_active = max_active or int(os.environ.get(MAX_ACTIVE_ENV, DEFAULT_MAX_ACTIVE))
+        self.token_budget = token_budget or int(os.environ.get(TOKEN_BUDGET_ENV,
+                                                               DEFAULT_TOKEN_BUDGET))
+        self.engine = engine or StreamEngine(backend)
+        self._queue = deque()
+        self._active = []
+        self._cv = threading.Condition()
+        self.stats = {"submitted": 0, "completed": 0, "cancelled": 0, "failed": 0,
+                      "steps": 0, "max_active_seen": 0, "queue_s": 0.0}
+        self._thread = threading.Thread(target=self._loop, name="vlm-scheduler", daemon=True)
+        self._thread.start()
+
+    def _cost(self, prompt, prefix, max_tokens, model) -> int:
+        """Token estimate of one request: text (≈4 chars/token) + image + output."""
+        image_tokens = DEFAULT_IMAGE_TOKENS
+        spec = self.backend.input_spec(model) if model else None
+        if spec and spec.get("kind") == "fixed":
+            image_tokens = spec["tokens"]
+        return (len(prefix or "") + len(prompt)) // 4 + image_tokens + max_tokens
+
+    def submit(self, image, prompt: str, max_tokens: int = 512, model: str = None,
+               prefix: str = None, usage: dict = None):
+        """Queue one request; yield its text deltas as they are decoded."""
+        usage = {} if usage is None else usage
+        req = _Request(image, prompt, max_tokens, model, prefix, usage,
+                       min(self.token_budget, self._cost(prompt, prefix, max_tokens, model)))
+        with self._cv:
+            self._queue.append(req)
+            self.stats["submitted"] += 1
+            self._cv.notify()
+        return self._consume(req)
+
+    def _consume(self, req):
+        finished = False
+        try:
+            while True:
+                item = req.out.get()
+                if item is _DONE:
+                    finished = True
+                    return
+                if isinstance(item, BaseException):
+                    finished = True
+                    raise item
+                yield item
+        finally:
+            if not finished:
+                with self._cv:
+                    req.cancelled = True
+                    self._cv.notify()
+
+    # ── Loop ──────────────────────────────────────────────────────────────────
+
+    def _admit(self) -> list:
+        used = sum(r.cost for r in self._active)
+        admitted = []
+        while self._queue and len(self._active) < self.max_active:
+            req = self._queue[0]
+            if req.cancelled:
+                self._queue.popleft()
+                self.stats["cancelled"] += 1
+                req.out.put(_DONE)
+                continue
+            if self._active and used + req.cost > self.token_budget:
+                break
+            self._queue.popleft()
+            used += req.cost
+            req.usage["queue_s"] = round(time.perf_counter() - req.t_submit, 3)
+            self.stats["queue_s"] += req.usage["queue_s"]
+            self._active.append(req)
+            admitted.append(req)
+        return admitted
+
+    def _retire(self, req, error: BaseException = None):
+        self._active.remove(req)
+        if req.cancelled:
+            self.engine.stop(req)
+            self.stats["cancelled"] += 1
+        elif error is not None:
+            self.engine.stop(req)
+            self.stats["failed"] += 1
+            req.out.put(error)
+            return
+        else:
+            self.stats["completed"] += 1
+        req.out.put(_DONE)
+
+    def _loop(self):
+        while True:
+            with self._cv:
+                while not self._queue and not self._active:
+                    self._cv.wait()
+                for req in [r for r in self._active if r.cancelled]:
+                    self._retire(req)
+                admitted = self._admit()
+                active = list(self._active)
+            if not active:
+                continue
+            self.stats["max_active_seen"] = max(self.stats["max_active_seen"], len(active))
+
+            if admitted:
+                # A request that fails to start fails alone; the others go on
+                failed = [(r, e) for r, e in zip(admitted, self.engine.start(admitted))
+                          if e is not None]
+                if failed:
+                    with self._cv:
+                        for req, e in failed:
+                            self._retire(req, e)
+                    active = [r for r in active if all(r is not f for f, _ in failed)]
+                    if not active:
+                        continue
+            try:
+                deltas = self.engine.step(active)
+            except Exception as e:
+                with self._cv:
+                    for req in active:
+                        self._retire(req, e)
+                continue
+
+            self.stats["steps"] += 1
+            with self._cv:
+                for req, delta in zip(active, deltas):
+                    if isinstance(delta, Exception):
+                        self._retire(req, delta)
+                    elif req.cancelled or delta is None:
+                        self._retire(req)
+                    elif delta:
+                        req.out.put(delta)
+
+
+# ── Backend wrapper ───────────────────────────────────────────────────────────
+
+class ScheduledBackend(VLMBackend):
+    """A backend whose generation calls all go through one Scheduler."""
+
+    def __init__(self, inner: VLMBackend, **kw):
+        self.inner = inner
+        self.name = inner.name
+        self.scheduler = Scheduler(inner, **kw)
+
+    def load_generator(self, model):
+        return self.inner.load_generator(model)
+
+    def load_detector(self):
+        return self.inner.load_detector()
+
+    def input_spec(self, model):
+        return self.inner.input_spec(model)
+
+    def _raw_stream(self, image, prompt, max_tokens, model, prefix, usage):
+        return self.scheduler.submit(image, prompt, max_tokens, model, prefix, usage)
+
+    def batch(self, requests, model=None):
+        """Submit every request at once so they are interleaved step by step."""
+        streams = []
+        for r in requests:
+            usage = {}
+            crit = list(r.get("criteria") or [])
+            max_tokens = r.get("max_tokens", 64)
+            raw = self.scheduler.submit(r["image"], r["prompt"], max_tokens, model, None, usage)
+            streams.append((guard(raw, crit, usage, max_tokens), usage))
+        return [{"text": "".join(s), **usage} for s, usage in streams]
+
+    def conversation(self, image, model=None):
+        # Multi-turn state (KV cache) belongs to one request; not queued
+        return self.inner.conversation(image, model)
+
+    def detect(self, image, query, task="segmentation", max_dimension=1024, max_new_tokens=100):
+        return self.inner.detect(image, query, task, max_dimension, max_new_tokens)
+
+
+# ── Load test ─────────────────────────────────────────────────────────────────
+
+def _load_test(concurrency_levels, requests_per_client: int, latency_s: float,
+               max_active: int, prompt: str = "Return ONLY one valid JSON object"):
+    """
+    Closed-loop clients against the stub: direct (one request at a time on
+    the model) and through the scheduler. Throughput is the same; the queue
+    only changes who waits.
+    """
+    import statistics
+
+    def run(submit, concurrency):
+        lat = []
+        lock = threading.Lock()
+
+        def client():
+            for _ in range(requests_per_client):
+                t = time.perf_counter()
+                "".join(submit())
+                with lock:
+                    lat.append(time.perf_counter() - t)
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        wall = time.perf_counter() - t0
+        lat.sort()
+        return {"rps": round(len(lat) / wall, 2),
+                "p50_s": round(statistics.median(lat), 2),
+                "p95_s": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 2)}
+
+    print(f"[scheduler] load test: stub {latency_s}s/request, max_active={max_active}, "
+          f"{requests_per_client} requests per client")
+    print(f"{'clients':>8} {'direct rps':>11} {'p50 s':>7} {'p95 s':>7} "
+          f"{'queued rps':>11} {'p50 s':>7} {'p95 s':>7}")
+
+    def stub():
+        return StubBackend(path="/nonexistent/stub.json", generate_latency_s=latency_s,
+                           detect_latency_s=0.0)
+
+    for c in concurrency_levels:
+        direct_stub = stub()
+        model_lock = threading.Lock()       # one resident model, as before
+
+        def direct():
+            with model_lock:
+                yield from direct_stub.stream(None, prompt, max_tokens=64, model="stub-model")
+
+        queued = ScheduledBackend(stub(), max_active=max_active)
+        d = run(direct, c)
+        q = run(lambda: queued.stream(None, prompt, max_tokens=64, model="stub-model"), c)
+        print(f"{c:>8} {d['rps']:>11} {d['p50_s']:>7} {d['p95_s']:>7} "
+              f"{q['rps']:>11} {q['p50_s']:>7} {q['p95_s']:>7}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="VLM request queue")
+    p.add_argument("--load-test", action="store_true",
+                   help="Stub load test: direct vs queued through the scheduler")
+    p.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--requests", type=int, default=4, help="Requests per client")
+    p.add_argument("--latency", type=float, default=0.4, help="Stub seconds per request")
+    p.add_argument("--max-active", type=int, default=DEFAULT_MAX_ACTIVE)
+    args = p.parse_args()
+    if args.load_test:
+        _load_test(args.clients, args.requests, args.latency, args.max_active)
+    else:
+        p.print_help()
@@ -0,0 +1,224 @@
+"""
+VLM Stop Criteria — generation-time termination
+===============================================
+Criteria run on the decoded text after every streamed delta. The first one to
+fire ends the stream, and closing the backend's token generator stops
+decoding immediately, so no tokens are spent past the useful output.
+
+  BalancedJSON    — the first top-level JSON object has closed ("json_complete")
+  StopSequences   — any of the given strings appeared       ("stop_sequence")
+  NGramRepetition — runaway loops: the same line repeated, or one word n-gram
+                    recurring inside a short tail window    ("repetition");
+                    the text is cut back to where the repetition restarts,
+                    so one copy of the line / phrase is kept
+
+`guard(deltas, criteria, usage, max_tokens)` wraps a backend stream and sets
+usage["stop_reason"] to the criterion's reason, or to "max_tokens" / "eos"
+when decoding ended on its own.
+
+Each criterion is exercised against the stub backend in tests/test_stopping.py.
+"""
+
+import re
+
+STOP_REASONS = ("eos", "max_tokens", "stop_sequence", "json_complete", "repetition")
+
+
+# ── Criteria ──────────────────────────────────────────────────────────────────
+
+class StopCriterion:
+    """`check(text)` → length of `text` to keep, or None to continue."""
+
+    reason = "stop"
+    hold = 0        # trailing chars not yet safe to emit (partial match)
+
+    def check(self, text: str):
+        raise NotImplementedError
+
+    def safe_len(self, text: str) -> int:
+        """Length of `text` that a later `check` can no longer cut off."""
+        return len(text) - self.hold
+
+
+class BalancedJSON(StopCriterion):
+    """Stop right after the closing brace of the first top-level JSON object."""
+
+    reason = "json_complete"
+
+    def __init__(self):
+        self.pos = 0
+        self.depth = 0
+        self.in_str = False
+        self.escape = False
+
+    def check(self, text):
+        i = self.pos
+        while i < len(text):
+            c = text[i]
+            if self.in_str:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_str = False
+            elif c == '"' and self.depth:
+                self.in_str = True
+            elif c == "{":
+                self.depth += 1
+            elif c == "}" and self.depth:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.pos = i + 1
+                    return i + 1
+            i += 1
+        self.pos = i
+        return None
+
+
+class StopSequences(StopCriterion):
+    """Stop before the earliest occurrence of any stop string."""
+
+    reason = "stop_sequence"
+
+    def __init__(self, stop):
+        self.stop = [s for s in (stop or []) if s]
+        self.hold = max((len(s) for s in self.stop), default=1) - 1
+        self.pos = 0
+
+    def check(self, text):
+        start = max(0, self.pos - self.hold)
+        hits = [i for i in (text.find(s, start) for s in self.stop) if i != -1]
+        self.pos = len(text)
+        return min(hits) if hits else None
+
+
+class NGramRepetition(StopCriterion):
+    """
+    Abort degenerate output:
+      - the last non-empty line repeated `max_line_repeats` times in a row, or
+      - the last `n` words occurring `max_repeats` times in the last `window` words.
+    Text from where a suspected loop restarts (the second copy of the line /
+    n-gram) is held back, and a firing check cuts the output there.
+    """
+
+    reason = "repetition"
+
+    def __init__(self, n: int = 6, max_repeats: int = 4, window: int = 200,
+                 max_line_repeats: int = 4):
+        self.n = n
+        self.max_repeats = max_repeats
+        self.window = window
+        self.max_line_repeats = max_line_repeats
+        self._checked = 0
+        self._loop_start = None     # offset where a suspected loop restarts
+        self._safe = 0              # text before this offset can no longer be cut
+
+    def _line_loop(self, text):
+        """(run length of the last complete line, offset where its second copy starts)."""
+        lines = [(m.group().strip(), m.end() - 1)
+                 for m in re.finditer(r"[^\n]*\n", text) if m.group().strip()]
+        if not lines:
+            return 0, None
+        last, run, first_end = lines[-1][0], 0, None
+        for line, end in reversed(lines):
+            if line != last:
+                break
+            run, first_end = run + 1, end
+        return run, first_end
+
+    def _ngram_loop(self, text):
+        """(occurrences of the last `n` words in the window, offset before the second one,
+        offset before the last `n` words, word count)."""
+        base = max(0, len(text) - self.window * 12)
+        spans = [(m.group(), m.end()) for m in re.finditer(r"\S+", text[base:])][-self.window:]
+        words = [w for w, _ in spans]
+        if len(words) <= self.n:
+            return 0, None, base, len(words)
+        tail = base + spans[-self.n - 1][1]
+        last = tuple(words[-self.n:])
+        hits = [i for i in range(len(words) - self.n + 1) if tuple(words[i:i + self.n]) == last]
+        if len(hits) < 2:
+            return len(hits), None, tail, len(words)
+        return len(hits), base + spans[hits[1] - 1][1], tail, len(words)
+
+    def check(self, text):
+        # Only re-check once a word boundary has been added since last time
+        if not re.search(r"\s", text[self._checked:]):
+            return None
+        self._checked = len(text)
+        run, line_start = self._line_loop(text)
+        grams, gram_start, tail, n_words = self._ngram_loop(text)
+        starts = [o for o in (line_start if run >= 2 else None, gram_start) if o is not None]
+        if starts:
+            start = min(starts)
+            self._loop_start = start if self._loop_start is None else min(self._loop_start, start)
+        else:
+            self._loop_start = None
+        if self._loop_start is not None and (
+                run >= self.max_line_repeats
+                or (grams >= self.max_repeats and n_words >= self.n * self.max_repeats)):
+            return self._loop_start
+
+        # Hold back what could turn out to be the start of the next copy:
+        # the last `n` words, and a partial line that begins like the last line
+        self._safe = tail
+        nl = text.rfind("\n")
+        if nl >= 0:
+            lines = [ln.strip() for ln in text[:nl].split("\n") if ln.strip()]
+            if lines and lines[-1].startswith(text[nl + 1:].strip()):
+                self._safe = min(self._safe, nl)
+        if self._loop_start is not None:
+            self._safe = min(self._safe, self._loop_start)
+        return None
+
+    def safe_len(self, text):
+        return self._safe
+
+
+def json_criteria() -> list:
+    """Criteria for passes that must return a single JSON object."""
+    return [BalancedJSON(), NGramRepetition()]
+
+
+def text_criteria() -> list:
+    """Criteria for free-text passes (OCR dumps, reasoning answers)."""
+    return [NGramRepetition()]
+
+
+# ── Stream guard ──────────────────────────────────────────────────────────────
+
+def guard(deltas, criteria=None, usage: dict = None, max_tokens: int = None):
+    """
+    Forward text deltas from `deltas` until a criterion fires, then close it.
+    Fills usage["stop_reason"] (after the inner stream has filled its counts).
+    """
+    criteria = [c for c in (criteria or []) if c is not None]
+    text, emitted, reason = "", 0, None
+    try:
+        for delta in deltas:
+            text += delta
+            cut = None
+            for c in criteria:
+                k = c.check(text)
+                if k is not None and (cut is None or k < cut):
+                    cut, reason = k, c.reason
+            if cut is not None:
+                if cut > emitted:
+                    yield text[emitted:cut]
+                return
+            safe = min((c.safe_len(text) for c in criteria), default=len(text))
+            if safe > emitted:
+                yield text[emitted:safe]
+                emitted = safe
+        if len(text) > emitted:
+            yield text[emitted:]
+    finally:
+        close = getattr(deltas, "close", None)
+        if close:
+            close()
+        if usage is not None:
+            if reason is None:
+                n = usage.get("generation_tokens")
+                reason = "max_tokens" if (max_tokens and n is not None and n >= max_tokens) else "eos"
+            usage["stop_reason"] = reason